@@ -0,0 +1,87 @@
+"""
+日期與數字轉換效能測試：以合成的 10 年歷史資料（FMTQIK 民國年日期、BFI82U 千分位金額、
+期交所日期字串），比較逐列轉換與 converters 的整欄轉換，並確認兩者結果相同。
+
+執行方式: python bench_converters.py
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from converters import parse_int, parse_taifex_dates, roc_to_date
+
+YEARS = 10
+TRADING_DAYS_PER_YEAR = 245
+FUND_ROWS_PER_DAY = 6  # 每個交易日的三大法人資料列數
+TAIFEX_ROWS_PER_DAY = 60  # 每個交易日所有商品與身份別的資料列數
+REPEAT = 5
+
+
+def trading_days(num_days, start_date=datetime(2015, 1, 5)):
+    days = []
+    current_date = start_date
+    while len(days) < num_days:
+        if current_date.weekday() < 5:
+            days.append(current_date)
+        current_date += timedelta(days=1)
+    return days
+
+
+def roc_loop(values):
+    """原本的逐列轉換：split 三次、字串串接後以 strptime 解析。"""
+    dates = []
+    for value in values:
+        date = str(int(value.split("/")[0]) + 1911) + "/" + value.split("/")[1] + "/" + value.split("/")[2]
+        dates.append(datetime.strptime(date, "%Y/%m/%d"))
+    return pd.Series(dates, dtype="datetime64[ns]")
+
+
+def int_loop(values):
+    return pd.Series([int(value.replace(",", "")) for value in values], dtype="int64")
+
+
+def taifex_inferred(values):
+    """原本未指定格式的 pd.to_datetime（由 pandas 推測格式）。"""
+    return pd.to_datetime(pd.Series(values))
+
+
+def median_ms(fn, repeat=REPEAT):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return sorted(timings)[len(timings) // 2] * 1000
+
+
+def main():
+    days = trading_days(YEARS * TRADING_DAYS_PER_YEAR)
+    roc_dates = [f"{day.year - 1911}/{day.month:02d}/{day.day:02d}" for day in days]
+    amounts = [f"{(i * 7919) % 10**11:,}" for i in range(len(days) * FUND_ROWS_PER_DAY)]
+    taifex_dates = [day.strftime("%Y/%m/%d") for day in days for _ in range(TAIFEX_ROWS_PER_DAY)]
+
+    cases = [
+        ("民國年日期 (FMTQIK)", roc_dates, roc_loop, roc_to_date),
+        ("千分位金額 (BFI82U)", amounts, int_loop, parse_int),
+        ("期交所日期", taifex_dates, taifex_inferred, parse_taifex_dates),
+    ]
+    print(f"合成 {YEARS} 年資料：{len(days)} 個交易日")
+    print(f"{'欄位':<20} {'列數':>10} {'逐列 (ms)':>12} {'整欄 (ms)':>12} {'加速':>8}")
+    for name, values, slow, fast in cases:
+        series = pd.Series(values)
+        expected = slow(values)
+        actual = fast(series)
+        if not expected.reset_index(drop=True).equals(actual.reset_index(drop=True)):
+            raise AssertionError(f"{name} 的整欄轉換結果與逐列轉換不同")
+        slow_ms = median_ms(lambda: slow(values))
+        fast_ms = median_ms(lambda: fast(series))
+        print(f"{name:<20} {len(values):>10,} {slow_ms:>12.2f} {fast_ms:>12.2f} {slow_ms / fast_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
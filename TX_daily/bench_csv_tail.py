@@ -0,0 +1,85 @@
+"""
+最新日期查詢效能測試：以合成的全商品期貨資料檔（1 至 20 年，每個交易日 120 列）量測
+CsvStore.latest_date / read_latest / read_last_rows（由檔案尾端往前讀取）所需的時間，
+並與讀取整份檔案後再篩選最新日期的時間比較；由尾端讀取的時間應與歷史資料的年數無關。
+
+執行方式: python bench_csv_tail.py
+"""
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from storage import DATE_COLUMN, CsvStore  # noqa: E402
+
+YEARS = [1, 5, 10, 20]  # 合成資料涵蓋的年數
+TRADING_DAYS_PER_YEAR = 250
+NUM_PRODUCTS = 40  # 每個交易日的商品數（每個商品 3 個身份別）
+ENTITIES = ["自營商", "投信", "外資"]
+REPEAT = 5  # 每種大小重複量測次數（取中位數）
+DATASET = "txf_all_data"
+
+
+def make_taifex_rows(num_days):
+    dates = pd.bdate_range("2000-01-03", periods=num_days).strftime("%Y-%m-%d")
+    rows_per_day = NUM_PRODUCTS * len(ENTITIES)
+    df = pd.DataFrame({
+        "日期": dates.repeat(rows_per_day),
+        "商品名稱": [f"商品{i:02d}" for i in range(NUM_PRODUCTS) for _ in ENTITIES] * num_days,
+        "身份別": ENTITIES * NUM_PRODUCTS * num_days,
+    })
+    for column in ["多方交易口數", "多方交易契約金額(千元)", "空方交易口數", "空方交易契約金額(千元)",
+                   "多空交易口數淨額", "多空交易契約金額淨額(千元)", "多方未平倉口數", "多方未平倉契約金額(千元)",
+                   "空方未平倉口數", "空方未平倉契約金額(千元)", "多空未平倉口數淨額", "多空未平倉契約金額淨額(千元)"]:
+        df[column] = 47732
+    return df
+
+
+def median_time(fn, repeat=REPEAT):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return sorted(timings)[len(timings) // 2]
+
+
+def full_read_latest(store):
+    """舊做法：讀取整份檔案後再篩選最新日期。"""
+    df = store.read(DATASET)
+    return df[df[DATE_COLUMN] == df[DATE_COLUMN].max()].reset_index(drop=True)
+
+
+def main():
+    work_dir = tempfile.mkdtemp()
+    store = CsvStore(work_dir)
+    print(f"{'年數':>4} {'列數':>10} {'latest_date (ms)':>17} {'read_latest (ms)':>17} "
+          f"{'read_last_rows (ms)':>20} {'完整讀取 (ms)':>14}")
+    try:
+        for years in YEARS:
+            make_taifex_rows(years * TRADING_DAYS_PER_YEAR).to_csv(
+                store.path(DATASET), index=False, encoding="utf-8-sig")
+            num_rows = years * TRADING_DAYS_PER_YEAR * NUM_PRODUCTS * len(ENTITIES)
+
+            expected = full_read_latest(store)
+            latest = store.read_latest(DATASET)
+            assert latest.astype(str).equals(expected.astype(str)), "read_latest 結果與完整讀取不一致"
+            assert store.latest_date(DATASET) == expected[DATE_COLUMN].max()
+
+            latest_date_ms = median_time(lambda: store.latest_date(DATASET)) * 1000
+            read_latest_ms = median_time(lambda: store.read_latest(DATASET)) * 1000
+            last_rows_ms = median_time(lambda: store.read_last_rows(DATASET, 6)) * 1000
+            full_read_ms = median_time(lambda: full_read_latest(store)) * 1000
+            print(f"{years:>4} {num_rows:>10,} {latest_date_ms:>17.2f} {read_latest_ms:>17.2f} "
+                  f"{last_rows_ms:>20.2f} {full_read_ms:>14.2f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+期交所頁面解析效能測試：以 sample/ 中保存的 futContractsDate / optContractsDate 頁面，
+比較 BeautifulSoup 完整解析與只解析目標表格的快速路徑，並確認兩者產生相同的資料列。
+
+執行方式: python bench_taifex_parser.py
+"""
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from taifex_parser import extract_date, extract_table_data, parse_page
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample")
+PAGES = {
+    "futContractsDate.html": "臺股期貨",
+    "optContractsDate.html": "選擇權",
+}
+NUM_ROWS = 3
+REPEAT = 50
+
+
+def parse_with_soup(page_content, num_rows, product_name):
+    soup = BeautifulSoup(page_content, 'html.parser')
+    date = extract_date(soup)
+    return date, extract_table_data(soup, date, num_rows, product_name)
+
+
+def median_ms(fn, repeat=REPEAT):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return sorted(timings)[len(timings) // 2] * 1000
+
+
+def main():
+    print(f"{'頁面':<24} {'BeautifulSoup (ms)':>20} {'快速路徑 (ms)':>16} {'加速':>8}")
+    for file_name, product_name in PAGES.items():
+        with open(os.path.join(SAMPLE_DIR, file_name), "r", encoding="utf-8") as f:
+            page_content = f.read()
+
+        expected = parse_with_soup(page_content, NUM_ROWS, product_name)
+        actual = parse_page(page_content, NUM_ROWS, product_name)
+        if actual != expected:
+            raise AssertionError(f"{file_name} 快速路徑的解析結果與 BeautifulSoup 不同：{actual} != {expected}")
+
+        soup_ms = median_ms(lambda: parse_with_soup(page_content, NUM_ROWS, product_name))
+        fast_ms = median_ms(lambda: parse_page(page_content, NUM_ROWS, product_name))
+        print(f"{file_name:<24} {soup_ms:>20.2f} {fast_ms:>16.2f} {soup_ms / fast_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+update_data 增量寫入效能測試：以合成的三大法人資料檔（1 千至 1 百萬列）量測
+新增一個交易日（6 筆）所需的時間，並與讀取整份檔案的時間比較。
+
+執行方式: python bench_update.py
+"""
+import os
+import sys
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]  # 合成資料檔的列數
+REPEAT = 5  # 每種大小重複量測次數（取中位數）
+UNITS = ["自營商(自行買賣)", "自營商(避險)", "投信", "外資及陸資(不含外資自營商)", "外資自營商", "合計"]
+
+
+def make_fund_rows(start_date, num_days):
+    dates = [start_date + timedelta(days=i) for i in range(num_days)]
+    return pd.DataFrame({
+        "日期": [date for date in dates for _ in UNITS],
+        "單位名稱": UNITS * num_days,
+        "買進金額": "4,473,338,103",
+        "賣出金額": "4,452,269,735",
+        "買賣差額": "21,068,368",
+    })
+
+
+def median_time(fn, repeat=REPEAT):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return sorted(timings)[len(timings) // 2]
+
+
+def main():
+    work_dir = tempfile.mkdtemp()
+    os.chdir(work_dir)
+    import update  # 在暫存目錄中匯入，避免效能測試的紀錄寫入正式的 update.log
+
+    start_date = datetime(1700, 1, 1)  # 1 百萬列約需 450 年的每日資料，從較早的年份開始以免超出 Timestamp 範圍
+    print(f"{'列數':>10} {'update_data (ms)':>18} {'完整讀取 (ms)':>16}")
+    try:
+        for size in SIZES:
+            num_days = size // len(UNITS)
+            base_path = os.path.join(work_dir, f"base_{size}.csv")
+            make_fund_rows(start_date, num_days).to_csv(base_path, index=False, encoding="utf-8-sig")
+            new_day = make_fund_rows(start_date + timedelta(days=num_days), 1)
+            target_path = os.path.join(work_dir, "target.csv")
+
+            def run_update():
+                update.update_data(target_path, new_day)
+
+            def run_full_read():
+                pd.read_csv(base_path)
+
+            update_timings = []
+            for _ in range(REPEAT):
+                shutil.copyfile(base_path, target_path)
+                with open(target_path, "rb+") as f:
+                    os.fsync(f.fileno())  # 複本先寫回磁碟，避免 update_data 的 fsync 計入複製整份檔案的時間
+                update_timings.append(median_time(run_update, repeat=1))
+            update_ms = sorted(update_timings)[REPEAT // 2] * 1000
+            full_read_ms = median_time(run_full_read) * 1000
+            print(f"{size:>10,} {update_ms:>18.2f} {full_read_ms:>16.2f}")
+    finally:
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
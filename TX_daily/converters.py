@@ -0,0 +1,87 @@
+"""
+整欄（向量化）的日期與數字轉換工具，所有抓取與解析流程共用；每個轉換都使用明確的格式，
+不讓 pandas 逐列推測格式。
+"""
+from datetime import date, datetime
+
+import pandas as pd
+
+ROC_YEAR_OFFSET = 1911  # 民國年與西元年的差距
+ISO_DATE_FORMAT = "%Y-%m-%d"  # 儲存於資料檔中的日期格式
+TAIFEX_DATE_FORMAT = "%Y/%m/%d"  # 期交所頁面與下載檔的日期格式
+DATE_FORMATS = (ISO_DATE_FORMAT, TAIFEX_DATE_FORMAT)  # 資料檔中可能出現的日期格式（依序嘗試）
+
+def roc_to_date(series):
+    """
+    將民國年日期字串欄位（例如 "113/01/02"）轉為 datetime64 欄位。
+
+    參數:
+        series (Series): 民國年日期字串
+
+    回傳:
+        Series: datetime64 欄位；含格式不符的值時拋出 ValueError
+    """
+    if series.empty:
+        return pd.Series([], index=series.index, dtype="datetime64[ns]")
+    parts = series.astype(str).str.strip().str.split("/", expand=True)
+    if parts.shape[1] != 3 or parts.isna().any().any():
+        raise ValueError(f"無法解析的民國年日期：{series.iloc[0]!r}")
+    parts = parts.astype("int64")
+    numbers = (parts[0] + ROC_YEAR_OFFSET) * 10000 + parts[1] * 100 + parts[2]
+    return pd.to_datetime(numbers.astype(str), format="%Y%m%d")
+
+
+def parse_dates(series, formats=DATE_FORMATS):
+    """
+    依序以明確的格式解析日期欄位，前一個格式無法解析的值再以下一個格式解析；
+    已是 datetime64 的欄位直接回傳。同一天通常有多筆資料，因此只解析不重複的日期字串。
+
+    參數:
+        series (Series): 日期字串、datetime 或 Timestamp
+        formats (tuple): 依序嘗試的日期格式
+
+    回傳:
+        Series: datetime64 欄位；含所有格式都無法解析的值時拋出 ValueError
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if not series.empty and isinstance(series.iloc[0], (date, datetime)):  # datetime / Timestamp 物件
+        return pd.to_datetime(series)
+    codes, uniques = pd.factorize(series)
+    text = pd.Series(uniques).astype(str).str.strip()
+    parsed = pd.Series(pd.NaT, index=text.index, dtype="datetime64[ns]")
+    for date_format in formats:
+        pending = parsed.isna()
+        if not pending.any():
+            break
+        parsed[pending] = pd.to_datetime(text[pending], format=date_format, errors="coerce")
+    if parsed.isna().any() or (codes < 0).any():
+        invalid = text[parsed.isna()]
+        raise ValueError(f"無法解析的日期：{invalid.iloc[0] if not invalid.empty else None!r}")
+    return pd.Series(parsed.to_numpy()[codes], index=series.index, name=series.name)
+
+
+def parse_taifex_dates(series):
+    """將期交所的日期字串欄位（例如 "2025/01/22"）轉為 datetime64 欄位。"""
+    return parse_dates(series, formats=(TAIFEX_DATE_FORMAT,))
+
+
+def parse_number(series, dtype):
+    """
+    將含千分位逗號的數字字串欄位（例如 "4,473,338,103"）轉為數值型別；已是數值的欄位直接轉型。
+
+    參數:
+        series (Series): 要轉換的欄位
+        dtype (str): 目標型別（"int64" 或 "float64"）
+
+    回傳:
+        Series: 轉換後的欄位；含無法解析的值時拋出 ValueError
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(dtype)
+    return series.astype(str).str.replace(",", "", regex=False).astype(dtype)
+
+
+def parse_int(series):
+    """將含千分位逗號的數字字串欄位轉為 int64。"""
+    return parse_number(series, "int64")
@@ -0,0 +1,148 @@
+import io
+import os
+from contextlib import contextmanager
+
+import pandas as pd
+
+BLOCK_SIZE = 64 * 1024  # 由檔案尾端往前讀取時每次讀取的位元組數
+
+# 以下讀取函數的 file_path 可為檔案路徑，或已開啟的二進位檔案（讀取快照固定的檔案時使用，讀取後不會關閉）
+
+
+@contextmanager
+def open_binary(file_path):
+    """file_path 為路徑時開啟檔案並於結束後關閉；已開啟的檔案則直接使用。"""
+    if hasattr(file_path, "read"):
+        yield file_path
+    else:
+        with open(file_path, "rb") as f:
+            yield f
+
+
+def read_header(file_path):
+    """讀取 CSV 檔案的標題列，回傳 (欄位名稱列表, 標題列結束的位元組位移量)。"""
+    with open_binary(file_path) as f:
+        f.seek(0)
+        header_line = f.readline()
+    columns = header_line.decode("utf-8-sig").strip().split(",")
+    return columns, len(header_line)
+
+
+def iter_lines_reversed(file_path, block_size=BLOCK_SIZE, end=None):
+    """
+    由檔案尾端往前逐列讀取資料列（略過標題列與空白列），每次只讀取一個區塊。
+    指定 end 時視檔案只到該位移量為止（讀取期間尾端被附加的資料不會被讀到）。
+
+    產生:
+        tuple: (資料列的位元組內容（不含換行）, 該列在檔案中的起始位移量)
+    """
+    _, header_end = read_header(file_path)
+    with open_binary(file_path) as f:
+        pos = f.seek(0, os.SEEK_END) if end is None else end
+        carry = b""  # 上一個區塊開頭不完整的資料列
+        while pos > header_end:
+            read_size = min(block_size, pos - header_end)
+            pos -= read_size
+            f.seek(pos)
+            lines = (f.read(read_size) + carry).split(b"\n")
+            if pos > header_end:
+                carry = lines.pop(0)
+                line_start = pos + len(carry) + 1
+            else:
+                carry = b""
+                line_start = pos
+
+            starts = []
+            for line in lines:
+                starts.append(line_start)
+                line_start += len(line) + 1
+
+            for line, start in zip(reversed(lines), reversed(starts)):
+                if line.strip():
+                    yield line, start
+
+
+def first_field(line):
+    """資料列的第一個欄位（日期），去除引號與換行字元。"""
+    return line.split(b",", 1)[0].strip().strip(b'"')
+
+
+def find_tail_offset(file_path, since, block_size=BLOCK_SIZE, end=None):
+    """
+    由檔案尾端往前搜尋，回傳第一筆日期 >= since 的資料列所在的位元組位移量。
+    檔案必須依日期排序，且日期為第一個欄位（YYYY-MM-DD 格式）；只會讀取檔案尾端必要的區塊。
+
+    參數:
+        file_path (str): CSV 檔案路徑
+        since (str): 日期下限（YYYY-MM-DD）
+        block_size (int): 每次往前讀取的位元組數
+        end (int): 只搜尋此位移量之前的內容（預設為整個檔案）
+
+    回傳:
+        int: 位移量；若所有資料列都 >= since，則為標題列結束處
+    """
+    since_bytes = since.encode("utf-8")
+    for line, start in iter_lines_reversed(file_path, block_size, end):
+        if first_field(line) < since_bytes:
+            return start + len(line) + 1
+    return read_header(file_path)[1]
+
+
+def find_last_rows_offset(file_path, num_rows, block_size=BLOCK_SIZE, end=None):
+    """回傳檔案（至 end 為止）最後 num_rows 筆資料列的起始位移量；資料列不足時為標題列結束處。"""
+    offset = read_header(file_path)[1]
+    if num_rows <= 0:
+        if end is None:
+            with open_binary(file_path) as f:
+                end = f.seek(0, os.SEEK_END)
+        return end
+    for count, (_, start) in enumerate(iter_lines_reversed(file_path, block_size, end), start=1):
+        offset = start
+        if count == num_rows:
+            break
+    return offset
+
+
+def read_last_date(file_path, end=None):
+    """
+    只讀取檔案（至 end 為止）最後一筆資料列，回傳其日期字串（檔案依日期排序，即為最新日期）。
+
+    回傳:
+        str: 最新日期
+        None: 檔案沒有任何資料列時
+    """
+    for line, _ in iter_lines_reversed(file_path, end=end):
+        return first_field(line).decode("utf-8")
+    return None
+
+
+def read_tail_bytes(file_path, offset, end=None):
+    """讀取標題列與位移量之後（至 end 為止）的資料列，組成可直接交給 pd.read_csv 解析的完整 CSV 內容。"""
+    with open_binary(file_path) as f:
+        f.seek(0)
+        header_line = f.readline()
+        start = max(offset, len(header_line))
+        f.seek(start)
+        return header_line + (f.read() if end is None else f.read(max(0, end - start)))
+
+
+def read_rows_from(file_path, offset, columns):
+    """將位移量之後的資料列讀成 DataFrame（所有欄位皆以字串讀入）。"""
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        tail_bytes = f.read()
+    if not tail_bytes.strip():
+        return pd.DataFrame(columns=columns, dtype=str)
+    return pd.read_csv(io.BytesIO(tail_bytes), header=None, names=columns, dtype=str, keep_default_na=False)
+
+
+def read_rows_since(file_path, since):
+    """
+    只讀取檔案尾端日期 >= since 的資料列（所有欄位皆以字串讀入）。
+
+    回傳:
+        tuple: (DataFrame, 該段資料在檔案中的起始位移量)
+    """
+    columns, _ = read_header(file_path)
+    offset = find_tail_offset(file_path, since)
+    return read_rows_from(file_path, offset, columns), offset
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+CACHE_DIR = "http_cache"  # 原始回應快取資料夾
+TODAY_TTL = int(os.environ.get("TX_HTTP_TODAY_TTL", 10 * 60))  # 查詢日期為今天（資料可能仍在更新）時的快取有效秒數
+POOL_SIZE = 8  # 每個主機保留的連線數
+OFFLINE = os.environ.get("TX_HTTP_OFFLINE") == "1"  # 只從快取重播，不連線至網路
+clock = datetime.now  # 判斷「今天」所用的時鐘（replay_server 重播模擬日期時替換）
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """取得共用的 requests.Session（連線池與 keep-alive），第一次呼叫時建立。"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+def cache_key(url, query_date, data=None):
+    """以網址、查詢日期（與 POST 表單內容）計算快取索引的鍵值。"""
+    date_text = query_date.strftime("%Y%m%d") if query_date is not None else ""
+    form_text = "&".join(f"{key}={value}" for key, value in sorted(data.items())) if data else ""
+    return hashlib.sha256(f"{url}|{date_text}|{form_text}".encode("utf-8")).hexdigest()
+
+
+def index_path(key):
+    return os.path.join(CACHE_DIR, "index", key[:2], f"{key}.json")
+
+
+def blob_path(content_hash):
+    return os.path.join(CACHE_DIR, "blobs", content_hash[:2], content_hash)
+
+
+def write_atomic(path, data):
+    """先寫入暫存檔再替換，避免多執行緒同時寫入時讀到不完整的檔案。"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def is_historical(query_date):
+    """查詢日期早於今天的資料已定案，可永久快取。"""
+    return query_date is not None and query_date.date() < clock().date()
+
+
+def is_permanent(meta, query_date, response, is_final=None):
+    """
+    快取內容是否可永久使用：查詢日期已過、回應是在查詢日期之後才取得（取得時資料已完整公布），
+    且 is_final(回應) 判斷內容已定案（例如 TWSE 的 stat 為 OK，而不是「查無資料」）。
+    """
+    if not is_historical(query_date):
+        return False
+    fetched_on = meta.get("fetched_on")
+    if fetched_on is None or fetched_on <= query_date.strftime("%Y-%m-%d"):
+        return False
+    return is_final is None or is_final(response)
+
+
+def load_cached(url, query_date, data=None, is_final=None):
+    """
+    從快取讀取回應；快取不存在，或內容不可永久使用且已超過 TODAY_TTL 秒時回傳 None。
+
+    回傳:
+        Response: 由快取內容重建的 requests.Response（`from_cache` 為 True）
+    """
+    path = index_path(cache_key(url, query_date, data))
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    content_path = blob_path(meta["content_hash"])
+    if not os.path.exists(content_path):
+        return None
+    with open(content_path, "rb") as f:
+        content = f.read()
+
+    response = requests.Response()
+    response.status_code = meta["status_code"]
+    response._content = content
+    response.encoding = meta["encoding"]
+    response.headers = CaseInsensitiveDict(meta["headers"])
+    response.url = url
+    response.from_cache = True
+    if (not OFFLINE and time.time() - meta["fetched_at"] > TODAY_TTL
+            and not is_permanent(meta, query_date, response, is_final)):
+        return None
+    return response
+
+
+def store_cached(url, query_date, response, data=None):
+    """將成功的回應內容以內容雜湊儲存，並記錄網址與查詢日期對應的索引。"""
+    content_hash = hashlib.sha256(response.content).hexdigest()
+    content_path = blob_path(content_hash)
+    if not os.path.exists(content_path):
+        write_atomic(content_path, response.content)
+    meta = {
+        "url": url,
+        "query_date": query_date.strftime("%Y-%m-%d") if query_date is not None else None,
+        "status_code": response.status_code,
+        "encoding": response.encoding,
+        "headers": dict(response.headers),
+        "content_hash": content_hash,
+        "fetched_at": time.time(),
+        "fetched_on": clock().strftime("%Y-%m-%d"),
+    }
+    write_atomic(index_path(cache_key(url, query_date, data)), json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+
+def request(method, url, query_date=None, data=None, timeout=10, use_cache=True, limiter=None, headers=None,
+            refresh=False, is_final=None):
+    """
+    以共用連線池發出請求，並將原始回應存入快取。
+
+    在查詢日期之後取得、且內容已定案的歷史日期回應永久快取，之後重建資料時可直接重播；
+    其餘回應（查詢日期為今天、當天取得，或資料尚未公布）快取只在 TODAY_TTL 秒內有效。
+    設定 TX_HTTP_OFFLINE=1 時只讀取快取。
+
+    參數:
+        method (str): "GET" 或 "POST"
+        url (str): 請求網址（含查詢參數）
+        query_date (datetime): 此請求所查詢資料的（最後）日期
+        data (dict): POST 表單內容（同時作為快取鍵值的一部分）
+        timeout (float): 請求超時秒數
+        use_cache (bool): 是否讀寫快取
+        limiter (TokenBucket): 共用的限流器，只有實際連線時才取得令牌（快取命中不受限流）
+        headers (dict): 額外的請求標頭（例如條件式請求的 If-None-Match）
+        refresh (bool): 不讀取快取、一律連線取得最新內容（成功的回應仍會寫入快取）
+        is_final (callable): 判斷回應內容是否已定案的函數（None 表示狀態碼 200 即已定案）
+
+    回傳:
+        Response: requests.Response；由快取取得時 `from_cache` 為 True
+    """
+    if use_cache and not refresh:
+        cached = load_cached(url, query_date, data, is_final)
+        if cached is not None:
+            return cached
+    if OFFLINE:
+        raise requests.exceptions.ConnectionError(f"離線模式下快取中沒有 {url} 的回應")
+
+    if limiter is not None:
+        limiter.acquire()
+    response = get_session().request(method, url, data=data, headers=headers, timeout=timeout)
+    response.from_cache = False
+    if use_cache and response.status_code == 200:
+        store_cached(url, query_date, response, data)
+    return response
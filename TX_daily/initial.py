@@ -1,133 +1,231 @@
-import requests
-import pandas as pd
 from datetime import datetime, timedelta
+import sys
+import threading
 import time
-import random
+from collections import deque
+from pipeline import run_pipeline
+from ratelimit import TokenBucket
+from sink import CheckpointedCsvSink
+from sources import FUND_COLUMNS, TWSE_COLUMNS, Job, fetch_dataset, pop_base_url
+from trading_calendar import TradingCalendar, iter_months, month_bounds
 
 # 定義常數與全域變數
 FILE_PATH_FUND = "tx_fund_data.csv"  # 三大法人資料儲存的 CSV 檔案路徑
 FILE_PATH_TWSE = "tx_closed_data.csv"  # 台灣證券交易所資料儲存的 CSV 檔案路徑
-MIN_DELAY = 3  # 每次請求的最小延遲時間（秒）
-MAX_DELAY = 5  # 每次請求的最大延遲時間（秒）
-MAX_RETRIES = 3  # 最大重試次數
+CONCURRENCY = 4  # 回補模式同時進行中的請求數
+REQUESTS_PER_SECOND = 1.0  # 所有請求共用的平均速率上限（每秒請求數）
+BURST = 2  # 令牌桶容量，允許的瞬間爆發請求數
 
-# ---- 三大法人資料抓取與儲存 ----
-def fetch_fund_data(date):
-    """
-    從 API 取得指定日期的三大法人買賣金額資料。
+def create_limiter(rate=REQUESTS_PER_SECOND, burst=BURST):
+    """建立所有抓取工作共用的令牌桶限流器。"""
+    return TokenBucket(rate, capacity=burst)
 
-    參數:
-        date (datetime): 要取得資料的日期（datetime 格式）
+def dataset_frame(results, dataset):
+    """從管線的解析結果中取出指定資料集的 DataFrame（抓取失敗時為 None）。"""
+    return dict(results).get(dataset)
 
-    回傳:
-        DataFrame: 包含指定日期的三大法人買賣金額資料
-        None: 若取得資料失敗或無資料時
-    """
-    formatted_date = date.strftime("%Y%m%d")  # 格式化日期為 YYYYMMDD
-    api_url = f"https://www.twse.com.tw/rwd/zh/fund/BFI82U?type=day&dayDate={formatted_date}&response=json"
-
-    retry_count = 0
-    while retry_count < MAX_RETRIES:
-        try:
-            response = requests.get(api_url, timeout=10)  # 設置請求超時時間為 10 秒
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    if data["stat"] == "OK":
-                        records = []
-                        for record in data["data"]:
-                            unit_name = record[0]
-                            buy_amount = record[1]
-                            sell_amount = record[2]
-                            diff = record[3]
-                            records.append([date, unit_name, buy_amount, sell_amount, diff])
-
-                        df = pd.DataFrame(records, columns=["日期", "單位名稱", "買進金額", "賣出金額", "買賣差額"])
-                        print(f"成功取得 {date.strftime('%Y/%m/%d')} 的資料。")
-                        return df
-                    else:
-                        print(f"{date.strftime('%Y/%m/%d')} 無法取得資料或無符合條件的資料。")
-                        return None
-                except ValueError as e:
-                    print(f"{date.strftime('%Y/%m/%d')} 回傳內容無法解析為 JSON，錯誤：{e}")
-            else:
-                print(f"{date.strftime('%Y/%m/%d')} 伺服器回應失敗，狀態碼：{response.status_code}")
-        except requests.exceptions.RequestException as e:
-            print(f"請求 {date.strftime('%Y/%m/%d')} 資料時發生錯誤，錯誤原因：{e}")
-
-        retry_count += 1
-        print(f"重試 {retry_count}/{MAX_RETRIES} 次...")
-        time.sleep(random.uniform(MIN_DELAY, MAX_DELAY))  # 隨機延遲一段時間再進行重試
-
-    print(f"超過最大重試次數，跳過 {date.strftime('%Y/%m/%d')} 的資料。")
+# ---- 三大法人資料抓取與儲存 ----
+def day_checkpoint(date):
+    """回傳三大法人資料的檢查點鍵值；今天的資料可能尚未公布，因此不記錄檢查點。"""
+    if date.date() < datetime.now().date():
+        return date.strftime("%Y-%m-%d")
     return None
 
-def fetch_and_save_fund_data(start_date, end_date, file_path):
+def resume_date(sink, start_date):
+    """依檢查點決定三大法人資料的實際起始日期。"""
+    if sink.last_completed is None:
+        return start_date
+    resumed = datetime.strptime(sink.last_completed, "%Y-%m-%d") + timedelta(days=1)
+    if resumed > start_date:
+        print(f"三大法人資料自檢查點 {sink.last_completed} 之後接續抓取。")
+        return resumed
+    return start_date
+
+def store_fund_day(sink, job, results):
+    """依日期順序寫入一天的三大法人資料並記錄檢查點。"""
+    daily_data = dataset_frame(results, "tx_fund_data")
+    if daily_data is not None:
+        print(f"成功取得 {job.date.strftime('%Y/%m/%d')} 的資料。")
+    else:
+        print(f"{job.date.strftime('%Y/%m/%d')} 無法取得資料或無符合條件的資料。")
+    sink.write(daily_data, completed=day_checkpoint(job.date))
+
+def fetch_and_save_fund_data(start_date, end_date, file_path, concurrency=CONCURRENCY, limiter=None, calendar=None):
     """
-    抓取指定日期範圍內的所有三大法人買賣金額資料，並儲存至指定的 CSV 檔案中。
+    抓取指定日期範圍內的所有三大法人買賣金額資料，並逐日附加儲存至指定的 CSV 檔案中。
+    若先前的執行中斷，會從檢查點之後接續抓取。
 
     參數:
         start_date (datetime): 要開始抓取的日期
         end_date (datetime): 要結束抓取的日期
         file_path (str): 儲存資料的 CSV 檔案路徑
+        concurrency (int): 同時進行中的請求數
+        limiter (TokenBucket): 共用的限流器（None 時自動建立）
+        calendar (TradingCalendar): 交易日曆（None 時載入預設索引並補抓缺少的月份）
+    """
+    limiter = limiter or create_limiter()
+    sink = CheckpointedCsvSink(file_path, FUND_COLUMNS)
+    start_date = resume_date(sink, start_date)
+    if calendar is None:
+        calendar = TradingCalendar()
+        calendar.refresh(start_date, end_date, fetch_month=fetch_twse_month, limiter=limiter)
+
+    dates = calendar.trading_days_between(start_date, end_date)
+    with sink:
+        run_pipeline((Job("BFI82U", date) for date in dates), lambda job, results: store_fund_day(sink, job, results),
+                     limiter=limiter, concurrency=concurrency, window=concurrency * 2, ordered=True)
+    print(f"三大法人資料已成功儲存至 {file_path} 中。")
+
+# ---- 台灣證券交易所資料抓取與儲存 ----
+def fetch_twse_month(year, month, limiter=None):
     """
-    all_data = pd.DataFrame(columns=["日期", "單位名稱", "買進金額", "賣出金額", "買賣差額"])
+    從 API 取得指定月份的台灣證券交易所每日成交資料。
 
-    current_date = start_date
-    while current_date <= end_date:
-        daily_data = fetch_fund_data(current_date)
-        if daily_data is not None:
-            all_data = pd.concat([all_data, daily_data], ignore_index=True)
-        time.sleep(random.uniform(MIN_DELAY, MAX_DELAY))  # 隨機延遲一段時間
+    參數:
+        year (int): 年份
+        month (int): 月份
+        limiter (TokenBucket): 共用的限流器，每次連線前先取得令牌（None 表示不限流）
 
-        current_date += timedelta(days=1)
+    回傳:
+        DataFrame: 包含該月份每個交易日的成交資料
+        None: 若取得資料失敗或無資料時
+    """
+    return fetch_dataset(Job("FMTQIK", datetime(year, month, 1)), "tx_closed_data", limiter)
 
-    # 儲存所有資料至 CSV
-    all_data.to_csv(file_path, index=False, encoding="utf-8-sig")
-    print(f"三大法人資料已成功儲存至 {file_path} 中。")
+def month_checkpoint(year, month):
+    """回傳成交資料的檢查點鍵值；尚未結束的月份之後還會新增交易日，因此不記錄檢查點。"""
+    _, last_day = month_bounds(year, month)
+    if last_day.date() < datetime.now().date():
+        return f"{year}-{month:02d}"
+    return None
 
-# ---- 台灣證券交易所資料抓取與儲存 ----
-def fetch_twse_data(start_month, end_month, current_year, file_path):
+def resume_month(sink, start_date):
+    """依檢查點決定成交資料的實際起始月份（以該月第一天表示）。"""
+    start_month = datetime(start_date.year, start_date.month, 1)
+    if sink.last_completed is None:
+        return start_month
+    year, month = map(int, sink.last_completed.split("-"))
+    resumed = datetime(year + month // 12, month % 12 + 1, 1)
+    if resumed > start_month:
+        print(f"成交資料自檢查點 {sink.last_completed} 之後接續抓取。")
+        return resumed
+    return start_month
+
+def store_twse_month(sink, job, results, calendar=None):
+    """依月份順序寫入一個月的成交資料並記錄檢查點；有指定交易日曆時同時更新。"""
+    year, month = job.date.year, job.date.month
+    month_data = dataset_frame(results, "tx_closed_data")
+    if month_data is not None:
+        print(f"成功取得 {year} 年 {month} 月的資料。")
+        if calendar is not None:
+            calendar.add_month(year, month, month_data["日期"])
+            calendar.save()
+    else:
+        print(f"無法取得 {year} 年 {month} 月的資料，請檢查 API 狀態。")
+    sink.write(month_data, completed=month_checkpoint(year, month))
+
+def fetch_twse_data(start_month, end_month, current_year, file_path, concurrency=CONCURRENCY, limiter=None):
     """
-    抓取當年起始月份至今的台灣證券交易所成交資料，並儲存至指定的 CSV 檔案中。
+    抓取當年起始月份至今的台灣證券交易所成交資料，並逐月附加儲存至指定的 CSV 檔案中。
+    若先前的執行中斷，會從檢查點之後接續抓取。
 
     參數:
         start_month (int): 起始月份
         end_month (int): 結束月份
         current_year (int): 當前年份
         file_path (str): 儲存資料的 CSV 檔案路徑
+        concurrency (int): 同時進行中的請求數
+        limiter (TokenBucket): 共用的限流器（None 時自動建立）
     """
-    all_data = pd.DataFrame(columns=["日期", "成交金額", "加權指數", "漲跌點數"])
-
-    for month in range(start_month, end_month + 1):
-        formatted_month = f"{month:02d}"
-        date_param = f"{current_year}{formatted_month}01"
-        api_url = f"https://www.twse.com.tw/rwd/zh/afterTrading/FMTQIK?date={date_param}&response=json"
-
-        response = requests.get(api_url)
-        data = response.json()
-
-        if data["stat"] == "OK":
-            records = []
-            for record in data["data"]:
-                date = record[0]
-                date = str(int(date.split("/")[0]) + 1911) + "/" + date.split("/")[1] + "/" + date.split("/")[2]
-                date = datetime.strptime(date, "%Y/%m/%d")
-                amount = record[2]
-                index = record[4]
-                change = record[5]
-                records.append([date, amount, index, change])
-
-            df_month = pd.DataFrame(records, columns=["日期", "成交金額", "加權指數", "漲跌點數"])
-            all_data = pd.concat([all_data, df_month], ignore_index=True)
-            print(f"成功取得 {current_year} 年 {month} 月的資料，並已合併至總資料中。")
-        else:
-            print(f"無法取得 {current_year} 年 {month} 月的資料，請檢查 API 狀態。")
-
-    all_data = all_data.sort_values("日期")
-    all_data.to_csv(file_path, index=False, encoding="utf-8-sig")
+    limiter = limiter or create_limiter()
+    sink = CheckpointedCsvSink(file_path, TWSE_COLUMNS)
+    start_date = resume_month(sink, datetime(current_year, start_month, 1))
+    _, end_date = month_bounds(current_year, end_month)
+
+    with sink:
+        jobs = (Job("FMTQIK", datetime(year, month, 1)) for year, month in iter_months(start_date, end_date))
+        run_pipeline(jobs, lambda job, results: store_twse_month(sink, job, results),
+                     limiter=limiter, concurrency=concurrency, window=concurrency, ordered=True)
     print(f"台灣證券交易所資料已成功儲存至 {file_path} 中。")
 
+# ---- 並行回補 ----
+def backfill_jobs(twse_start, fund_start, end_date, calendar, month_stored):
+    """
+    交錯產生成交資料（每月）與三大法人（每日）的工作，讓兩個來源的請求在同一個管線中重疊進行。
+
+    三大法人只對交易日送出請求：某個月的成交資料在本次回補範圍內時，先送出至下一個月為止的成交資料工作，
+    等待該月的成交資料寫入（交易日曆已更新）後，才產生該月的三大法人工作；
+    等待期間管線仍在處理前一個月的三大法人與下一個月的成交資料。
+
+    參數:
+        twse_start (datetime): 成交資料的起始月份（該月第一天）
+        fund_start (datetime): 三大法人的起始日期
+        end_date (datetime): 結束日期
+        calendar (TradingCalendar): 交易日曆
+        month_stored (dict): (年, 月) -> threading.Event，該月成交資料寫入後設定
+    """
+    month_jobs = deque(Job("FMTQIK", datetime(year, month, 1)) for year, month in iter_months(twse_start, end_date))
+    for year, month in iter_months(fund_start, end_date):
+        next_month = datetime(year + month // 12, month % 12 + 1, 1)
+        while month_jobs and month_jobs[0].date <= next_month:
+            yield month_jobs.popleft()
+        if (year, month) in month_stored:
+            month_stored[(year, month)].wait()
+        month_start, month_end = month_bounds(year, month)
+        for date in calendar.trading_days_between(max(fund_start, month_start), min(end_date, month_end)):
+            yield Job("BFI82U", date)
+    yield from month_jobs
+
+def run_backfill(start_date, end_date, fund_file_path, twse_file_path, concurrency=CONCURRENCY, rate=REQUESTS_PER_SECOND):
+    """
+    以同一個抓取管線回補成交資料（每月）與三大法人（每日），兩個來源的請求彼此重疊，
+    所有請求共用同一個令牌桶限流器，結束時回報總請求數、每秒請求數與總耗時。
+    成交資料寫入後即更新交易日曆，三大法人只對其中的交易日送出請求（見 backfill_jobs）。
+
+    兩份資料皆依日期順序逐批附加寫入並記錄檢查點，中斷後重新執行會各自從檢查點接續。
+
+    參數:
+        start_date (datetime): 要開始抓取的日期
+        end_date (datetime): 要結束抓取的日期
+        fund_file_path (str): 三大法人資料的 CSV 檔案路徑
+        twse_file_path (str): 成交資料的 CSV 檔案路徑
+        concurrency (int): 同時進行中的請求數
+        rate (float): 每秒請求數上限
+    """
+    limiter = create_limiter(rate)
+    calendar = TradingCalendar(seed_csv_path=twse_file_path)
+    calendar.seed_from_csv(twse_file_path)  # 已寫入檢查點而不重抓的月份，交易日由既有的成交資料提供
+    fund_sink = CheckpointedCsvSink(fund_file_path, FUND_COLUMNS)
+    twse_sink = CheckpointedCsvSink(twse_file_path, TWSE_COLUMNS)
+    fund_start = resume_date(fund_sink, start_date)
+    twse_start = resume_month(twse_sink, start_date)
+    # 已寫入檢查點的月份不再重抓，交易日改由已儲存的交易日曆提供
+    month_stored = {key: threading.Event() for key in iter_months(twse_start, end_date)}
+    started = time.monotonic()
+
+    def store(job, results):
+        if job.source == "FMTQIK":
+            try:
+                store_twse_month(twse_sink, job, results, calendar)
+            finally:
+                month_stored[(job.date.year, job.date.month)].set()
+        else:
+            store_fund_day(fund_sink, job, results)
+
+    try:
+        with fund_sink, twse_sink:
+            run_pipeline(backfill_jobs(twse_start, fund_start, end_date, calendar, month_stored), store,
+                         limiter=limiter, concurrency=concurrency, window=concurrency * 2, ordered=True)
+    finally:
+        for event in month_stored.values():  # 寫入失敗時讓仍在等待的工作產生器結束
+            event.set()
+    print(f"台灣證券交易所資料已成功儲存至 {twse_file_path} 中。")
+    print(f"三大法人資料已成功儲存至 {fund_file_path} 中。")
+
+    elapsed = time.monotonic() - started
+    requests_per_second = limiter.acquired / elapsed if elapsed > 0 else 0.0
+    print(f"回補完成：共 {limiter.acquired} 次請求，耗時 {elapsed:.1f} 秒，平均 {requests_per_second:.2f} 次/秒。")
+
 def main():
     """主程式執行區，負責設定抓取的日期範圍並執行抓取作業。"""
     # 取得當前年與起始日期
@@ -135,13 +233,11 @@ def main():
     start_date = datetime(current_year, 1, 1)
     end_date = datetime.now()
 
-    # 執行三大法人資料抓取並儲存
-    fetch_and_save_fund_data(start_date, end_date, FILE_PATH_FUND)
-
-    # 執行台灣證券交易所資料抓取並儲存
-    fetch_twse_data(start_month=1, end_month=datetime.now().month, current_year=current_year, file_path=FILE_PATH_TWSE)
+    # 同時執行三大法人與台灣證券交易所資料抓取並儲存
+    run_backfill(start_date, end_date, FILE_PATH_FUND, FILE_PATH_TWSE)
 
 
-# 執行主程式
+# 執行主程式：python initial.py [--base-url 替代伺服器網址]
 if __name__ == "__main__":
+    pop_base_url(sys.argv[1:])
     main()
@@ -0,0 +1,38 @@
+"""
+將既有的 CSV 資料檔由千分位字串格式（例如 "4,473,338,103"）遷移為純數值格式，
+之後 update.py / initial.py 寫入的資料與讀取端都以 schema.py 的型別為準。
+可重複執行：已遷移過的檔案內容不會改變。
+
+執行方式: python migrate_schema.py [CSV 檔案 ...]（未指定時處理四個預設資料檔）
+"""
+import os
+import sys
+
+import pandas as pd
+
+from schema import apply_schema, schema_for, DATE_FORMAT
+
+DEFAULT_FILES = ["tx_fund_data.csv", "tx_closed_data.csv", "txf_data.csv", "txop_data.csv"]
+
+
+def migrate_file(file_path):
+    """將單一 CSV 檔案轉為型別化格式並寫回原檔。"""
+    raw_df = pd.read_csv(file_path, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    typed_df = apply_schema(raw_df, schema_for(raw_df.columns))
+    temp_path = f"{file_path}.tmp"
+    typed_df.to_csv(temp_path, index=False, encoding="utf-8-sig", date_format=DATE_FORMAT)
+    os.replace(temp_path, file_path)
+    print(f"已將 {file_path} 遷移為數值格式，共 {len(typed_df)} 筆資料。")
+
+
+def main():
+    file_paths = sys.argv[1:] or DEFAULT_FILES
+    for file_path in file_paths:
+        if os.path.exists(file_path):
+            migrate_file(file_path)
+        else:
+            print(f"找不到 {file_path}，略過。")
+
+
+if __name__ == "__main__":
+    main()
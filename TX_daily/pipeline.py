@@ -0,0 +1,137 @@
+"""
+抓取 → 解析 → 寫入的管線引擎。
+
+多個抓取執行緒與一個解析執行緒之間以有界佇列連接，寫入則在呼叫端的執行緒逐一進行，
+讓網路等待、解析的 CPU 時間與磁碟寫入彼此重疊。同時進行中的工作數不超過 window，
+記憶體用量與工作總數無關；ordered=True 時依工作順序寫入（檢查點寫入需要）。
+"""
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from sources import fetch_job, parse_job, describe
+
+CONCURRENCY = 4  # 抓取執行緒數
+WINDOW = 8  # 同時進行中（已送出但尚未寫入）的工作數上限
+
+_DONE = object()  # 佇列結束標記
+
+
+def run_pipeline(jobs, store, fetch=None, parse=parse_job, limiter=None, concurrency=CONCURRENCY, window=WINDOW,
+                 ordered=False):
+    """
+    以管線執行所有工作。
+
+    參數:
+        jobs (iterable): Job 序列（可為產生器，依需要逐一取出）
+        store (callable): store(job, results)，在呼叫端的執行緒執行；results 為 (資料集名稱, DataFrame 或 None) 列表，
+            抓取失敗時為空列表
+        fetch (callable): fetch(job) -> Response 或 None（預設為 sources.fetch_job 並使用 limiter）
+        parse (callable): parse(job, response) -> results（預設為 sources.parse_job）
+        limiter (TokenBucket): 預設抓取函數使用的限流器
+        concurrency (int): 抓取執行緒數
+        window (int): 同時進行中的工作數上限
+        ordered (bool): 是否依工作順序呼叫 store
+
+    回傳:
+        dict: 來源名稱 -> {"jobs", "fetch", "parse", "store"} 的工作數與各階段累計秒數
+    """
+    if fetch is None:
+        def fetch(job):
+            return fetch_job(job, limiter)
+
+    timings = defaultdict(lambda: {"jobs": 0, "fetch": 0.0, "parse": 0.0, "store": 0.0})
+    timings_lock = threading.Lock()
+    slots = threading.Semaphore(window)
+    stop = threading.Event()
+    job_queue = queue.Queue(maxsize=concurrency)
+    parse_queue = queue.Queue(maxsize=window)
+    store_queue = queue.Queue(maxsize=window)
+
+    def timed(job, stage, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            with timings_lock:
+                timings[job.source][stage] += time.perf_counter() - started
+
+    def feed():
+        for seq, job in enumerate(jobs):
+            slots.acquire()
+            if stop.is_set():
+                break
+            job_queue.put((seq, job))
+        for _ in range(concurrency):
+            job_queue.put(_DONE)
+
+    def fetch_worker():
+        while True:
+            item = job_queue.get()
+            if item is _DONE:
+                break
+            seq, job = item
+            response = None
+            if not stop.is_set():
+                try:
+                    response = timed(job, "fetch", fetch, job)
+                except Exception as e:
+                    logging.error(f"Error : {describe(job)} fetch : {e}")
+            parse_queue.put((seq, job, response))
+        parse_queue.put(_DONE)
+
+    def parse_worker():
+        remaining = concurrency
+        while remaining:
+            item = parse_queue.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            seq, job, response = item
+            results = []
+            if response is not None:
+                try:
+                    results = timed(job, "parse", parse, job, response)
+                except Exception as e:
+                    logging.error(f"Error : {describe(job)} parse : {e}")
+            store_queue.put((seq, job, results))
+        store_queue.put(_DONE)
+
+    threads = [threading.Thread(target=feed, daemon=True), threading.Thread(target=parse_worker, daemon=True)]
+    threads += [threading.Thread(target=fetch_worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+
+    buffered = {}
+    next_seq = 0
+    try:
+        while True:
+            item = store_queue.get()
+            if item is _DONE:
+                break
+            seq, job, results = item
+            buffered[seq] = (job, results)
+            # 未要求順序時立即寫入；否則等待前面的工作完成後依序寫入
+            ready = [seq] if not ordered else []
+            while ordered and next_seq in buffered:
+                ready.append(next_seq)
+                next_seq += 1
+            for ready_seq in ready:
+                ready_job, ready_results = buffered.pop(ready_seq)
+                timed(ready_job, "store", store, ready_job, ready_results)
+                with timings_lock:
+                    timings[ready_job.source]["jobs"] += 1
+                slots.release()
+    except BaseException:
+        # 寫入失敗時停止送出新工作，讓仍在進行中的執行緒盡快結束
+        stop.set()
+        for _ in range(window):
+            slots.release()
+        raise
+
+    for source, timing in timings.items():
+        logging.info(f"{source}: {timing['jobs']} jobs, fetch {timing['fetch']:.2f}s, "
+                     f"parse {timing['parse']:.2f}s, store {timing['store']:.2f}s")
+    return dict(timings)
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    令牌桶限流器，可由多個執行緒共用，用來限制對同一資料來源的請求速率。
+
+    參數:
+        rate (float): 每秒補充的令牌數（即長期平均每秒最多可發出的請求數）
+        capacity (int): 令牌桶容量（允許的瞬間爆發請求數）
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("rate 必須大於 0")
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.acquired = 0  # 累計取得的令牌數（即實際發出的請求數）
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0  # 暫停發放令牌直到此時間（time.monotonic）
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self._last_refill = now
+
+    def try_acquire(self):
+        """
+        嘗試取得一個令牌，不等待。
+
+        回傳:
+            float: 0 表示已取得令牌；否則為下一個令牌可用前需等待的秒數
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.acquired += 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """取得一個令牌；若桶內無令牌則阻塞等待至補充完成。"""
+        while True:
+            wait_time = self.try_acquire()
+            if not wait_time:
+                return
+            time.sleep(wait_time)
+
+    async def acquire_async(self):
+        """acquire 的 asyncio 版本：等待令牌時讓出事件迴圈，不阻塞其他協程。"""
+        while True:
+            wait_time = self.try_acquire()
+            if not wait_time:
+                return
+            await asyncio.sleep(wait_time)
+
+    def pause(self, seconds):
+        """暫停發放令牌 seconds 秒（例如伺服器要求稍後再試時），期間所有取得令牌的呼叫都會等待。"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self._last_refill = max(self._last_refill, self._paused_until)
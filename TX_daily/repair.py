@@ -0,0 +1,170 @@
+"""
+缺漏資料修補：建立各資料集已儲存日期的索引，與交易日曆比對後只抓取缺少的交易日，
+並回報每個資料集的涵蓋率。已完整的資料集不會發出任何請求，適合每晚執行。
+
+執行方式: python repair.py [起始日期] [結束日期]（YYYY-MM-DD；未指定起始日期時從各資料集的第一筆資料開始，
+結束日期預設為昨天）
+"""
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+
+from initial import CONCURRENCY, create_limiter
+from pipeline import run_pipeline
+from sources import Job
+from storage import DATE_COLUMN, get_store
+from taifex_history import MAX_RANGE_DAYS
+from trading_calendar import TradingCalendar
+from update import DATASET_FILES, update_data
+
+REPAIR_DATASETS = ["tx_fund_data", "tx_closed_data", "txf_data", "txop_data"]  # 需要修補的資料集
+
+
+def stored_dates(store, dataset):
+    """只讀取日期欄位，回傳資料集中已儲存的日期集合（YYYY-MM-DD）。"""
+    if not store.exists(dataset):
+        return set()
+    dates = store.read(dataset, columns=[DATE_COLUMN])[DATE_COLUMN]
+    return set(dates.dt.strftime("%Y-%m-%d").unique())
+
+
+def group_ranges(dates, trading_days, max_days=MAX_RANGE_DAYS):
+    """
+    將缺少的日期依交易日的連續性分組為 (起, 迄) 區間，每個區間最多涵蓋 max_days 天，
+    讓期交所的區間下載能一次補齊連續缺漏的多個交易日。
+    """
+    position = {day: i for i, day in enumerate(trading_days)}
+    ranges = []
+    for date in sorted(dates):
+        if ranges:
+            range_start, range_end = ranges[-1]
+            if position[date] == position[range_end] + 1 and (date - range_start).days < max_days:
+                ranges[-1] = (range_start, date)
+                continue
+        ranges.append((date, date))
+    return ranges
+
+
+def plan_jobs(missing, trading_days):
+    """
+    依資料來源的特性將缺少的日期轉換為抓取工作：
+    三大法人每日一次請求、成交資料每月一次請求、期貨與選擇權以連續區間下載。
+
+    回傳:
+        list: Job 列表
+    """
+    jobs = [Job("BFI82U", date) for date in sorted(missing["tx_fund_data"])]
+    for year, month in sorted({(date.year, date.month) for date in missing["tx_closed_data"]}):
+        jobs.append(Job("FMTQIK", datetime(year, month, 1)))
+    for dataset, source in (("txf_data", "futContractsDateDown"), ("txop_data", "optContractsDateDown")):
+        for range_start, range_end in group_ranges(missing[dataset], trading_days):
+            jobs.append(Job(source, range_start, range_end))
+    return jobs
+
+
+def repair(start_date=None, end_date=None, base_dir=".", concurrency=CONCURRENCY, rate=None, today=None):
+    """
+    修補各資料集缺少的交易日資料，並回傳每個資料集的涵蓋率統計。
+
+    只有已確認的交易日（交易日曆中已抓取的月份，或任一資料集已儲存的日期）才會被視為缺漏；
+    當月會另外抓取一次 FMTQIK 確認至昨天為止的交易日，當月的缺漏也能立即修補。
+    仍無法確認的日期（例如 FMTQIK 抓取失敗）可能是假日，只計入 unconfirmed，暫不修補。
+    今天的資料可能尚未公布，檢查範圍最晚只到昨天。
+
+    參數:
+        start_date (datetime): 檢查範圍的起始日期（None 表示從各資料集的第一筆資料開始）
+        end_date (datetime): 檢查範圍的結束日期（None 表示昨天；晚於昨天時以昨天為準）
+        base_dir (str): 資料檔所在資料夾
+        concurrency (int): 同時進行中的請求數
+        rate (float): 每秒請求數上限（None 使用 initial.REQUESTS_PER_SECOND）
+        today (datetime): 判斷資料是否已公布的基準日（預設為現在）
+
+    回傳:
+        dict: 資料集名稱 -> {"expected", "stored", "repaired", "missing", "unconfirmed"} 統計
+    """
+    today = today or datetime.now()
+    last_published = today - timedelta(days=1)
+    end_date = min(end_date, last_published) if end_date else last_published
+    limiter = create_limiter(rate) if rate is not None else create_limiter()
+    store = get_store(base_dir)
+
+    index = {dataset: stored_dates(store, dataset) for dataset in REPAIR_DATASETS}
+    starts = {}
+    for dataset, dates in index.items():
+        if start_date is not None:
+            starts[dataset] = start_date
+        elif dates:
+            starts[dataset] = datetime.strptime(min(dates), "%Y-%m-%d")
+    if not starts:
+        logging.warning("No stored data to repair. Please run initial.py first.")
+        return {}
+
+    # 交易日曆只補抓尚未完整的月份（含當月至昨天為止），之後的比對完全在記憶體中進行
+    calendar = TradingCalendar(os.path.join(base_dir, "trading_calendar.json"),
+                               seed_csv_path=os.path.join(base_dir, "tx_closed_data.csv"))
+    calendar.refresh(min(starts.values()), end_date, limiter=limiter, today=today, include_current=True)
+    # 任一資料集已儲存的日期必定是交易日：交易日曆由成交資料補充時，成交資料缺少的日期仍可由其他資料集得知
+    calendar.trading_days.update(set().union(*index.values()))
+    candidates = calendar.trading_days_between(min(starts.values()), end_date)
+    trading_days = [day for day in candidates if day.strftime("%Y-%m-%d") in calendar.trading_days]
+    unconfirmed_days = [day for day in candidates if day.strftime("%Y-%m-%d") not in calendar.trading_days]
+
+    missing = {}
+    expected = {}
+    unconfirmed = {}
+    for dataset in REPAIR_DATASETS:
+        days = [day for day in trading_days if dataset in starts and day >= starts[dataset]]
+        expected[dataset] = len(days)
+        missing[dataset] = {day for day in days if day.strftime("%Y-%m-%d") not in index[dataset]}
+        unconfirmed[dataset] = sum(1 for day in unconfirmed_days if dataset in starts and day >= starts[dataset])
+
+    jobs = plan_jobs(missing, trading_days)
+    logging.info(f"Repair: {sum(len(days) for days in missing.values())} missing days, {len(jobs)} requests.")
+
+    # 抓取同時進行並共用限流器；寫入只在主執行緒逐一進行
+    def store_job(job, results):
+        for dataset, data in results:
+            if data is not None:
+                update_data(os.path.join(base_dir, DATASET_FILES[dataset]), data)
+
+    run_pipeline(jobs, store_job, limiter=limiter, concurrency=concurrency)
+
+    report = {}
+    for dataset in REPAIR_DATASETS:
+        after = stored_dates(store, dataset)
+        still_missing = sorted(day for day in missing[dataset] if day.strftime("%Y-%m-%d") not in after)
+        report[dataset] = {
+            "expected": expected[dataset],
+            "stored": expected[dataset] - len(still_missing),
+            "repaired": len(missing[dataset]) - len(still_missing),
+            "missing": [day.strftime("%Y-%m-%d") for day in still_missing],
+            "unconfirmed": unconfirmed[dataset],
+        }
+    return report
+
+
+def print_report(report):
+    """輸出每個資料集的涵蓋率，並寫入 update.log。"""
+    for dataset, stats in report.items():
+        coverage = stats["stored"] / stats["expected"] * 100 if stats["expected"] else 100.0
+        message = (f"{dataset}: 涵蓋率 {coverage:.2f}%（{stats['stored']}/{stats['expected']} 個交易日），"
+                   f"本次補齊 {stats['repaired']} 天，仍缺少 {len(stats['missing'])} 天")
+        if stats["unconfirmed"]:
+            message += f"；另有 {stats['unconfirmed']} 天無法由成交資料確認是否為交易日，暫不修補"
+        print(message)
+        logging.info(message)
+        if stats["missing"]:
+            print(f"  仍缺少：{', '.join(stats['missing'][:10])}{' ...' if len(stats['missing']) > 10 else ''}")
+
+
+def main():
+    start_date = datetime.strptime(sys.argv[1], "%Y-%m-%d") if len(sys.argv) > 1 else None
+    end_date = datetime.strptime(sys.argv[2], "%Y-%m-%d") if len(sys.argv) > 2 else None
+    logging.info("Start repair...")
+    print_report(repair(start_date, end_date))
+    logging.info("End...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+"""
+TWSE 與期交所的本機替代伺服器與離線重播工具。
+
+依模擬的日期與時間回應 BFI82U / FMTQIK 的 JSON 與 futContractsDate / optContractsDate 的 HTML，
+可設定回應延遲、錯誤率與「尚未發布」的情況，讓 update.py 等流程不必連線至 twse.com.tw /
+taifex.com.tw 就能重現問題、壓力測試與效能分析。
+
+回應內容優先使用錄製檔（recordings/<來源>/<日期>.json 或 .html，可由 http_cache 匯出）；
+沒有錄製檔的日期以週一至週五為交易日產生合成資料（期交所頁面以 sample/ 中的頁面為樣板）。
+
+執行方式:
+    python replay_server.py serve [--port 8000] [--now "2025-01-22 16:00"] [--latency 秒] [--error-rate 比例]
+        啟動替代伺服器，再以 python update.py --base-url http://127.0.0.1:8000 2025-01-22 執行每日更新；
+        模擬時間可由 GET /_replay/clock?now=2025-01-23T16:00 調整（同一天重複執行時設定 TX_HTTP_TODAY_TTL=0，
+        避免讀到快取中的舊回應）
+    python replay_server.py replay 起始日期 結束日期 [--latency 秒] [--error-rate 比例] [--late-rate 比例] [--run-time 16:00]
+        在暫存資料夾中以模擬時鐘逐日執行 update.main()，重播整段期間的每日更新；
+        每個交易日 4 個請求，約 0.2 秒（主要為寫入資料檔與產生報告檔），約 50 個日曆天需時約 8 秒
+    python replay_server.py record [http_cache 資料夾] [recordings 資料夾]
+        將 http_cache 中的 TWSE / 期交所回應匯出為錄製檔
+"""
+import glob
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+RECORDINGS_DIR = "recordings"  # 錄製檔資料夾
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample")  # 期交所頁面樣板所在資料夾
+TEMPLATE_DATE = "2025/01/22"  # 樣板頁面中的資料日期
+NOT_FOUND_STAT = "很抱歉，沒有符合條件的資料!"  # TWSE 查無資料（含尚未發布）時的 stat
+FUND_UNITS = ["自營商(自行買賣)", "自營商(避險)", "投信", "外資及陸資(不含外資自營商)", "外資自營商"]
+LATE_MINUTES = 120  # 延遲發布時晚於預期發布時間的分鐘數
+RUN_TIME = "16:00"  # 重播時每天執行 update.main() 的模擬時間
+CLOCK_FORMATS = ("%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M", "%Y-%m-%d")  # 模擬時間的輸入格式
+
+# 網址路徑 -> (來源名稱, 錄製檔副檔名)
+ROUTES = {
+    "/rwd/zh/fund/BFI82U": ("BFI82U", ".json"),
+    "/rwd/zh/afterTrading/FMTQIK": ("FMTQIK", ".json"),
+    "/cht/3/futContractsDate": ("futContractsDate", ".html"),
+    "/cht/3/optContractsDate": ("optContractsDate", ".html"),
+}
+
+
+def roc_date(day):
+    """西元日期轉為 TWSE 的民國年日期字串（例如 "114/01/22"）。"""
+    return f"{day.year - 1911}/{day.month:02d}/{day.day:02d}"
+
+
+def parse_clock(text):
+    for clock_format in CLOCK_FORMATS:
+        try:
+            return datetime.strptime(text, clock_format)
+        except ValueError:
+            continue
+    raise ValueError(f"無法解析的模擬時間：{text!r}")
+
+
+class ReplayData:
+    """
+    替代伺服器回應的資料來源：錄製檔優先，沒有錄製檔時產生固定（可重現）的合成資料。
+
+    參數:
+        recordings_dir (str): 錄製檔資料夾
+        template_dir (str): 期交所頁面樣板所在資料夾
+    """
+
+    def __init__(self, recordings_dir=RECORDINGS_DIR, template_dir=TEMPLATE_DIR):
+        self.recordings_dir = recordings_dir
+        self.template_dir = template_dir
+        self._months = {}
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def recording(self, source, key, extension):
+        """讀取錄製檔內容（文字），不存在時回傳 None。"""
+        path = os.path.join(self.recordings_dir, source, key + extension)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def trading_days(self, year, month):
+        """該月份的交易日（依日期排序的 date 列表）：有 FMTQIK 錄製檔時以其為準，否則為週一至週五。"""
+        with self._lock:
+            if (year, month) not in self._months:
+                recorded = self.recording("FMTQIK", f"{year}{month:02d}", ".json")
+                if recorded is not None:
+                    days = []
+                    for row in json.loads(recorded).get("data", []):
+                        roc_year, roc_month, roc_day = map(int, row[0].split("/"))
+                        days.append(datetime(roc_year + 1911, roc_month, roc_day).date())
+                else:
+                    day = datetime(year, month, 1)
+                    days = []
+                    while day.month == month:
+                        if day.weekday() < 5:
+                            days.append(day.date())
+                        day += timedelta(days=1)
+                self._months[(year, month)] = sorted(days)
+            return self._months[(year, month)]
+
+    def is_trading_day(self, day):
+        return day.date() in self.trading_days(day.year, day.month)
+
+    def fund(self, day):
+        """BFI82U 單日三大法人買賣金額的 JSON 內容。"""
+        recorded = self.recording("BFI82U", day.strftime("%Y%m%d"), ".json")
+        if recorded is not None:
+            return json.loads(recorded)
+        rng = random.Random(f"BFI82U{day:%Y%m%d}")
+        rows, totals = [], [0, 0]
+        for unit in FUND_UNITS:
+            buy, sell = rng.randrange(10**8, 10**11), rng.randrange(10**8, 10**11)
+            totals[0] += buy
+            totals[1] += sell
+            rows.append([unit, f"{buy:,}", f"{sell:,}", f"{buy - sell:,}"])
+        rows.append(["合計", f"{totals[0]:,}", f"{totals[1]:,}", f"{totals[0] - totals[1]:,}"])
+        return {"stat": "OK", "date": day.strftime("%Y%m%d"), "data": rows}
+
+    def twse_month(self, year, month):
+        """FMTQIK 整個月份每日成交資料的 JSON 內容。"""
+        recorded = self.recording("FMTQIK", f"{year}{month:02d}", ".json")
+        if recorded is not None:
+            return json.loads(recorded)
+        rows = []
+        for day in self.trading_days(year, month):
+            index = self.synthetic_index(day)
+            change = index - self.synthetic_index(day - timedelta(days=1))
+            amount = random.Random(f"FMTQIK{day:%Y%m%d}").randrange(2 * 10**11, 6 * 10**11)
+            rows.append([roc_date(day), f"{amount // 50:,}", f"{amount:,}", "2,000,000", f"{index:,.2f}", f"{change:.2f}"])
+        return {"stat": "OK", "date": f"{year}{month:02d}01", "data": rows}
+
+    @staticmethod
+    def synthetic_index(day):
+        return round(20000 + 3000 * math.sin(day.toordinal() / 50), 2)
+
+    def taifex_page(self, source, day):
+        """期交所三大法人頁面（指定資料日期）的 HTML。"""
+        recorded = self.recording(source, day.strftime("%Y%m%d"), ".html")
+        if recorded is not None:
+            return recorded
+        with self._lock:
+            if source not in self._templates:
+                with open(os.path.join(self.template_dir, source + ".html"), encoding="utf-8") as f:
+                    self._templates[source] = f.read()
+        return self._templates[source].replace(TEMPLATE_DATE, day.strftime("%Y/%m/%d"))
+
+
+class ReplayServer:
+    """
+    以模擬時鐘回應 TWSE / 期交所請求的本機 HTTP 伺服器。
+
+    來源在交易日的發布時間（預設為 watch.EXPECTED_PUBLISH_TIMES）之前視為尚未發布：
+    BFI82U 回傳查無資料、FMTQIK 不含當天、期交所頁面仍顯示前一個已發布交易日的資料。
+
+    參數:
+        data (ReplayData): 回應的資料來源
+        port (int): 監聽的連接埠（0 表示自動選擇）
+        now (datetime): 初始的模擬時間（預設為現在）
+        latency (float): 每個回應的延遲秒數（實際延遲在 0.5～1.5 倍之間隨機）
+        error_rate (float): 回應 503 錯誤的機率
+        late_rate (float): 某來源某天延遲 LATE_MINUTES 分鐘才發布的機率
+        publish_times (dict): 來源名稱 -> 預期發布時間 "HH:MM"
+        seed (int): 隨機數種子（相同設定可重現相同的錯誤與延遲發布）
+    """
+
+    def __init__(self, data=None, port=0, now=None, latency=0.0, error_rate=0.0, late_rate=0.0, publish_times=None,
+                 seed=0):
+        if publish_times is None:
+            from watch import EXPECTED_PUBLISH_TIMES as publish_times
+        self.data = data or ReplayData()
+        self.now = now or datetime.now()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.late_rate = late_rate
+        self.publish_times = publish_times
+        self.seed = seed
+        self.stats = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), ReplayHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.replay = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def set_now(self, now):
+        with self._lock:
+            self.now = now
+
+    def publish_time(self, source, day):
+        """來源在指定交易日的發布時間（依 late_rate 決定是否延遲發布，同一天的結果固定）。"""
+        hour, minute = map(int, self.publish_times[source].split(":"))
+        published = datetime(day.year, day.month, day.day, hour, minute)
+        if random.Random(f"{self.seed}{source}{day:%Y%m%d}").random() < self.late_rate:
+            published += timedelta(minutes=LATE_MINUTES)
+        return published
+
+    def is_published(self, source, day):
+        return self.data.is_trading_day(day) and self.now >= self.publish_time(source, day)
+
+    def latest_published(self, source, max_days=31):
+        """模擬時間當下最近一個已發布的交易日；找不到時回傳 None。"""
+        day = datetime(self.now.year, self.now.month, self.now.day)
+        for _ in range(max_days):
+            if self.is_published(source, day):
+                return day
+            day -= timedelta(days=1)
+        return None
+
+    def respond(self, path, query):
+        """
+        產生回應。
+
+        回傳:
+            tuple: (狀態碼, Content-Type, 內容 bytes)
+        """
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = self.latency * self._random.uniform(0.5, 1.5) if self.latency else 0
+            failed = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if path == "/_replay/clock":
+            if "now" in query:
+                self.set_now(parse_clock(query["now"][0]))
+            return 200, "text/plain; charset=utf-8", self.now.isoformat().encode("utf-8")
+        if path not in ROUTES:
+            return 404, "text/plain; charset=utf-8", b"Not Found"
+        if failed:
+            self.count("errors")
+            return 503, "text/plain; charset=utf-8", b"Service Unavailable"
+
+        source, _ = ROUTES[path]
+        self.count(source)
+        if source == "BFI82U":
+            day = datetime.strptime(query["dayDate"][0], "%Y%m%d")
+            payload = self.data.fund(day) if self.is_published(source, day) else {"stat": NOT_FOUND_STAT}
+        elif source == "FMTQIK":
+            month = datetime.strptime(query["date"][0], "%Y%m%d")
+            payload = self.data.twse_month(month.year, month.month)
+            published = [row for row in payload.get("data", []) if self.is_published(source, self.row_date(row))]
+            payload = dict(payload, data=published) if published else {"stat": NOT_FOUND_STAT}
+        else:
+            day = self.latest_published(source)
+            if day is None:
+                return 200, "text/html; charset=utf-8", b"<html><body></body></html>"
+            return 200, "text/html; charset=utf-8", self.data.taifex_page(source, day).encode("utf-8")
+        if payload.get("stat") != "OK":
+            self.count("not_published")
+        return 200, "application/json; charset=utf-8", json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+    @staticmethod
+    def row_date(row):
+        roc_year, month, day = map(int, row[0].split("/"))
+        return datetime(roc_year + 1911, month, day)
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 支援 keep-alive，與正式主機一樣重複使用連線
+
+    def do_GET(self):
+        self.handle_request({})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.handle_request(parse_qs(self.rfile.read(length).decode("utf-8")))
+
+    def handle_request(self, form):
+        url = urlsplit(self.path)
+        query = dict(parse_qs(url.query), **form)
+        status, content_type, body = self.server.replay.respond(url.path, query)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # 不輸出每個請求的存取紀錄
+
+
+def replay(start_date, end_date, data=None, run_time=RUN_TIME, workdir=None, **server_options):
+    """
+    在 workdir（預設為新的暫存資料夾）中以模擬時鐘逐日執行 update.main()，所有請求都送至替代伺服器。
+
+    參數:
+        start_date (datetime): 起始日期
+        end_date (datetime): 結束日期
+        data (ReplayData): 回應的資料來源
+        run_time (str): 每天執行更新的模擬時間 "HH:MM"
+        workdir (str): 資料檔、快取與紀錄檔的資料夾
+        server_options: 傳給 ReplayServer 的延遲、錯誤率等設定
+
+    回傳:
+        dict: 重播天數、耗時、伺服器統計、各資料集的列數與 workdir
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="tx_replay_")
+    data = data or ReplayData(os.path.abspath(RECORDINGS_DIR))
+    os.makedirs(workdir, exist_ok=True)
+    previous_dir = os.getcwd()
+    os.chdir(workdir)
+    server = ReplayServer(data=data, **server_options).start()
+    import http_client
+    import sources
+    import update
+    from storage import get_store
+
+    saved = (dict(sources.BASE_URLS), sources.MIN_DELAY, sources.MAX_DELAY, http_client.TODAY_TTL, http_client.clock)
+    sources.set_base_url(server.base_url)
+    sources.MIN_DELAY = sources.MAX_DELAY = 0  # 模擬時間不等待重試延遲
+    http_client.TODAY_TTL = 0  # 模擬時間遠快於實際時間，「今天」的快取一律視為過期
+    hour, minute = map(int, run_time.split(":"))
+    days = 0
+    started = time.perf_counter()
+    try:
+        day = start_date
+        while day.date() <= end_date.date():
+            now = datetime(day.year, day.month, day.day, hour, minute)
+            server.set_now(now)
+            http_client.clock = lambda now=now: now
+            update.main(now)
+            days += 1
+            day += timedelta(days=1)
+        elapsed = time.perf_counter() - started
+        store = get_store(".")
+        rows = {dataset: len(store.read(dataset)) for dataset in update.DATASET_FILES if store.exists(dataset)}
+    finally:
+        sources.BASE_URLS.update(saved[0])
+        sources.MIN_DELAY, sources.MAX_DELAY, http_client.TODAY_TTL, http_client.clock = saved[1:]
+        server.stop()
+        os.chdir(previous_dir)
+    return {"days": days, "elapsed": elapsed, "stats": dict(server.stats), "rows": rows, "workdir": workdir}
+
+
+def record(cache_dir="http_cache", recordings_dir=RECORDINGS_DIR):
+    """
+    將 http_cache 中 TWSE / 期交所的回應匯出為錄製檔。期交所頁面以頁面中的資料日期命名。
+
+    回傳:
+        int: 匯出的檔案數
+    """
+    from taifex_parser import fast_extract_date
+
+    exported = 0
+    for index_path in glob.glob(os.path.join(cache_dir, "index", "*", "*.json")):
+        with open(index_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        url = urlsplit(meta["url"])
+        if url.path not in ROUTES or meta["status_code"] != 200:
+            continue
+        source, extension = ROUTES[url.path]
+        blob = os.path.join(cache_dir, "blobs", meta["content_hash"][:2], meta["content_hash"])
+        with open(blob, "rb") as f:
+            text = f.read().decode("utf-8")
+        query = parse_qs(url.query)
+        if source == "BFI82U":
+            if json.loads(text).get("stat") != "OK":
+                continue
+            key = query["dayDate"][0]
+        elif source == "FMTQIK":
+            if json.loads(text).get("stat") != "OK":
+                continue
+            key = query["date"][0][:6]
+        else:
+            page_date = fast_extract_date(text)
+            if page_date is None:
+                continue
+            key = page_date.replace("/", "")
+        path = os.path.join(recordings_dir, source, key + extension)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        exported += 1
+    return exported
+
+
+def parse_options(args):
+    """將命令列參數分為位置參數與 "--名稱 值" 選項。"""
+    positional, options = [], {}
+    index = 0
+    while index < len(args):
+        if args[index].startswith("--"):
+            options[args[index][2:].replace("-", "_")] = args[index + 1]
+            index += 2
+        else:
+            positional.append(args[index])
+            index += 1
+    return positional, options
+
+
+def server_options(options):
+    return {
+        "latency": float(options.get("latency", 0)),
+        "error_rate": float(options.get("error_rate", 0)),
+        "late_rate": float(options.get("late_rate", 0)),
+        "seed": int(options.get("seed", 0)),
+    }
+
+
+def main():
+    args, options = parse_options(sys.argv[1:])
+    command = args[0] if args else None
+    if command == "serve":
+        server = ReplayServer(port=int(options.get("port", 8000)), now=parse_clock(options["now"]) if "now" in options else None,
+                              **server_options(options)).start()
+        print(f"替代伺服器已啟動：{server.base_url}（模擬時間 {server.now:%Y-%m-%d %H:%M}），按 Ctrl+C 結束")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.stop()
+    elif command == "replay" and len(args) == 3:
+        start_date = datetime.strptime(args[1], "%Y-%m-%d")
+        end_date = datetime.strptime(args[2], "%Y-%m-%d")
+        result = replay(start_date, end_date, run_time=options.get("run_time", RUN_TIME), workdir=options.get("workdir"),
+                        **server_options(options))
+        stats = result["stats"]
+        print(f"重播 {result['days']} 天，耗時 {result['elapsed']:.1f} 秒（平均每天 {result['elapsed'] / result['days'] * 1000:.0f} 毫秒）")
+        print(f"伺服器共收到 {stats.get('requests', 0)} 個請求，其中 {stats.get('errors', 0)} 個錯誤回應、"
+              f"{stats.get('not_published', 0)} 個尚未發布回應")
+        for dataset, count in result["rows"].items():
+            print(f"{dataset}: {count} 筆資料")
+        print(f"資料檔與 update.log 位於 {result['workdir']}")
+    elif command == "record":
+        print(f"已匯出 {record(*args[1:3])} 個錄製檔。")
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
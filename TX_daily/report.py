@@ -0,0 +1,174 @@
+"""
+每日市場報告：在 update.py 寫入資料後預先計算報告所需的數字（億元換算、買超／賣超、各身份別的未平倉口數），
+存成一個小型 JSON 檔（latest_report.json），telegram_bot.py 只需讀取這個檔案即可組成報告文字。
+
+報告檔記錄產生時的資料版本（storage 的 data_version），讀取端可據此判斷報告檔是否對應目前的資料。
+"""
+import json
+import logging
+import os
+from datetime import datetime
+
+from storage import atomic_write, write_json
+
+REPORT_FILE_NAME = "latest_report.json"  # 報告檔名稱（與資料檔位於同一資料夾）
+REPORT_SCHEMA_VERSION = 1  # 報告檔格式版本，格式改變時遞增
+FUND_DATASET = "tx_fund_data"
+TWSE_DATASET = "tx_closed_data"
+TXF_DATASET = "txf_data"
+TXOP_DATASET = "txop_data"
+REPORT_DATASETS = [TWSE_DATASET, FUND_DATASET, TXF_DATASET, TXOP_DATASET]
+TAIFEX_REPORT_COLUMNS = ["商品名稱", "身份別", "多空交易口數淨額", "多空未平倉口數淨額"]  # 報告中期貨與選擇權所需的欄位
+TAIFEX_ENTITIES = ["投信", "自營商", "外資"]  # 報告中期貨與選擇權列出的身份別（依序）
+NUM_FUND_ROWS = 6  # 三大法人每天的資料列數
+
+
+def side(amount):
+    """依金額正負回傳「賣超」或「買超」。"""
+    return "賣超" if amount < 0 else "買超"
+
+
+def twse_section(store):
+    """加權指數、漲跌點數與成交金額（億元）。"""
+    latest = store.read_last_rows(TWSE_DATASET, 1).iloc[-1]
+    return {
+        "date": latest["日期"].strftime("%Y-%m-%d"),
+        "index": float(latest["加權指數"]),
+        "change": float(latest["漲跌點數"]),
+        "amount": int(latest["成交金額"]),
+        "amount_yi": int(latest["成交金額"]) // 10**8,  # 原始數據為「元」
+    }
+
+
+def fund_section(store):
+    """最新日期各單位的買賣差額（億元，保留兩位小數）與總合計。"""
+    fund_df = store.read_latest(FUND_DATASET, columns=["單位名稱", "買賣差額"])
+    if "單位名稱" not in fund_df.columns:
+        raise ValueError(f"CSV 中無法找到 '單位名稱' 欄位，讀取到的欄位名稱有: {list(fund_df.columns)}")
+    last_rows = fund_df.tail(NUM_FUND_ROWS)
+    units = []
+    for _, row in last_rows.iterrows():
+        net_yi = round(row["買賣差額"] / 10**8, 2)
+        units.append({"name": str(row["單位名稱"]), "net_yi": net_yi, "side": side(net_yi)})
+    total = int(last_rows[last_rows["單位名稱"] == "合計"]["買賣差額"].values[0])
+    total_yi = round(total / 10**8, 2)
+    return {
+        "date": fund_df["日期"].max().strftime("%Y-%m-%d"),
+        "units": units,
+        "total": total,
+        "total_yi": total_yi,
+        "total_side": side(total_yi),
+    }
+
+
+def taifex_section(store, dataset, product_name):
+    """最新日期各身份別的多空未平倉口數淨額與多空交易口數淨額。"""
+    latest_df = store.read_latest(dataset, columns=TAIFEX_REPORT_COLUMNS)
+    entities = []
+    for entity in TAIFEX_ENTITIES:
+        entity_data = latest_df[(latest_df["商品名稱"] == product_name) & (latest_df["身份別"] == entity)]
+        if not entity_data.empty:
+            entities.append({
+                "name": entity,
+                "open_interest_net": int(entity_data["多空未平倉口數淨額"].values[0]),
+                "trade_net": int(entity_data["多空交易口數淨額"].values[0]),
+            })
+    return {"date": latest_df["日期"].max().strftime("%Y-%m-%d"), "entities": entities}
+
+
+def build_report(store):
+    """
+    由資料集（建議傳入 store.snapshot()）計算報告所需的數字。
+    資料集不存在的段落為 None；三大法人段落處理失敗時記錄錯誤並略過，其餘段落的錯誤則拋出。
+
+    回傳:
+        dict: 報告內容（可直接存成 JSON）
+    """
+    report = {"schema": REPORT_SCHEMA_VERSION, "twse": None, "fund": None, "txf": None, "txop": None}
+    if store.exists(TWSE_DATASET):
+        report["twse"] = twse_section(store)
+    else:
+        logging.warning("無法找到 TWSE 資料檔案，請檢查檔案路徑。")
+    if store.exists(FUND_DATASET):
+        try:
+            report["fund"] = fund_section(store)
+        except Exception as e:
+            logging.error(f"處理三大法人資料時發生錯誤: {e}")
+    else:
+        logging.warning("無法找到三大法人買賣超資料檔案，請檢查檔案路徑。")
+    for key, dataset, product_name, label in [("txf", TXF_DATASET, "臺股期貨", "期貨"),
+                                              ("txop", TXOP_DATASET, "選擇權", "選擇權")]:
+        if store.exists(dataset):
+            report[key] = taifex_section(store, dataset, product_name)
+        else:
+            logging.warning(f"無法找到{label}資料檔案，請檢查檔案路徑。")
+    return report
+
+
+def format_report(report):
+    """將報告內容組成 Telegram 訊息文字。"""
+    text = ""
+    twse = report["twse"]
+    if twse is not None:
+        text += f"日期: {twse['date']}\n"
+        text += f"加權指數: {twse['index']:,.2f}\n"
+        text += f"漲跌點數: {twse['change']:.2f}\n"
+        text += f"成交金額: {twse['amount_yi']} 億元\n\n"
+    fund = report["fund"]
+    if fund is not None:
+        text += f"日期: {fund['date']}\n"
+        for unit in fund["units"]:
+            text += f"{unit['name']}: {unit['net_yi']} 億元 ({unit['side']})\n"
+        text += f"總合計: {fund['total_yi']} 億元 ({fund['total_side']})\n\n"
+    for key, label in [("txf", "期貨"), ("txop", "選擇權")]:
+        section = report[key]
+        if section is None:
+            continue
+        text += f"{label}多空未平倉口數淨額 (日期: {section['date']})\n"
+        for entity in section["entities"]:
+            text += f"{entity['name']}: {entity['open_interest_net']:,} ({entity['trade_net']:+,})口\n"
+        text += "\n"
+    return text
+
+
+def write_report(store, base_dir="."):
+    """
+    以資料集的快照（store.snapshot()）計算報告，連同資料版本寫入報告檔（暫存檔寫入後原子替換）。
+
+    回傳:
+        dict: 寫入的報告內容
+    """
+    snapshot = store.snapshot()
+    version = snapshot.data_version(REPORT_DATASETS)
+    report = build_report(snapshot)
+    report["data_version"] = version
+    report["generated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    file_path = os.path.join(base_dir, REPORT_FILE_NAME)
+    atomic_write(file_path, lambda temp_path: write_json(temp_path, report))
+    logging.info(f"已更新報告檔 {file_path}（資料版本 {version}）")
+    return report
+
+
+def load_report(base_dir=".", data_version=None):
+    """
+    讀取報告檔。
+
+    參數:
+        base_dir (str): 報告檔所在資料夾
+        data_version: 目前的資料版本；指定時只接受以相同資料版本產生的報告檔
+
+    回傳:
+        dict: 報告內容
+        None: 報告檔不存在、格式版本不符或與目前的資料版本不符時
+    """
+    try:
+        with open(os.path.join(base_dir, REPORT_FILE_NAME), encoding="utf-8") as f:
+            report = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if report.get("schema") != REPORT_SCHEMA_VERSION:
+        return None
+    # JSON 中的版本標記為巢狀列表，與目前的版本標記經過相同的轉換後比較
+    if data_version is not None and report.get("data_version") != json.loads(json.dumps(data_version)):
+        return None
+    return report
@@ -0,0 +1,94 @@
+import pandas as pd
+
+from converters import ISO_DATE_FORMAT, parse_dates, parse_number
+
+# 各資料集的欄位型別定義：金額與口數為 int64、指數為 float64、身份類欄位為 category
+FUND_SCHEMA = {
+    "日期": "datetime64[ns]",
+    "單位名稱": "category",
+    "買進金額": "int64",
+    "賣出金額": "int64",
+    "買賣差額": "int64",
+}
+
+TWSE_SCHEMA = {
+    "日期": "datetime64[ns]",
+    "成交金額": "int64",
+    "加權指數": "float64",
+    "漲跌點數": "float64",
+}
+
+TAIFEX_SCHEMA = {
+    "日期": "datetime64[ns]",
+    "商品名稱": "category",
+    "身份別": "category",
+    "多方交易口數": "int64",
+    "多方交易契約金額(千元)": "int64",
+    "空方交易口數": "int64",
+    "空方交易契約金額(千元)": "int64",
+    "多空交易口數淨額": "int64",
+    "多空交易契約金額淨額(千元)": "int64",
+    "多方未平倉口數": "int64",
+    "多方未平倉契約金額(千元)": "int64",
+    "空方未平倉口數": "int64",
+    "空方未平倉契約金額(千元)": "int64",
+    "多空未平倉口數淨額": "int64",
+    "多空未平倉契約金額淨額(千元)": "int64",
+}
+
+DATE_FORMAT = ISO_DATE_FORMAT  # 儲存於 CSV 中的日期格式
+
+
+def apply_schema(df, schema):
+    """
+    依資料結構定義將 DataFrame 各欄位轉為對應型別，只處理 df 中存在的欄位。
+
+    參數:
+        df (DataFrame): 原始資料（欄位可為字串）
+        schema (dict): 欄位名稱對應型別的定義
+
+    回傳:
+        DataFrame: 轉型後的新 DataFrame
+    """
+    df = df.copy()
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            continue
+        if dtype.startswith("datetime64"):
+            df[column] = parse_dates(df[column])
+        elif dtype == "category":
+            df[column] = df[column].astype("category")
+        else:
+            df[column] = parse_number(df[column], dtype)
+    return df
+
+
+def read_typed_csv(file_path, schema, usecols=None):
+    """
+    讀取已遷移為數值格式的 CSV，並依資料結構定義直接指定型別，避免讀取後再逐欄轉換。
+
+    參數:
+        file_path (str): CSV 檔案路徑
+        schema (dict): 欄位名稱對應型別的定義
+        usecols (list): 只讀取的欄位（None 表示全部）
+
+    回傳:
+        DataFrame: 已轉型的資料
+    """
+    dtypes = {column: dtype for column, dtype in schema.items() if not dtype.startswith("datetime64")}
+    df = pd.read_csv(file_path, dtype=dtypes, usecols=usecols, encoding="utf-8-sig")
+    for column, dtype in schema.items():
+        if dtype.startswith("datetime64") and column in df.columns:
+            df[column] = parse_dates(df[column])
+    return df
+
+
+def schema_for(columns):
+    """依欄位名稱判斷資料集並回傳對應的資料結構定義。"""
+    if "商品名稱" in columns and "身份別" in columns:
+        return TAIFEX_SCHEMA
+    if "單位名稱" in columns:
+        return FUND_SCHEMA
+    if "加權指數" in columns:
+        return TWSE_SCHEMA
+    raise ValueError(f"無法辨識的資料欄位：{list(columns)}")
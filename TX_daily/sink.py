@@ -0,0 +1,81 @@
+import json
+import os
+
+from storage import publish_committed
+
+
+class CheckpointedCsvSink:
+    """
+    逐批附加寫入 CSV 並記錄檢查點的輸出端，取代在記憶體中累積整份 DataFrame 再一次寫檔的做法。
+
+    每次寫入後會把「最後完成的鍵值」與當下的檔案位移量記錄於 `<file_path>.checkpoint`。
+    重新執行時，檔案會先截斷回檢查點位移量（丟棄中斷前寫了一半的資料），
+    呼叫端再從 `last_completed` 之後接續抓取即可。
+    每批資料 fsync 後提交新的長度（storage.publish_committed），同時讀取的 telegram_bot.py 不會讀到寫到一半的資料列。
+
+    參數:
+        file_path (str): 輸出的 CSV 檔案路徑
+        columns (list): CSV 欄位名稱
+    """
+
+    def __init__(self, file_path, columns):
+        self.file_path = file_path
+        self.columns = columns
+        self.checkpoint_path = f"{file_path}.checkpoint"
+        self.last_completed = None
+        self._offset = None
+        self._file = None
+        self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        if os.path.exists(self.checkpoint_path) and os.path.exists(self.file_path):
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            self.last_completed = checkpoint["last_completed"]
+            self._offset = checkpoint["offset"]
+
+    def _save_checkpoint(self, completed):
+        self.last_completed = completed
+        self._offset = self._file.tell()
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"last_completed": completed, "offset": self._offset}, f)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def __enter__(self):
+        if self._offset is not None:
+            # 接續上次的檢查點：丟棄檢查點之後未完成的資料（先將已提交長度退回檢查點，再截斷）
+            publish_committed(self.file_path, size=self._offset)
+            self._file = open(self.file_path, "r+b")
+            self._file.truncate(self._offset)
+            self._file.seek(self._offset)
+        else:
+            if os.path.exists(self.file_path):
+                publish_committed(self.file_path, size=0)
+            self._file = open(self.file_path, "wb")
+            self._file.write(",".join(self.columns).encode("utf-8-sig") + os.linesep.encode())
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            publish_committed(self.file_path)
+        return self
+
+    def write(self, df, completed=None):
+        """
+        將一批資料附加至檔案尾端。
+
+        參數:
+            df (DataFrame): 要寫入的資料（None 或空表示此批無資料）
+            completed (str): 此批完成後的檢查點鍵值（None 表示不更新檢查點，例如尚未結束的當月資料）
+        """
+        if df is not None and not df.empty:
+            self._file.write(df.to_csv(header=False, index=False, columns=self.columns).encode("utf-8"))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            publish_committed(self.file_path)
+        if completed is not None:
+            self._save_checkpoint(completed)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        self._file = None
+        return False
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+SOURCE_STATE_FILE_PATH = "source_state.json"  # 各資料來源上次處理內容的紀錄
+
+
+class SourceState:
+    """
+    記錄每個資料來源上次成功寫入時的內容雜湊與 ETag / Last-Modified，並持久化為 JSON 檔案。
+
+    下次執行時以條件式請求詢問伺服器；伺服器回應 304 或內容雜湊相同時，視為來源未變更，
+    可略過解析與寫檔。新內容只有在寫入完成後（commit）才會成為比對基準，
+    避免解析或寫入失敗的內容被誤判為已處理。
+
+    參數:
+        file_path (str): 紀錄檔路徑
+    """
+
+    def __init__(self, file_path=SOURCE_STATE_FILE_PATH):
+        self.file_path = file_path
+        self.sources = {}  # 來源名稱 -> 上次成功寫入的內容紀錄
+        self.pending = {}  # 來源名稱 -> 本次取得、尚未寫入的內容紀錄
+        self.saved_bytes = 0  # 本次因未變更而省下的下載位元組數
+        self.saved_cpu = 0.0  # 本次因未變更而省下的解析與寫入 CPU 秒數（以上次的耗時估計）
+        self.skipped = []  # 本次未變更而略過的來源
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """從檔案載入紀錄；檔案不存在時維持空紀錄。"""
+        if os.path.exists(self.file_path):
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                self.sources = json.load(f)
+
+    def save(self):
+        """將紀錄寫回檔案。"""
+        with open(self.file_path, "w", encoding="utf-8") as f:
+            json.dump(self.sources, f, ensure_ascii=False, indent=2)
+
+    def conditional_headers(self, name, url):
+        """回傳條件式請求的標頭；網址與上次不同（例如換日）時不帶條件。"""
+        entry = self.sources.get(name)
+        if not entry or entry["url"] != url:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def is_unchanged(self, name, url, response):
+        """
+        判斷回應內容是否與上次成功寫入的內容相同；不同時記錄為待寫入內容。
+
+        回傳:
+            bool: 未變更時為 True（伺服器回應 304 或內容雜湊相同）
+        """
+        entry = self.sources.get(name)
+        same_url = entry is not None and entry["url"] == url
+        if response.status_code == 304 and same_url:
+            self.record_skip(name, entry, entry["bytes"])
+            return True
+
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        if same_url and entry["content_hash"] == content_hash:
+            # 由快取取得時沒有實際下載；否則只省下解析與寫入
+            self.record_skip(name, entry, len(response.content) if getattr(response, "from_cache", False) else 0)
+            return True
+
+        with self.lock:
+            self.pending[name] = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "content_hash": content_hash,
+                "bytes": len(response.content),
+                "cpu": 0.0,
+            }
+        return False
+
+    def record_skip(self, name, entry, saved_bytes):
+        with self.lock:
+            self.saved_bytes += saved_bytes
+            self.saved_cpu += entry.get("cpu", 0.0)
+            self.skipped.append(name)
+        logging.info(f"{name} unchanged, skip parsing and writing.")
+
+    def add_cpu(self, name, cpu):
+        """記錄本次處理該來源所花費的 CPU 秒數，作為之後略過時的節省估計。"""
+        with self.lock:
+            if name in self.pending:
+                self.pending[name]["cpu"] += cpu
+
+    def commit(self, name):
+        """來源的資料寫入完成後，將本次內容設為之後比對的基準。"""
+        with self.lock:
+            if name in self.pending:
+                self.sources[name] = self.pending.pop(name)
+
+    def log_summary(self):
+        """將本次略過的來源與省下的下載量、CPU 時間寫入 update.log。"""
+        if self.skipped:
+            logging.info(f"Skipped {len(self.skipped)} unchanged responses ({', '.join(sorted(set(self.skipped)))}): "
+                         f"saved {self.saved_bytes:,} bytes downloaded and about {self.saved_cpu:.3f}s CPU.")
@@ -0,0 +1,283 @@
+"""
+資料來源註冊表：每個來源宣告請求網址樣板、查詢期間，以及回應要解析成哪些資料集。
+資料集的欄位型別與去重複欄位定義於 storage.DATASETS。
+
+update.py（每日更新）、initial.py（回補）、repair.py 與 taifex_history.py 都以 Job 描述要抓取的
+(來源, 日期)，再交由 pipeline.run_pipeline 執行抓取、解析與寫入。
+"""
+import logging
+import os
+import random
+import time
+from collections import namedtuple
+
+import pandas as pd
+import requests
+
+import http_client
+from converters import parse_taifex_dates, roc_to_date
+from schema import FUND_SCHEMA, TWSE_SCHEMA, TAIFEX_SCHEMA, apply_schema
+from taifex_parser import HEADERS, is_download_csv, parse_all_products, parse_download, parse_page
+from trading_calendar import month_bounds
+
+MIN_DELAY = 3  # 重試前的最小延遲時間（秒）
+MAX_DELAY = 5  # 重試前的最大延遲時間（秒）
+MAX_RETRIES = 3  # 最大重試次數
+FUND_COLUMNS = ["日期", "單位名稱", "買進金額", "賣出金額", "買賣差額"]  # 三大法人資料欄位
+TWSE_COLUMNS = ["日期", "成交金額", "加權指數", "漲跌點數"]  # 成交資料欄位
+NUM_ROWS_TO_EXTRACT = 3  # 臺股期貨與選擇權只取前三列（自營商、投信、外資）
+
+# 來源主機；TX_BASE_URL（兩個主機）或 TX_TWSE_BASE_URL / TX_TAIFEX_BASE_URL 可改為本機的替代伺服器（replay_server.py）
+BASE_URLS = {
+    "twse": os.environ.get("TX_TWSE_BASE_URL") or os.environ.get("TX_BASE_URL") or "https://www.twse.com.tw",
+    "taifex": os.environ.get("TX_TAIFEX_BASE_URL") or os.environ.get("TX_BASE_URL") or "https://www.taifex.com.tw",
+}
+
+# 一次抓取工作：來源名稱、查詢日期，以及區間下載的結束日期
+Job = namedtuple("Job", ["source", "date", "end_date"], defaults=[None])
+
+
+def describe(job):
+    """紀錄用的工作說明，例如 "BFI82U 2024-01-02"。"""
+    if job.end_date is not None:
+        return f"{job.source} {job.date.strftime('%Y-%m-%d')}~{job.end_date.strftime('%Y-%m-%d')}"
+    return f"{job.source} {job.date.strftime('%Y-%m-%d')}"
+
+
+# ====== 解析函數：(回應, 工作) -> DataFrame 或 None ======
+def parse_fund(response, job):
+    """BFI82U 三大法人買賣金額（一天）。"""
+    data = response.json()
+    if data["stat"] != "OK":
+        logging.warning(f"Failed to retrieve institutional investor data for {describe(job)}. API Response: {data['stat']}")
+        return None
+    date = pd.Timestamp(job.date).normalize()
+    records = [[date, record[0], record[1], record[2], record[3]] for record in data["data"]]
+    return apply_schema(pd.DataFrame(records, columns=FUND_COLUMNS), FUND_SCHEMA)
+
+
+def parse_twse(response, job):
+    """FMTQIK 每日成交資料（一個月）；日期為民國年格式。"""
+    data = response.json()
+    if data["stat"] != "OK":
+        logging.warning(f"Failed to retrieve TWSE trading data for {describe(job)}. API Response: {data['stat']}")
+        return None
+    rows = pd.DataFrame(data["data"])
+    df = pd.DataFrame({
+        "日期": roc_to_date(rows[0]),
+        "成交金額": rows[2],
+        "加權指數": rows[4],
+        "漲跌點數": rows[5],
+    }, columns=TWSE_COLUMNS)
+    return apply_schema(df, TWSE_SCHEMA)
+
+
+def twse_published(response):
+    """TWSE JSON 回應的 stat 為 OK 時資料已公布；尚未公布或查無資料的回應不是定案的內容，不可永久快取。"""
+    try:
+        return response.json().get("stat") == "OK"
+    except ValueError:
+        return False
+
+
+def taifex_download_published(response):
+    """期交所區間下載的內容為 CSV 時資料已產生；回傳 HTML 錯誤頁面時不可永久快取。"""
+    return is_download_csv(response.content)
+
+
+def taifex_frame(rows):
+    """將期交所的資料列轉為 DataFrame；日期為 "YYYY/MM/DD" 格式。"""
+    if not rows:
+        return None
+    df = pd.DataFrame(rows, columns=HEADERS)
+    df["日期"] = parse_taifex_dates(df["日期"])
+    return apply_schema(df, TAIFEX_SCHEMA)
+
+
+def taifex_top_rows(product_name):
+    """期交所三大法人頁面中指定商品的前三列（自營商、投信、外資）。"""
+    def parse(response, job):
+        response.encoding = "utf-8"
+        _, rows = parse_page(response.text, NUM_ROWS_TO_EXTRACT, product_name)
+        return taifex_frame(rows)
+    return parse
+
+
+def parse_taifex_all(response, job):
+    """期交所三大法人頁面中所有商品與身份別的資料（長格式）。"""
+    response.encoding = "utf-8"
+    _, rows = parse_all_products(response.text)
+    return taifex_frame(rows)
+
+
+def taifex_download_rows(product_name):
+    """期交所區間下載 CSV，商品名稱統一為每日資料使用的名稱。"""
+    def parse(response, job):
+        rows = parse_download(response.content, product_name)
+        return taifex_frame(rows)
+    return parse
+
+
+# ====== 來源註冊表 ======
+# url / form: 以 date（查詢日期）與 end_date（區間結束日期）代入的樣板；url 中的 {twse} / {taifex} 為 BASE_URLS 的主機
+# period: "day" 查詢單日、"month" 查詢 date 所在月份、"range" 查詢 date~end_date、"latest" 固定網址的最新資料
+# datasets: 資料集名稱 -> 解析函數；同一個回應可同時解析出多個資料集
+# format: "json" 表示回應必須是完整的 JSON，內容不完整（例如連線中斷）時與連線錯誤一樣重試
+# final: 判斷回應內容是否已定案的函數；未定案的歷史日期回應不會被 http_client 永久快取（未指定時狀態碼 200 即為定案）
+SOURCES = {
+    "BFI82U": {
+        "url": "{twse}/rwd/zh/fund/BFI82U?type=day&dayDate={date:%Y%m%d}&response=json",
+        "period": "day",
+        "format": "json",
+        "final": twse_published,
+        "datasets": {"tx_fund_data": parse_fund},
+    },
+    "FMTQIK": {
+        "url": "{twse}/rwd/zh/afterTrading/FMTQIK?date={date:%Y%m}01&response=json",
+        "period": "month",
+        "format": "json",
+        "final": twse_published,
+        "datasets": {"tx_closed_data": parse_twse},
+    },
+    "futContractsDate": {
+        "url": "{taifex}/cht/3/futContractsDate",
+        "period": "latest",
+        "datasets": {"txf_data": taifex_top_rows("臺股期貨"), "txf_all_data": parse_taifex_all},
+    },
+    "optContractsDate": {
+        "url": "{taifex}/cht/3/optContractsDate",
+        "period": "latest",
+        "datasets": {"txop_data": taifex_top_rows("選擇權"), "txop_all_data": parse_taifex_all},
+    },
+    "futContractsDateDown": {
+        "url": "{taifex}/cht/3/futContractsDateDown",
+        "method": "POST",
+        "form": {"queryStartDate": "{date:%Y/%m/%d}", "queryEndDate": "{end_date:%Y/%m/%d}", "commodityId": "TXF"},
+        "period": "range",
+        "timeout": 30,
+        "final": taifex_download_published,
+        "datasets": {"txf_data": taifex_download_rows("臺股期貨")},
+    },
+    "optContractsDateDown": {
+        "url": "{taifex}/cht/3/optContractsDateDown",
+        "method": "POST",
+        "form": {"queryStartDate": "{date:%Y/%m/%d}", "queryEndDate": "{end_date:%Y/%m/%d}", "commodityId": "TXO"},
+        "period": "range",
+        "timeout": 30,
+        "final": taifex_download_published,
+        "datasets": {"txop_data": taifex_download_rows("選擇權")},
+    },
+}
+
+
+def set_base_url(base_url, host=None):
+    """將來源主機（host 為 "twse" 或 "taifex"，None 表示兩者）改為 base_url，例如 "http://127.0.0.1:8000"。"""
+    for name in ([host] if host else BASE_URLS):
+        BASE_URLS[name] = base_url.rstrip("/")
+
+
+def pop_base_url(args):
+    """由命令列參數取出並套用 "--base-url 網址"，回傳其餘的參數。"""
+    if "--base-url" not in args:
+        return list(args)
+    index = args.index("--base-url")
+    set_base_url(args[index + 1])
+    return list(args[:index]) + list(args[index + 2:])
+
+
+def request_for(job):
+    """
+    依來源設定產生請求內容。
+
+    回傳:
+        tuple: (method, url, form, query_date)；query_date 為資料所屬的最後一天，決定快取是否可永久保存
+    """
+    source = SOURCES[job.source]
+    url = source["url"].format(date=job.date, end_date=job.end_date, **BASE_URLS)
+    form = None
+    if "form" in source:
+        form = {key: value.format(date=job.date, end_date=job.end_date) for key, value in source["form"].items()}
+    if source["period"] == "month":
+        _, query_date = month_bounds(job.date.year, job.date.month)  # 月份結束後該月資料才會定案
+    elif source["period"] == "range":
+        query_date = job.end_date
+    else:
+        query_date = job.date
+    return source.get("method", "GET"), url, form, query_date
+
+
+def check_body(job, response):
+    """檢查回應內容的格式（JSON 來源需可完整解碼），內容不完整時拋出 ValueError。"""
+    if response.status_code == 200 and SOURCES[job.source].get("format") == "json":
+        response.json()
+
+
+def fetch_job(job, limiter=None, retries=MAX_RETRIES, headers=None, refresh=False):
+    """
+    送出工作的請求，連線失敗、狀態碼錯誤或回應內容不完整（無法解碼）時隨機延遲後重試。
+
+    參數:
+        job (Job): 抓取工作
+        limiter (TokenBucket): 共用的限流器（None 表示不限流）
+        retries (int): 最多嘗試次數
+        headers (dict): 額外的請求標頭
+        refresh (bool): 不讀取快取
+
+    回傳:
+        Response: 狀態碼為 200 或 304 的回應
+        None: 超過重試次數時
+    """
+    method, url, form, query_date = request_for(job)
+    timeout = SOURCES[job.source].get("timeout", 10)
+    for attempt in range(1, retries + 1):
+        try:
+            response = http_client.request(method, url, query_date=query_date, data=form, timeout=timeout,
+                                           limiter=limiter, headers=headers, refresh=refresh,
+                                           is_final=SOURCES[job.source].get("final"))
+            if response.status_code in (200, 304):
+                check_body(job, response)
+                return response
+            logging.warning(f"{describe(job)} server responded with status code {response.status_code}.")
+        except ValueError as e:
+            # 內容不完整的回應可能已寫入快取，重試時直接連線
+            logging.error(f"Error : {describe(job)} format : {e}")
+            refresh = True
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error : {describe(job)} : {e}")
+        if attempt < retries:
+            time.sleep(random.uniform(MIN_DELAY, MAX_DELAY))  # 隨機延遲一段時間再進行重試
+    return None
+
+
+def parse_job(job, response):
+    """
+    將回應解析為來源宣告的各個資料集。
+
+    回傳:
+        list: (資料集名稱, DataFrame 或 None) 列表，順序與來源設定相同
+    """
+    results = []
+    for dataset, parse in SOURCES[job.source]["datasets"].items():
+        try:
+            data = parse(response, job)
+        except (ValueError, KeyError) as e:
+            logging.error(f"Error : {describe(job)} {dataset} format : {e}")
+            data = None
+        if data is not None:
+            logging.info(f"Successfully retrieved {dataset} data for {describe(job)}. Total rows: {len(data)}.")
+        results.append((dataset, data))
+    return results
+
+
+def fetch_dataset(job, dataset, limiter=None):
+    """
+    抓取並解析單一工作，只回傳指定資料集的資料（供單獨查詢使用）。
+
+    回傳:
+        DataFrame: 資料集的資料
+        None: 抓取或解析失敗時
+    """
+    response = fetch_job(job, limiter)
+    if response is None:
+        return None
+    return dict(parse_job(job, response)).get(dataset)
@@ -0,0 +1,890 @@
+import io
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+
+import pandas as pd
+
+from converters import parse_dates
+from csv_tail import BLOCK_SIZE, find_last_rows_offset, find_tail_offset, read_header, read_last_date, read_rows_since, read_tail_bytes
+from schema import FUND_SCHEMA, TWSE_SCHEMA, TAIFEX_SCHEMA, DATE_FORMAT, apply_schema, read_typed_csv
+
+# 各資料集的欄位型別與唯一鍵（與 update_data 的去重複欄位一致）
+DATASETS = {
+    "tx_fund_data": {"schema": FUND_SCHEMA, "keys": ["日期", "單位名稱"]},
+    "tx_closed_data": {"schema": TWSE_SCHEMA, "keys": ["日期"]},
+    "txf_data": {"schema": TAIFEX_SCHEMA, "keys": ["日期", "商品名稱", "身份別"]},
+    "txop_data": {"schema": TAIFEX_SCHEMA, "keys": ["日期", "商品名稱", "身份別"]},
+    "txf_all_data": {"schema": TAIFEX_SCHEMA, "keys": ["日期", "商品名稱", "身份別"]},
+    "txop_all_data": {"schema": TAIFEX_SCHEMA, "keys": ["日期", "商品名稱", "身份別"]},
+}
+
+# 儲存後端："csv"（預設）、"parquet"、"sqlite" 或 "partitioned"；update.py 與 telegram_bot.py 需使用相同設定
+STORAGE_BACKEND = os.environ.get("TX_STORAGE_BACKEND", "csv")
+EXPORT_CSV = True  # 非 CSV 後端寫入後是否同步匯出一份 CSV 供人工檢視
+DATE_COLUMN = "日期"
+PARTITION_DIR = "partitions"  # 分區後端的資料夾名稱（位於 base_dir 之下）
+PARTITION_BY = "month"  # 分區單位："month" 或 "year"
+PARTITION_FORMATS = {"month": "%Y-%m", "year": "%Y"}  # 分區鍵（亦為分區檔名）的日期格式
+SNAPSHOT_GRACE_SECONDS = 600  # 被取代的分區檔保留的秒數，讓仍在讀取舊快照的讀取端可以讀完
+REPLACE_RETRIES = 20  # 目標檔案正被讀取（Windows 無法替換開啟中的檔案）時的替換重試次數
+REPLACE_RETRY_DELAY = 0.05  # 替換重試的間隔（秒）
+COMMIT_SUFFIX = ".committed"  # CSV 已提交長度標記的副檔名（讀取端只讀到此長度為止）
+
+
+def dataset_name(file_path):
+    """由資料檔路徑取得資料集名稱（例如 "E:/.../txf_data.csv" -> "txf_data"）。"""
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
+def filter_dates(df, start=None, end=None):
+    """保留日期介於 start 與 end（含）之間的資料列。"""
+    if start is not None:
+        df = df[df[DATE_COLUMN] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df[DATE_COLUMN] <= pd.Timestamp(end)]
+    return df
+
+
+def read_latest_by_date(store, dataset, columns=None):
+    """先取得最新日期，再以日期範圍讀取該日的所有資料列（適用於可依日期範圍讀取的後端）。"""
+    latest = store.latest_date(dataset)
+    if latest is None:
+        return store.read(dataset, columns=columns).iloc[0:0]
+    return store.read(dataset, columns=columns, start=latest, end=latest)
+
+
+class CsvStore:
+    """
+    以 UTF-8-BOM CSV 儲存資料集的後端；新資料以只讀取檔案尾端的增量方式寫入。
+
+    新資料列直接附加在原檔尾端（寫入成本與歷史資料長度無關），寫入並 fsync 後才以暫存檔原子替換的方式
+    發佈 `<資料檔>.committed` 長度標記；讀取端只讀到已發佈的長度為止，不會讀到寫到一半的資料列。
+    既有資料有變更時整份檔案以暫存檔寫入後原子替換。
+
+    參數:
+        base_dir (str): 資料檔所在資料夾
+        pinned (dict): 快照固定的 資料集 -> (已開啟的資料檔, 已提交長度, 版本標記)（由 snapshot() 建立；None 表示每次讀取最新版本）
+    """
+
+    extension = ".csv"
+
+    def __init__(self, base_dir=".", pinned=None):
+        self.base_dir = base_dir
+        self.pinned = pinned
+
+    def path(self, dataset):
+        return os.path.join(self.base_dir, dataset + self.extension)
+
+    def exists(self, dataset):
+        if self.pinned is not None:
+            return dataset in self.pinned
+        return os.path.exists(self.path(dataset))
+
+    @contextmanager
+    def open_committed(self, dataset):
+        """取得 (已開啟的資料檔, 已提交長度)；所有讀取都以此長度為界，之後附加的資料不會混入結果。"""
+        if self.pinned is not None:
+            if dataset not in self.pinned:
+                raise FileNotFoundError(self.path(dataset))
+            yield self.pinned[dataset][:2]
+        else:
+            with open(self.path(dataset), "rb") as f:
+                yield f, committed_size(self.path(dataset), f)
+
+    def read(self, dataset, columns=None, start=None, end=None):
+        """
+        讀取資料集，可指定只讀取部分欄位與日期範圍。
+        CSV 無法跳過不需要的資料列，日期範圍於讀取後篩選。
+        """
+        with self.open_committed(dataset) as (f, size):
+            df = self.read_tail(dataset, 0, columns=columns, end=size, file=f)
+        return filter_dates(df, start, end).reset_index(drop=True)
+
+    def read_tail(self, dataset, offset, columns=None, end=None, file=None):
+        """只解析檔案中位移量之後（至 end 為止）的資料列（依資料集的欄位型別）。"""
+        schema = DATASETS[dataset]["schema"]
+        usecols = None
+        if columns is not None:
+            usecols = list(dict.fromkeys([DATE_COLUMN] + list(columns)))
+        content = read_tail_bytes(file or self.path(dataset), offset, end)
+        return read_typed_csv(io.BytesIO(content), schema, usecols=usecols)
+
+    def latest_date(self, dataset):
+        """回傳資料集中最新的日期；檔案依日期排序，只讀取檔案的最後一列。"""
+        with self.open_committed(dataset) as (f, size):
+            latest = read_last_date(f, end=size)
+        return pd.Timestamp(latest) if latest is not None else None
+
+    def read_latest(self, dataset, columns=None):
+        """
+        讀取資料集中最新日期的所有資料列。
+        由檔案尾端往前找到最新日期的第一列，只解析該段資料，讀取時間與歷史資料的長度無關。
+        """
+        with self.open_committed(dataset) as (f, size):
+            latest = read_last_date(f, end=size)
+            offset = find_tail_offset(f, latest, end=size) if latest is not None else size
+            return self.read_tail(dataset, offset, columns=columns, end=size, file=f)
+
+    def read_last_rows(self, dataset, num_rows, columns=None):
+        """讀取資料集的最後 num_rows 筆資料列（由檔案尾端往前讀取）。"""
+        with self.open_committed(dataset) as (f, size):
+            offset = find_last_rows_offset(f, num_rows, end=size)
+            return self.read_tail(dataset, offset, columns=columns, end=size, file=f)
+
+    def snapshot(self):
+        """
+        回傳固定於目前已提交內容的唯讀快照：開啟每個資料檔並記下其已提交長度。
+        之後附加的資料列不在快照的長度內；既有資料變更時資料檔被原子替換，快照仍讀取已開啟的舊檔案。
+        """
+        pinned = {}
+        for dataset in DATASETS:
+            file_path = self.path(dataset)
+            try:
+                f = open(file_path, "rb")
+            except FileNotFoundError:
+                continue
+            size = committed_size(file_path, f)
+            pinned[dataset] = (f, size, committed_signature(f, size))
+        return CsvStore(self.base_dir, pinned=pinned)
+
+    def data_version(self, datasets):
+        """
+        資料集目前的版本標記：各資料檔的識別碼、修改時間與已提交長度，資料寫入並提交後即改變（用於快取讀取結果）。
+
+        回傳:
+            tuple: 可比較是否相等的版本標記
+        """
+        if self.pinned is not None:
+            return tuple(self.pinned[dataset][2] if dataset in self.pinned else None for dataset in datasets)
+        version = []
+        for dataset in datasets:
+            try:
+                with open(self.path(dataset), "rb") as f:
+                    version.append(committed_signature(f, committed_size(self.path(dataset), f)))
+            except FileNotFoundError:
+                version.append(None)
+        return tuple(version)
+
+    def upsert(self, dataset, new_data, unique_columns=None):
+        """
+        將新資料合併進資料集。
+
+        檔案依日期排序，因此只需讀取檔案尾端日期 >= 新資料最早日期的資料列進行比對：
+        全新的資料列附加至檔案尾端並提交新的長度；只有既有日期的資料內容實際改變時，才以暫存檔改寫後原子替換。
+        """
+        if self.pinned is not None:
+            raise RuntimeError("快照為唯讀，無法寫入")
+        unique_columns = unique_columns or DATASETS[dataset]["keys"]
+        new_data = new_data.copy()
+        new_data[DATE_COLUMN] = parse_dates(new_data[DATE_COLUMN])
+        upsert_csv(self.path(dataset), new_data, unique_columns)
+
+
+def upsert_csv(file_path, new_data, unique_columns, target_path=None):
+    """
+    將新資料（日期欄位已轉為 datetime）以尾端增量的方式合併進一個依日期排序的 CSV 檔案；無變更時不寫入任何檔案。
+
+    target_path 為 None（就地寫入）時，新資料列直接附加至檔案尾端並 fsync 後提交新的長度，寫入成本與歷史資料長度無關；
+    既有資料有變更時以暫存檔改寫 offset 之後的尾端再原子替換，並提交替換後的檔案。
+    指定 target_path（分區後端的新版本分區檔）時，先複製 file_path 再寫入，完成後才原子替換 target_path。
+
+    回傳:
+        tuple: (新增的資料列數, 更新的資料列數)
+    """
+    in_place = target_path is None
+    target_path = target_path or file_path
+    if not os.path.exists(file_path):
+        # 如果檔案不存在，則直接儲存新的資料
+        atomic_write(target_path, lambda temp_path: new_data.to_csv(
+            temp_path, index=False, encoding="utf-8-sig", date_format=DATE_FORMAT))
+        if in_place:
+            publish_committed(file_path)
+        logging.info(f"檔案不存在，已創建新檔案並儲存 {len(new_data)} 筆資料至 {target_path}")
+        return len(new_data), 0
+
+    if in_place:
+        recover_uncommitted(file_path)
+    columns, _ = read_header(file_path)
+    new_rows = to_csv_strings(new_data, columns)
+    since = new_rows[DATE_COLUMN].min()
+    tail_df, offset = read_rows_since(file_path, since)
+    if tail_df.empty:
+        # 新資料的日期都晚於已儲存的資料（每日更新的一般情況）：不必比對既有資料列，直接附加
+        if in_place:
+            append_rows(file_path, new_rows, columns)
+            publish_committed(file_path)
+        else:
+            atomic_write(target_path, lambda temp_path: append_rows(temp_path, new_rows, columns),
+                         source_path=file_path)
+        logging.info(f"新增了 {len(new_rows)} 筆資料並更新至 {target_path}")
+        return len(new_rows), 0
+
+    tail_keys = pd.MultiIndex.from_frame(tail_df[unique_columns])
+    new_keys = pd.MultiIndex.from_frame(new_rows[unique_columns])
+    is_existing = new_keys.isin(tail_keys)
+    df_new_filtered = new_rows[~is_existing]
+
+    # 比對既有日期的資料列內容是否改變
+    tail_keyed = tail_df.set_index(unique_columns)
+    updates = new_rows[is_existing].drop_duplicates(subset=unique_columns, keep="last").set_index(unique_columns)
+    current = tail_keyed.loc[updates.index]
+    changed = (current != updates[current.columns]).any(axis=1)
+
+    last_stored_date = tail_df[DATE_COLUMN].max() if not tail_df.empty else ""
+    appends_only = df_new_filtered.empty or df_new_filtered[DATE_COLUMN].min() > last_stored_date
+
+    if not changed.any() and df_new_filtered.empty:
+        logging.info(f"無新增資料，{file_path} 檔案未變更。")
+    elif not changed.any() and appends_only:
+        if in_place:
+            append_rows(file_path, df_new_filtered, columns)
+            publish_committed(file_path)
+        else:
+            atomic_write(target_path, lambda temp_path: append_rows(temp_path, df_new_filtered, columns),
+                         source_path=file_path)
+        logging.info(f"新增了 {len(df_new_filtered)} 筆資料並更新至 {target_path}")
+    else:
+        # 既有資料有變更（或新資料需插入尾端中間）：複製後改寫 offset 之後的尾端資料，再原子替換
+        tail_keyed.update(updates[changed.values])
+        merged = pd.concat([tail_keyed.reset_index()[columns], df_new_filtered], ignore_index=True)
+        merged = merged.sort_values(DATE_COLUMN, kind="stable")
+        atomic_write(target_path, lambda temp_path: rewrite_tail(temp_path, offset, merged, columns),
+                     source_path=file_path)
+        if in_place:
+            publish_committed(file_path)
+        logging.info(f"新增了 {len(df_new_filtered)} 筆資料、更新了 {int(changed.sum())} 筆既有資料至 {target_path}")
+    return len(df_new_filtered), int(changed.sum())
+
+
+class ParquetStore(CsvStore):
+    """
+    以 Parquet 欄式格式儲存資料集的後端（需安裝 pyarrow）。
+
+    讀取時只解碼需要的欄位，並以日期條件略過不符合的 row group；
+    寫入時整份檔案以暫存檔改寫後替換，並可同步匯出 CSV。
+
+    參數:
+        base_dir (str): 資料檔所在資料夾
+        export_csv (bool): 寫入後是否同步匯出 CSV
+    """
+
+    extension = ".parquet"
+    row_group_size = 4096  # 每個 row group 的列數，越小日期篩選越精準
+
+    def __init__(self, base_dir=".", export_csv=EXPORT_CSV):
+        super().__init__(base_dir)
+        self.export_csv_enabled = export_csv
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ImportError("Parquet 儲存後端需要安裝 pyarrow：pip install pyarrow") from e
+
+    def read(self, dataset, columns=None, start=None, end=None):
+        filters = []
+        if start is not None:
+            filters.append((DATE_COLUMN, ">=", pd.Timestamp(start)))
+        if end is not None:
+            filters.append((DATE_COLUMN, "<=", pd.Timestamp(end)))
+        if columns is not None:
+            columns = list(dict.fromkeys([DATE_COLUMN] + list(columns)))
+        return pd.read_parquet(self.path(dataset), columns=columns, filters=filters or None)
+
+    def latest_date(self, dataset):
+        """回傳資料集中最新的日期（只解碼日期欄位）。"""
+        dates = self.read(dataset, columns=[DATE_COLUMN])[DATE_COLUMN]
+        return dates.max() if not dates.empty else None
+
+    def read_latest(self, dataset, columns=None):
+        return read_latest_by_date(self, dataset, columns=columns)
+
+    def read_last_rows(self, dataset, num_rows, columns=None):
+        return self.read(dataset, columns=columns).tail(num_rows).reset_index(drop=True)
+
+    def snapshot(self):
+        """Parquet 檔案整份以暫存檔寫入後原子替換，單一資料集的讀取不會讀到寫到一半的檔案，直接回傳自身。"""
+        return self
+
+    def data_version(self, datasets):
+        """各資料檔的修改時間與大小。"""
+        return tuple(file_signature(self.path(dataset)) for dataset in datasets)
+
+    def upsert(self, dataset, new_data, unique_columns=None):
+        unique_columns = unique_columns or DATASETS[dataset]["keys"]
+        file_path = self.path(dataset)
+        schema = DATASETS[dataset]["schema"]
+        new_data = new_data.copy()
+        new_data[DATE_COLUMN] = parse_dates(new_data[DATE_COLUMN])
+
+        if os.path.exists(file_path):
+            existing_df = pd.read_parquet(file_path)
+            combined_df = pd.concat([existing_df, new_data], ignore_index=True)
+            combined_df = combined_df.drop_duplicates(subset=unique_columns, keep="last")
+            combined_df = combined_df.sort_values(DATE_COLUMN, kind="stable").reset_index(drop=True)
+            # 去除與既有資料完全相同的資料列後，比對是否有實際變更
+            if len(combined_df) == len(existing_df) and combined_df.astype(str).equals(existing_df.astype(str)):
+                logging.info(f"無新增資料，{file_path} 檔案未變更。")
+                return
+            added = len(combined_df) - len(existing_df)
+        else:
+            combined_df = new_data.sort_values(DATE_COLUMN, kind="stable").reset_index(drop=True)
+            added = len(combined_df)
+
+        for column, dtype in schema.items():
+            if dtype == "category" and column in combined_df.columns:
+                combined_df[column] = combined_df[column].astype(str).astype("category")
+
+        atomic_write(file_path, lambda temp_path: combined_df.to_parquet(
+            temp_path, index=False, row_group_size=self.row_group_size))
+        logging.info(f"新增了 {added} 筆資料並更新至 {file_path}")
+
+        if self.export_csv_enabled:
+            self.export_csv(dataset, combined_df)
+
+    def import_csv(self, dataset):
+        """由同名的 CSV 檔案建立 Parquet 資料集（CSV 需已遷移為數值格式）。"""
+        csv_store = CsvStore(self.base_dir)
+        df = csv_store.read(dataset)
+        atomic_write(self.path(dataset), lambda temp_path: df.to_parquet(
+            temp_path, index=False, row_group_size=self.row_group_size))
+        return len(df)
+
+    def export_csv(self, dataset, df=None):
+        """將資料集匯出為 CSV（與 CSV 後端的檔名相同）供人工檢視。"""
+        write_csv_export(self.base_dir, dataset, self.read(dataset) if df is None else df)
+
+
+class SqliteStore(CsvStore):
+    """
+    以單一 SQLite 資料庫儲存所有資料集的後端，每個資料集一個資料表。
+
+    主鍵與 update_data 的去重複欄位一致，新增一天的資料只是 `INSERT ... ON CONFLICT` 的索引寫入；
+    主鍵以日期開頭，因此最新日期查詢為索引上的 `MAX(日期)`。
+    資料庫使用 WAL 模式，telegram_bot.py 讀取時不會被 update.py 的寫入阻塞。
+
+    參數:
+        base_dir (str): 資料庫檔案所在資料夾
+        export_csv (bool): 寫入後是否同步匯出 CSV
+    """
+
+    db_file_name = "tx_daily.db"
+    column_types = {"int64": "INTEGER", "float64": "REAL"}  # 其餘型別（日期、類別）以 TEXT 儲存
+
+    def __init__(self, base_dir=".", export_csv=EXPORT_CSV):
+        super().__init__(base_dir)
+        self.export_csv_enabled = export_csv
+        self.db_path = os.path.join(base_dir, self.db_file_name)
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def path(self, dataset):
+        return self.db_path
+
+    def exists(self, dataset):
+        if not os.path.exists(self.db_path):
+            return False
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (dataset,)).fetchone()
+        return row is not None
+
+    def create_table(self, conn, dataset):
+        schema = DATASETS[dataset]["schema"]
+        keys = DATASETS[dataset]["keys"]
+        column_defs = ", ".join(f'"{column}" {self.column_types.get(dtype, "TEXT")}' for column, dtype in schema.items())
+        key_defs = ", ".join(f'"{column}"' for column in keys)
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{dataset}" ({column_defs}, PRIMARY KEY ({key_defs}))')
+
+    def read(self, dataset, columns=None, start=None, end=None):
+        schema = DATASETS[dataset]["schema"]
+        columns = list(dict.fromkeys([DATE_COLUMN] + list(columns if columns is not None else schema)))
+        conditions, params = [], []
+        if start is not None:
+            conditions.append(f'"{DATE_COLUMN}" >= ?')
+            params.append(pd.Timestamp(start).strftime(DATE_FORMAT))
+        if end is not None:
+            conditions.append(f'"{DATE_COLUMN}" <= ?')
+            params.append(pd.Timestamp(end).strftime(DATE_FORMAT))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        select = ", ".join(f'"{column}"' for column in columns)
+        query = f'SELECT {select} FROM "{dataset}"{where} ORDER BY "{DATE_COLUMN}", rowid'
+        with closing(self.connect()) as conn:
+            df = pd.read_sql_query(query, conn, params=params)
+        return apply_schema(df, {column: schema[column] for column in columns})
+
+    def snapshot(self):
+        """SQLite 以交易保證單一查詢的一致性，直接回傳自身。"""
+        return self
+
+    def data_version(self, datasets):
+        """資料庫檔案與 WAL 檔的修改時間與大小（寫入先進入 WAL，checkpoint 後才寫回資料庫檔案）。"""
+        return file_signature(self.db_path), file_signature(f"{self.db_path}-wal")
+
+    def latest_date(self, dataset):
+        with closing(self.connect()) as conn:
+            row = conn.execute(f'SELECT MAX("{DATE_COLUMN}") FROM "{dataset}"').fetchone()
+        return pd.Timestamp(row[0]) if row[0] is not None else None
+
+    def read_latest(self, dataset, columns=None):
+        return read_latest_by_date(self, dataset, columns=columns)
+
+    def read_last_rows(self, dataset, num_rows, columns=None):
+        schema = DATASETS[dataset]["schema"]
+        columns = list(dict.fromkeys([DATE_COLUMN] + list(columns if columns is not None else schema)))
+        select = ", ".join(f'"{column}"' for column in columns)
+        query = (f'SELECT {select} FROM (SELECT {select}, rowid FROM "{dataset}" '
+                 f'ORDER BY "{DATE_COLUMN}" DESC, rowid DESC LIMIT ?) ORDER BY "{DATE_COLUMN}", rowid')
+        with closing(self.connect()) as conn:
+            df = pd.read_sql_query(query, conn, params=[num_rows])
+        return apply_schema(df, {column: schema[column] for column in columns})
+
+    def upsert(self, dataset, new_data, unique_columns=None):
+        unique_columns = unique_columns or DATASETS[dataset]["keys"]
+        columns = list(DATASETS[dataset]["schema"])
+        rows = to_sql_rows(new_data, columns)
+
+        key_columns = ", ".join(f'"{column}"' for column in unique_columns)
+        value_columns = [column for column in columns if column not in unique_columns]
+        assignments = ", ".join(f'"{column}" = excluded."{column}"' for column in value_columns)
+        differs = " OR ".join(f'"{column}" IS NOT excluded."{column}"' for column in value_columns)
+        placeholders = ", ".join("?" for _ in columns)
+        select = ", ".join(f'"{column}"' for column in columns)
+        sql = (
+            f'INSERT INTO "{dataset}" ({select}) VALUES ({placeholders}) '
+            f"ON CONFLICT ({key_columns}) DO UPDATE SET {assignments} WHERE {differs}"
+        )
+
+        with closing(self.connect()) as conn:
+            with conn:
+                self.create_table(conn, dataset)
+                before = conn.total_changes
+                conn.executemany(sql, rows)
+                written = conn.total_changes - before
+
+        if written:
+            logging.info(f"新增或更新了 {written} 筆資料至 {self.db_path} 的 {dataset} 資料表")
+            if self.export_csv_enabled:
+                self.export_csv(dataset)
+        else:
+            logging.info(f"無新增資料，{self.db_path} 的 {dataset} 資料表未變更。")
+
+    def import_csv(self, dataset):
+        """將同名的 CSV 檔案（需已遷移為數值格式）匯入資料表。"""
+        df = CsvStore(self.base_dir).read(dataset)
+        with closing(self.connect()) as conn:
+            with conn:
+                self.create_table(conn, dataset)
+        self.upsert(dataset, df)
+        return len(df)
+
+    def export_csv(self, dataset, df=None):
+        """將資料表匯出為 CSV（與 CSV 後端的檔名相同）供人工檢視。"""
+        write_csv_export(self.base_dir, dataset, self.read(dataset) if df is None else df)
+
+
+class PartitionedStore(CsvStore):
+    """
+    依年或月將資料集切成多個 CSV 分區檔的後端，所有資料集共用一份帶版本號的 manifest.json，
+    紀錄每個分區目前的檔案、日期範圍與列數。
+
+    每日更新只會寫入新資料所在的（最新）分區；最新日期直接由 manifest 取得，
+    最新日期與日期範圍查詢只開啟範圍內的分區檔，讀取成本與歷史資料的年數無關。
+
+    分區檔寫入後不再修改：有變更的分區寫成新版本的檔案（例如 2025-01.v12.csv），
+    全部寫完後才原子替換 manifest 並遞增版本號。讀取端以 snapshot() 固定一個 manifest 版本，
+    之後的所有讀取都只看該版本引用的檔案，不需要加鎖，也不會讀到寫到一半或不同版本混雜的資料；
+    被取代的舊檔案保留 SNAPSHOT_GRACE_SECONDS 秒後才刪除。
+
+    目錄結構：base_dir/partitions/manifest.json 與 base_dir/partitions/<資料集>/<分區鍵>.v<版本>.csv
+
+    參數:
+        base_dir (str): partitions 資料夾所在資料夾
+        partition_by (str): 分區單位（"month" 或 "year"）
+        manifest (dict): 固定使用的 manifest（由 snapshot() 建立；None 表示每次讀取最新版本）
+    """
+
+    manifest_file_name = "manifest.json"
+
+    def __init__(self, base_dir=".", partition_by=PARTITION_BY, manifest=None):
+        super().__init__(base_dir)
+        if partition_by not in PARTITION_FORMATS:
+            raise ValueError(f"不支援的分區單位：{partition_by}")
+        self.partition_by = partition_by
+        self.pinned_manifest = manifest
+
+    def dataset_dir(self, dataset):
+        return os.path.join(self.base_dir, PARTITION_DIR, dataset)
+
+    def path(self, dataset=None):
+        return os.path.join(self.base_dir, PARTITION_DIR, self.manifest_file_name)
+
+    def partition_path(self, dataset, file_name):
+        return os.path.join(self.dataset_dir(dataset), file_name)
+
+    def load_root(self):
+        """讀取 manifest（快照則回傳固定的版本）；不存在時回傳版本 0 的空 manifest。"""
+        if self.pinned_manifest is not None:
+            return self.pinned_manifest
+        try:
+            with open(self.path(), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"version": 0, "datasets": {}, "retired": []}
+
+    def load_manifest(self, dataset, root=None):
+        """取得單一資料集的分區紀錄。"""
+        root = root or self.load_root()
+        return root["datasets"].get(dataset, {"partition_by": self.partition_by, "partitions": {}})
+
+    def save_root(self, root):
+        """以暫存檔寫入後原子替換的方式發佈新版本的 manifest。"""
+        os.makedirs(os.path.dirname(self.path()), exist_ok=True)
+        atomic_write(self.path(), lambda temp_path: write_json(temp_path, root))
+
+    def version(self):
+        """目前（或快照固定）的資料版本號。"""
+        return self.load_root()["version"]
+
+    def data_version(self, datasets):
+        """manifest 的版本號；每次發佈新版本都會遞增。"""
+        return self.version()
+
+    def snapshot(self):
+        """回傳固定於目前 manifest 版本的唯讀快照；之後的寫入不會影響快照讀到的資料。"""
+        return PartitionedStore(self.base_dir, self.partition_by, manifest=self.load_root())
+
+    def exists(self, dataset):
+        return bool(self.load_manifest(dataset)["partitions"])
+
+    def partitions_between(self, manifest, start=None, end=None):
+        """回傳日期範圍與 [start, end] 重疊的分區紀錄（依日期排序）。"""
+        start = pd.Timestamp(start).strftime(DATE_FORMAT) if start is not None else None
+        end = pd.Timestamp(end).strftime(DATE_FORMAT) if end is not None else None
+        return [
+            entry for _, entry in sorted(manifest["partitions"].items())
+            if (start is None or entry["end"] >= start) and (end is None or entry["start"] <= end)
+        ]
+
+    def read(self, dataset, columns=None, start=None, end=None):
+        """只開啟日期範圍內的分區檔，再依日期篩選。"""
+        schema = DATASETS[dataset]["schema"]
+        usecols = None
+        if columns is not None:
+            usecols = list(dict.fromkeys([DATE_COLUMN] + list(columns)))
+        manifest = self.load_manifest(dataset)
+        frames = [
+            read_typed_csv(self.partition_path(dataset, entry["file"]), schema, usecols=usecols)
+            for entry in self.partitions_between(manifest, start, end)
+        ]
+        if not frames:
+            empty = pd.DataFrame(columns=usecols or list(schema))
+            return apply_schema(empty, {column: schema[column] for column in empty.columns})
+        df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+        return filter_dates(df, start, end).reset_index(drop=True)
+
+    def latest_date(self, dataset):
+        """由 manifest 取得最新日期，不開啟任何分區檔。"""
+        partitions = self.load_manifest(dataset)["partitions"]
+        if not partitions:
+            return None
+        return pd.Timestamp(max(entry["end"] for entry in partitions.values()))
+
+    def read_latest(self, dataset, columns=None):
+        """讀取最新日期的所有資料列；最新日期與資料取自同一個 manifest 版本。"""
+        if self.pinned_manifest is None:
+            return self.snapshot().read_latest(dataset, columns=columns)
+        return read_latest_by_date(self, dataset, columns=columns)
+
+    def read_last_rows(self, dataset, num_rows, columns=None):
+        """由 manifest 紀錄的列數找出涵蓋最後 num_rows 筆資料列的分區，只開啟這些分區檔。"""
+        if self.pinned_manifest is None:
+            return self.snapshot().read_last_rows(dataset, num_rows, columns=columns)
+        start, count = None, 0
+        for _, entry in sorted(self.load_manifest(dataset)["partitions"].items(), reverse=True):
+            start, count = entry["start"], count + entry["rows"]
+            if count >= num_rows:
+                break
+        return self.read(dataset, columns=columns, start=start).tail(num_rows).reset_index(drop=True)
+
+    def upsert(self, dataset, new_data, unique_columns=None):
+        """
+        將新資料依分區鍵分組，有變更的分區以 CSV 後端相同的尾端增量方式寫成新版本的分區檔，
+        最後發佈新版本的 manifest。未涉及的分區檔不會被開啟。
+        """
+        if self.pinned_manifest is not None:
+            raise RuntimeError("快照為唯讀，無法寫入")
+        unique_columns = unique_columns or DATASETS[dataset]["keys"]
+        columns = [column for column in DATASETS[dataset]["schema"] if column in new_data.columns]
+        new_data = new_data[columns].copy()
+        new_data[DATE_COLUMN] = parse_dates(new_data[DATE_COLUMN])
+        os.makedirs(self.dataset_dir(dataset), exist_ok=True)
+
+        root = self.load_root()
+        version = root["version"] + 1
+        manifest = self.load_manifest(dataset, root)
+        retired = []
+        changed = False
+        keys = new_data[DATE_COLUMN].dt.strftime(PARTITION_FORMATS[self.partition_by])
+        for key, group in new_data.groupby(keys, sort=True):
+            group = group.sort_values(DATE_COLUMN, kind="stable")
+            entry = manifest["partitions"].get(key)
+            file_name = f"{key}.v{version}{self.extension}"
+            source_path = self.partition_path(dataset, entry["file"] if entry else file_name)
+            if entry is None and os.path.exists(source_path):
+                os.remove(source_path)  # 先前寫入失敗、未被 manifest 引用的檔案
+            added, updated = upsert_csv(source_path, group, unique_columns,
+                                        target_path=self.partition_path(dataset, file_name))
+            if not added and not updated:
+                continue
+            changed = True
+            group_start = group[DATE_COLUMN].min().strftime(DATE_FORMAT)
+            group_end = group[DATE_COLUMN].max().strftime(DATE_FORMAT)
+            if entry is None:
+                entry = {"start": group_start, "end": group_end, "rows": 0}
+            else:
+                retired.append(entry["file"])
+            entry["file"] = file_name
+            entry["start"] = min(entry["start"], group_start)
+            entry["end"] = max(entry["end"], group_end)
+            entry["rows"] += added
+            manifest["partitions"][key] = entry
+        if changed:
+            self.publish(root, dataset, manifest, retired)
+
+    def publish(self, root, dataset, manifest, retired):
+        """發佈新版本的 manifest，並刪除已超過保留時間的舊分區檔。"""
+        now = time.time()
+        root["version"] += 1
+        root["datasets"][dataset] = manifest
+        root.setdefault("retired", []).extend(
+            {"dataset": dataset, "file": file_name, "time": now} for file_name in retired)
+        expired = [item for item in root["retired"] if now - item["time"] > SNAPSHOT_GRACE_SECONDS]
+        root["retired"] = [item for item in root["retired"] if now - item["time"] <= SNAPSHOT_GRACE_SECONDS]
+        self.save_root(root)
+        logging.info(f"已發佈資料版本 {root['version']}（{dataset}）")
+        for item in expired:
+            file_path = self.partition_path(item["dataset"], item["file"])
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def import_csv(self, dataset):
+        """將同名的 CSV 檔案（需已遷移為數值格式）切分為分區檔並發佈新版本；既有的分區會被取代。"""
+        if self.pinned_manifest is not None:
+            raise RuntimeError("快照為唯讀，無法寫入")
+        df = CsvStore(self.base_dir).read(dataset)
+        os.makedirs(self.dataset_dir(dataset), exist_ok=True)
+        root = self.load_root()
+        version = root["version"] + 1
+        retired = [entry["file"] for entry in self.load_manifest(dataset, root)["partitions"].values()]
+        manifest = {"partition_by": self.partition_by, "partitions": {}}
+        keys = df[DATE_COLUMN].dt.strftime(PARTITION_FORMATS[self.partition_by])
+        for key, group in df.groupby(keys, sort=True):
+            group = group.sort_values(DATE_COLUMN, kind="stable")
+            file_name = f"{key}.v{version}{self.extension}"
+            atomic_write(self.partition_path(dataset, file_name), lambda temp_path: group.to_csv(
+                temp_path, index=False, encoding="utf-8-sig", date_format=DATE_FORMAT))
+            manifest["partitions"][key] = {
+                "file": file_name,
+                "start": group[DATE_COLUMN].min().strftime(DATE_FORMAT),
+                "end": group[DATE_COLUMN].max().strftime(DATE_FORMAT),
+                "rows": len(group),
+            }
+        self.publish(root, dataset, manifest, retired)
+        return len(df)
+
+
+STORE_BACKENDS = {
+    "csv": CsvStore,
+    "parquet": ParquetStore,
+    "sqlite": SqliteStore,
+    "partitioned": PartitionedStore,
+}
+
+
+def get_store(base_dir=".", backend=None):
+    """依設定建立資料儲存後端。"""
+    backend = backend or STORAGE_BACKEND
+    if backend not in STORE_BACKENDS:
+        raise ValueError(f"不支援的儲存後端：{backend}")
+    return STORE_BACKENDS[backend](base_dir)
+
+
+def main():
+    """將現有的 CSV 資料檔匯入目前設定的非 CSV 儲存後端。"""
+    store = get_store()
+    if type(store) is CsvStore:
+        print("目前的儲存後端為 CSV，無需匯入。")
+        return
+    for dataset in DATASETS:
+        if os.path.exists(os.path.join(store.base_dir, dataset + CsvStore.extension)):
+            print(f"已匯入 {dataset}，共 {store.import_csv(dataset)} 筆資料。")
+
+
+def write_csv_export(base_dir, dataset, df):
+    """將資料集以暫存檔寫入後替換的方式匯出為 CSV。"""
+    csv_path = os.path.join(base_dir, dataset + CsvStore.extension)
+    atomic_write(csv_path, lambda temp_path: df.to_csv(
+        temp_path, index=False, encoding="utf-8-sig", date_format=DATE_FORMAT))
+
+
+def file_signature(file_path):
+    """檔案的 (修改時間, 大小)；檔案不存在時回傳 None。"""
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def write_json(file_path, data):
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def atomic_write(file_path, write, source_path=None):
+    """
+    以 write(暫存檔路徑) 寫入同資料夾的暫存檔（source_path 不為 None 時先複製該檔案作為暫存檔的內容），
+    寫入完成後以 os.replace 原子替換 file_path；讀取端只會看到替換前或替換後的完整檔案。
+    """
+    temp_path = f"{file_path}.tmp"
+    try:
+        if source_path is not None:
+            shutil.copyfile(source_path, temp_path)
+        write(temp_path)
+        replace_file(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def replace_file(temp_path, file_path):
+    """os.replace；Windows 上目標檔案正被讀取時無法替換，稍候重試。"""
+    for attempt in range(REPLACE_RETRIES):
+        try:
+            os.replace(temp_path, file_path)
+            return
+        except PermissionError:
+            if attempt == REPLACE_RETRIES - 1:
+                raise
+            time.sleep(REPLACE_RETRY_DELAY)
+
+
+def to_sql_rows(df, columns):
+    """將 DataFrame 轉為 SQLite 可寫入的資料列（日期轉為 YYYY-MM-DD 字串、數值轉為 Python 原生型別）。"""
+    df = df[columns].copy()
+    df[DATE_COLUMN] = parse_dates(df[DATE_COLUMN]).dt.strftime(DATE_FORMAT)
+    for column in columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(str)
+    return list(df.astype(object).itertuples(index=False, name=None))
+
+
+# ====== CSV 增量寫入的輔助函數 ======
+def to_csv_strings(df, columns):
+    """將 DataFrame 依 CSV 的寫出格式轉為全字串欄位，方便與檔案中既有的資料列比對。"""
+    csv_text = df.to_csv(index=False, columns=columns, date_format=DATE_FORMAT)
+    return pd.read_csv(io.StringIO(csv_text), dtype=str, keep_default_na=False)
+
+
+def to_csv_bytes(df, columns):
+    """df 的資料列（不含標題列）的 CSV 內容。"""
+    return df.to_csv(header=False, index=False, columns=columns).encode("utf-8")
+
+
+def append_rows(file_path, df, columns):
+    """
+    將資料列以一次寫入附加至 CSV 檔案尾端（不含標題列）並 fsync。
+    檔案結尾若有先前寫入中斷留下的不完整資料列（沒有換行字元），先將其移除。
+    """
+    with open(file_path, "r+b") as f:
+        trim_incomplete_row(f, file_path)
+        f.seek(0, os.SEEK_END)
+        f.write(to_csv_bytes(df, columns))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def write_tail(file_path, offset, tail_bytes):
+    """將檔案自 offset 起的內容截斷，改寫為 tail_bytes 並 fsync。"""
+    with open(file_path, "r+b") as f:
+        f.truncate(offset)
+        f.seek(offset)
+        f.write(tail_bytes)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def rewrite_tail(file_path, offset, df, columns):
+    """將檔案自 offset 起的內容截斷，改寫為 df 的資料列。"""
+    write_tail(file_path, offset, to_csv_bytes(df, columns))
+
+
+def trim_incomplete_row(f, file_path):
+    """移除檔案結尾先前寫入中斷留下的不完整資料列（沒有換行字元）。"""
+    end = f.seek(0, os.SEEK_END)
+    f.seek(max(0, end - BLOCK_SIZE))
+    last_block = f.read()
+    if last_block and not last_block.endswith(b"\n"):
+        keep = end - len(last_block) + last_block.rfind(b"\n") + 1
+        logging.warning(f"{file_path} 結尾有不完整的資料列，已移除 {end - keep} 位元組")
+        f.truncate(keep)
+
+
+def read_commit_marker(file_path):
+    """讀取資料檔的已提交長度標記；不存在或無法解析時回傳 None。"""
+    try:
+        with open(file_path + COMMIT_SUFFIX, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def committed_size(file_path, f):
+    """
+    已開啟的資料檔 f 可讀取的長度：標記屬於同一個檔案時為標記的長度，否則為檔案大小。
+    先取得檔案資訊再讀取標記：就地附加前必定已發佈標記，因此標記不存在時檔案不會有未提交的資料；
+    標記屬於其他檔案時，f 已被原子替換（或為替換後尚未附加資料的新檔案），內容完整。
+    """
+    stat = os.fstat(f.fileno())
+    marker = read_commit_marker(file_path)
+    if marker is not None and marker.get("inode") == stat.st_ino:
+        return min(marker["size"], stat.st_size)
+    return stat.st_size
+
+
+def committed_signature(f, size):
+    """已開啟的資料檔與其已提交長度的版本標記。"""
+    stat = os.fstat(f.fileno())
+    return stat.st_ino, stat.st_mtime_ns, size
+
+
+def publish_committed(file_path, size=None):
+    """
+    以暫存檔寫入後原子替換的方式發佈資料檔的已提交長度（預設為目前的檔案大小）；標記未改變時不寫入。
+    資料列必須已經 fsync，讀取端讀到新的標記時資料一定已完整寫入。
+    """
+    stat = os.stat(file_path)
+    marker = {"inode": stat.st_ino, "size": stat.st_size if size is None else size}
+    if read_commit_marker(file_path) != marker:
+        atomic_write(file_path + COMMIT_SUFFIX, lambda temp_path: write_json(temp_path, marker))
+
+
+def recover_uncommitted(file_path):
+    """
+    就地寫入前確認資料檔與已提交長度一致：移除中斷寫入留下的不完整資料列，並提交目前的長度。
+    提交前中斷的附加若已完整寫入（資料列已 fsync）則保留，之後的寫入依唯一鍵去重複。
+    """
+    with open(file_path, "r+b") as f:
+        trim_incomplete_row(f, file_path)
+    publish_committed(file_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+期交所三大法人期貨／選擇權歷史資料回補：使用期交所的區間 CSV 下載，
+每次請求涵蓋最多 MAX_RANGE_DAYS 天，再以既有的 (日期, 商品名稱, 身份別) 去重複規則併入
+txf_data.csv / txop_data.csv。
+
+執行方式: python taifex_history.py 起始日期 結束日期（例如 python taifex_history.py 2023-01-01 2024-12-31）
+"""
+import logging
+import sys
+from datetime import datetime, timedelta
+
+from pipeline import run_pipeline
+from ratelimit import TokenBucket
+from sources import Job
+from update import DATASET_FILES, update_data
+
+MAX_RANGE_DAYS = 92  # 每次下載涵蓋的最大天數
+REQUESTS_PER_SECOND = 0.5  # 下載請求的速率上限
+DOWNLOAD_SOURCES = ["futContractsDateDown", "optContractsDateDown"]  # 區間下載來源（定義於 sources.SOURCES）
+
+
+def iter_ranges(start_date, end_date, max_days=MAX_RANGE_DAYS):
+    """將日期範圍切成每段最多 max_days 天的 (起, 迄) 區間。"""
+    range_start = start_date
+    while range_start <= end_date:
+        range_end = min(end_date, range_start + timedelta(days=max_days - 1))
+        yield range_start, range_end
+        range_start = range_end + timedelta(days=1)
+
+
+def store_download(job, results):
+    """將一個區間下載的資料併入對應的資料檔。"""
+    for dataset, data in results:
+        if data is None:
+            logging.warning(f"No TAIFEX data in download {job.source} {job.date:%Y/%m/%d}~{job.end_date:%Y/%m/%d}.")
+            continue
+        update_data(DATASET_FILES[dataset], data)
+
+
+def backfill(start_date, end_date, sources=DOWNLOAD_SOURCES, limiter=None):
+    """
+    以區間下載回補各來源的歷史資料，並併入對應的資料檔。
+
+    參數:
+        start_date (datetime): 起始日期
+        end_date (datetime): 結束日期
+        sources (list): 要回補的區間下載來源名稱
+        limiter (TokenBucket): 共用的限流器（None 時自動建立）
+    """
+    limiter = limiter or TokenBucket(REQUESTS_PER_SECOND)
+    jobs = (Job(source, range_start, range_end)
+            for source in sources for range_start, range_end in iter_ranges(start_date, end_date))
+    run_pipeline(jobs, store_download, limiter=limiter)
+
+
+def main():
+    if len(sys.argv) != 3:
+        print("用法: python taifex_history.py 起始日期 結束日期（YYYY-MM-DD）")
+        return
+    start_date = datetime.strptime(sys.argv[1], "%Y-%m-%d")
+    end_date = datetime.strptime(sys.argv[2], "%Y-%m-%d")
+    logging.info(f"Start TAIFEX backfill {sys.argv[1]} ~ {sys.argv[2]}...")
+    backfill(start_date, end_date)
+    logging.info("End...")
+
+
+if __name__ == "__main__":
+    main()
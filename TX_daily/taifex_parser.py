@@ -0,0 +1,311 @@
+import csv
+import io
+import logging
+import re
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import html as lxml_html
+except ImportError:  # 未安裝 lxml 時一律使用 BeautifulSoup 解析
+    lxml_html = None
+
+# 期貨與選擇權資料的欄位名稱
+HEADERS = [
+    "日期", "商品名稱", "身份別", "多方交易口數", "多方交易契約金額(千元)",
+    "空方交易口數", "空方交易契約金額(千元)", "多空交易口數淨額",
+    "多空交易契約金額淨額(千元)", "多方未平倉口數", "多方未平倉契約金額(千元)",
+    "空方未平倉口數", "空方未平倉契約金額(千元)", "多空未平倉口數淨額",
+    "多空未平倉契約金額淨額(千元)"
+]
+
+SECTION_CLASS = 'section'
+TABLE_CLASS = 'table_f table-sticky-3 w-1000'
+TARGET_SECTION_INDEX = 2  # 目標表格位於第三個 <div class="section">
+METRIC_COUNT = 12  # 每列的數值欄位數（交易與未平倉的多方、空方、淨額之口數與金額）
+OPTION_TYPES = ("買權", "賣權")  # 選擇權頁面若依權別拆分時出現的權別名稱
+SUBTOTAL_MARKERS = ("小計", "合計", "總計")  # 小計列不屬於任何商品，略過
+
+
+def class_token_pattern(tag, class_name):
+    """
+    標籤的 class 屬性含有 class_name 這個類別（以空白分隔的完整類別名稱，大小寫須相符）的正規表示式，
+    與 BeautifulSoup 的 class_= 比對方式相同：例如 "pull-right" 或 "section-title" 不會被視為 right 或 section。
+    """
+    return (rf'<{tag}\b[^>]*?\sclass\s*=\s*(["\'])(?:[^"\']*?\s)?(?-i:{re.escape(class_name)})(?:\s[^"\']*)?\1')
+
+
+SECTION_PATTERN = re.compile(class_token_pattern("div", SECTION_CLASS), re.IGNORECASE)
+TABLE_PATTERN = re.compile(r'<table\b[^>]*?\sclass\s*=\s*(["\'])(?-i:' + re.escape(TABLE_CLASS) + r')\1', re.IGNORECASE)
+TABLE_END_PATTERN = re.compile(r'</table\s*>', re.IGNORECASE)
+DATE_PATTERN = re.compile(class_token_pattern("span", "right") + r'[^>]*>(?P<text>.*?)</span\s*>', re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(r'<[^>]+>')
+
+DOWNLOAD_ENCODING = "cp950"  # 期交所區間下載檔案的編碼
+IDENTITY_NAMES = {"外資及陸資": "外資"}  # 下載檔的身份別名稱與每日頁面不同，統一為每日資料使用的名稱
+OPTION_TYPE_COLUMNS = ("權別", "買賣權別")  # 選擇權下載檔中的權別欄位名稱
+
+
+# ====== BeautifulSoup 解析（完整建立 DOM，作為備援） ======
+def extract_date(soup):
+    date_class = 'right'
+    date_span = soup.find('span', class_=date_class)
+    if date_span:
+        date_text = date_span.get_text(strip=True)
+        return date_text.replace("日期", "").strip()
+    else:
+        logging.warning("Failed to find date information. Please check the webpage structure.")
+        return "Unknown Date"
+
+def extract_table_data(soup, date, num_rows, product_name):
+    sections = soup.find_all('div', class_=SECTION_CLASS)
+    if len(sections) >= 3:
+        target_section = sections[TARGET_SECTION_INDEX]
+        table = target_section.find('table', {'class': TABLE_CLASS})
+        if table:
+            tbody = table.find('tbody')
+            rows = []
+            count = 0
+            for row in tbody.find_all('tr'):
+                if count < num_rows:
+                    columns = row.find_all('td')
+                    if len(columns) > 2:
+                        if count == 0:
+                            identity = columns[2].get_text(strip=True)
+                            row_data = [col.get_text(strip=True) for col in columns[3:]]
+                        else:
+                            identity = columns[0].get_text(strip=True)
+                            row_data = [col.get_text(strip=True) for col in columns[1:]]
+                        row_with_metadata = [date, product_name, identity] + row_data
+                        rows.append(row_with_metadata)
+                    count += 1
+                else:
+                    break
+            logging.info(f"Successfully extracted {product_name} table data. Total rows: {len(rows)}.")
+            return rows
+        else:
+            logging.warning(f"Failed to find the target table for {product_name}. Please check the webpage structure.")
+            return []
+    else:
+        logging.warning("Failed to find the required <div class='section'> structure. Please check the webpage structure.")
+        return []
+
+
+# ====== 快速解析（只解析目標表格） ======
+def cell_text(cell):
+    """與 BeautifulSoup 的 get_text(strip=True) 相同：逐段去除空白後直接串接。"""
+    return "".join(text.strip() for text in cell.itertext())
+
+
+def fast_extract_date(page_content):
+    """以正規表示式取出日期，不建立整頁 DOM；找不到時回傳 None。"""
+    match = DATE_PATTERN.search(page_content)
+    if not match:
+        return None
+    return TAG_PATTERN.sub("", match.group("text")).strip().replace("日期", "").strip()
+
+
+def find_table_html(page_content):
+    """找出第三個 section 之後的目標表格原始 HTML 片段；結構不符時回傳 None。"""
+    sections = [match.start() for match in SECTION_PATTERN.finditer(page_content)]
+    if len(sections) < 3:
+        return None
+    table_match = TABLE_PATTERN.search(page_content, sections[TARGET_SECTION_INDEX])
+    # 目標表格必須位於第三個 section 內（在下一個 section 開始之前）
+    if not table_match or (len(sections) > 3 and table_match.start() > sections[3]):
+        return None
+    end_match = TABLE_END_PATTERN.search(page_content, table_match.end())
+    if not end_match:
+        return None
+    table_html = page_content[table_match.start():end_match.end()]
+    if "<table" in table_html[1:].lower():  # 巢狀表格無法以字串切割，交由備援解析
+        return None
+    return table_html
+
+
+def fast_extract_table_rows(page_content):
+    """
+    只以 lxml 解析目標表格，回傳 tbody 中每一列的儲存格文字列表；無法解析時回傳 None。
+    """
+    if lxml_html is None:
+        return None
+    table_html = find_table_html(page_content)
+    if table_html is None:
+        return None
+    table = lxml_html.fragment_fromstring(table_html)
+    tbody = table.find("tbody")
+    if tbody is None:
+        return None
+    return [[cell_text(cell) for cell in row.findall("td")] for row in tbody.iterfind("tr")]
+
+
+def fast_extract_table_data(page_content, date, num_rows, product_name):
+    """與 extract_table_data 產生相同資料列的快速版本；無法解析時回傳 None。"""
+    table_rows = fast_extract_table_rows(page_content)
+    if table_rows is None:
+        return None
+    rows = []
+    for count, columns in enumerate(table_rows[:num_rows]):
+        if len(columns) > 2:
+            if count == 0:
+                identity, row_data = columns[2], columns[3:]
+            else:
+                identity, row_data = columns[0], columns[1:]
+            rows.append([date, product_name, identity] + row_data)
+    logging.info(f"Successfully extracted {product_name} table data. Total rows: {len(rows)}.")
+    return rows
+
+
+def soup_extract_table_rows(soup):
+    """以 BeautifulSoup 取得目標表格 tbody 中每一列的儲存格文字列表；找不到表格時回傳 None。"""
+    sections = soup.find_all('div', class_=SECTION_CLASS)
+    if len(sections) < 3:
+        return None
+    table = sections[TARGET_SECTION_INDEX].find('table', {'class': TABLE_CLASS})
+    if not table or not table.find('tbody'):
+        return None
+    return [[col.get_text(strip=True) for col in row.find_all('td')] for row in table.find('tbody').find_all('tr')]
+
+
+def to_long_format(date, table_rows):
+    """
+    將表格列轉為每個 (商品, 身份別) 一列的長格式資料。
+
+    每個商品的第一列包含序號與商品名稱（以 rowspan 涵蓋後續列），之後的列只有身份別；
+    若頁面依權別拆分，權別（買權／賣權）會併入商品名稱，例如「臺指選擇權買權」。
+    """
+    rows = []
+    product_name = None
+    option_type = ""
+    for columns in table_rows:
+        if len(columns) <= METRIC_COUNT:
+            continue
+        labels, metrics = columns[:-METRIC_COUNT], columns[-METRIC_COUNT:]
+        if any(marker in label for label in labels for marker in SUBTOTAL_MARKERS):
+            continue
+        if len(labels) >= 3:  # 序號、商品名稱、(權別)、身份別
+            product_name = labels[1]
+            option_type = labels[2] if len(labels) >= 4 and labels[2] in OPTION_TYPES else ""
+        elif len(labels) == 2 and labels[0] in OPTION_TYPES:  # 同一商品的下一個權別
+            option_type = labels[0]
+        if product_name is None:
+            continue
+        rows.append([date, product_name + option_type, labels[-1]] + metrics)
+    return rows
+
+
+def parse_all_products(page_content):
+    """
+    一次提取期交所三大法人頁面中所有商品與身份別的資料（不限於前幾列），回傳 (日期, 資料列)。
+    與 parse_page 相同，先使用快速路徑，失敗時改用 BeautifulSoup。
+    """
+    if page_content is None:
+        return "Unknown Date", []
+    date = fast_extract_date(page_content)
+    table_rows = fast_extract_table_rows(page_content) if date is not None else None
+    if table_rows is None:
+        soup = BeautifulSoup(page_content, 'html.parser')
+        date = extract_date(soup)
+        table_rows = soup_extract_table_rows(soup)
+    if table_rows is None:
+        logging.warning("Failed to find the target table for all products. Please check the webpage structure.")
+        return date, []
+    rows = to_long_format(date, table_rows)
+    logging.info(f"Successfully extracted all products table data. Total rows: {len(rows)}.")
+    return date, rows
+
+
+def parse_page(page_content, num_rows, product_name):
+    """
+    解析期交所三大法人頁面，回傳 (日期, 資料列)。
+    先使用只解析目標表格的快速路徑，頁面結構不符或未安裝 lxml 時改用 BeautifulSoup 完整解析。
+
+    參數:
+        page_content (str): 頁面 HTML
+        num_rows (int): 要提取的資料列數
+        product_name (str): 寫入資料列的商品名稱
+
+    回傳:
+        tuple: (日期字串, 資料列列表)
+    """
+    if page_content is None:
+        return "Unknown Date", []
+    date = fast_extract_date(page_content)
+    if date is not None:
+        rows = fast_extract_table_data(page_content, date, num_rows, product_name)
+        if rows is not None:
+            return date, rows
+
+    soup = BeautifulSoup(page_content, 'html.parser')
+    date = extract_date(soup)
+    return date, extract_table_data(soup, date, num_rows, product_name)
+
+
+# ====== 區間下載 CSV 解析 ======
+def to_number(value):
+    """將下載檔中的數值字串（可能含千分位逗號）轉為整數。"""
+    return int(value.replace(",", "") or 0)
+
+
+def merge_option_types(reader, type_index, product_name):
+    """
+    將選擇權下載檔中依權別拆分的資料列（每個日期、身份別各有買權與賣權兩列）加總為一列，
+    與每日頁面「依商品分」的數值相同（買權與賣權的合計）。
+    """
+    num_columns = len(HEADERS) + 1
+    merged = {}
+    for record in reader:
+        if len(record) < num_columns or not record[0].strip():
+            continue
+        record = [value.strip() for value in record[:num_columns]]
+        del record[type_index]
+        identity = IDENTITY_NAMES.get(record[2], record[2])
+        metrics = [to_number(value) for value in record[-METRIC_COUNT:]]
+        key = (record[0], identity)
+        if key in merged:
+            merged[key] = [total + value for total, value in zip(merged[key], metrics)]
+        else:
+            merged[key] = metrics
+    return [[date, product_name, identity] + [str(value) for value in metrics]
+            for (date, identity), metrics in merged.items()]
+
+
+def is_download_csv(content):
+    """下載內容是否為區間下載的 CSV（第一個欄位為「日期」）；查詢條件錯誤或查無資料時期交所回傳的是 HTML 頁面。"""
+    first_line = content[:256].decode(DOWNLOAD_ENCODING, errors="replace").split("\n", 1)[0]
+    return first_line.split(",", 1)[0].strip().lstrip("\ufeff") == "日期"
+
+
+def parse_download(content, product_name):
+    """
+    逐列解析期交所區間下載的 CSV 內容，轉為與 HEADERS 相同欄位的資料列。
+
+    期貨下載檔的欄位與 HEADERS 相同，逐列轉換；選擇權下載檔多一個權別欄位，
+    同一日期、身份別的買權與賣權會加總為一列，與每日資料（不分權別）的格式相同。
+
+    參數:
+        content (bytes): 下載的原始內容
+        product_name (str): 寫入資料列的商品名稱
+
+    回傳:
+        list: 資料列列表；內容不是預期的 CSV 格式時回傳空列表
+    """
+    reader = csv.reader(io.StringIO(content.decode(DOWNLOAD_ENCODING, errors="replace")))
+    header = next(reader, None)
+    if not header or header[0].strip().lstrip("\ufeff") != "日期":
+        logging.warning("TAIFEX download is not a CSV file. Please check the query parameters.")
+        return []
+    header = [column.strip() for column in header]
+    type_columns = [index for index, column in enumerate(header) if column in OPTION_TYPE_COLUMNS]
+    if type_columns:
+        return merge_option_types(reader, type_columns[0], product_name)
+
+    num_columns = len(HEADERS)
+    rows = []
+    for record in reader:
+        if len(record) < num_columns or not record[0].strip():
+            continue
+        record = [value.strip() for value in record[:num_columns]]
+        identity = IDENTITY_NAMES.get(record[2], record[2])
+        rows.append([record[0], product_name, identity] + record[3:])
+    return rows
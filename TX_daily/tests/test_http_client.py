@@ -0,0 +1,140 @@
+"""
+http_client 的快取測試：今天資料的有效時間，以及只有已定案的歷史回應才會永久快取。
+
+執行方式: python -m pytest tests
+"""
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+import requests
+
+TX_DAILY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TX_DAILY_DIR)
+
+import http_client  # noqa: E402
+from sources import twse_published  # noqa: E402
+
+URL = "https://www.twse.com.tw/rwd/zh/fund/BFI82U?dayDate=20250102&type=day&response=json"
+QUERY_DATE = datetime(2025, 1, 2)
+OK_BODY = {"stat": "OK", "data": [["自營商", "10", "11", "-1"]]}
+NO_DATA_BODY = {"stat": "很抱歉，沒有符合條件的資料!"}
+
+
+class FakeSession:
+    """依序回傳預先設定的 JSON 內容，並記錄連線次數。"""
+
+    def __init__(self, *bodies):
+        self.bodies = list(bodies)
+        self.calls = 0
+
+    def request(self, method, url, data=None, headers=None, timeout=None):
+        body = self.bodies[min(self.calls, len(self.bodies) - 1)]
+        self.calls += 1
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = url
+        return response
+
+
+class Clock:
+    """可調整的時鐘：同時取代 http_client.clock（日期）與 time.time（經過秒數）。"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def timestamp(self):
+        return self.now.timestamp()
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    clock = Clock(datetime(2025, 1, 2, 15, 0))
+    monkeypatch.setattr(http_client, "CACHE_DIR", str(tmp_path / "http_cache"))
+    monkeypatch.setattr(http_client, "OFFLINE", False)
+    monkeypatch.setattr(http_client, "TODAY_TTL", 600)
+    monkeypatch.setattr(http_client, "clock", clock)
+    monkeypatch.setattr(http_client.time, "time", clock.timestamp)
+    return clock
+
+
+def use_session(monkeypatch, *bodies):
+    session = FakeSession(*bodies)
+    monkeypatch.setattr(http_client, "_session", session)
+    return session
+
+
+def fetch():
+    return http_client.request("GET", URL, query_date=QUERY_DATE, is_final=twse_published)
+
+
+def test_today_response_is_reused_within_ttl(clock, monkeypatch):
+    session = use_session(monkeypatch, OK_BODY)
+    assert fetch().from_cache is False
+    clock.now = datetime(2025, 1, 2, 15, 5)
+    assert fetch().from_cache is True
+    clock.now = datetime(2025, 1, 2, 15, 11)
+    assert fetch().from_cache is False
+    assert session.calls == 2
+
+
+def test_final_response_fetched_after_query_date_is_permanent(clock, monkeypatch):
+    clock.now = datetime(2025, 1, 3, 9, 0)
+    session = use_session(monkeypatch, OK_BODY)
+    fetch()
+    clock.now = datetime(2025, 3, 1, 9, 0)
+    response = fetch()
+    assert response.from_cache is True
+    assert response.json() == OK_BODY
+    assert session.calls == 1
+
+
+def test_response_fetched_on_query_date_expires_after_ttl(clock, monkeypatch):
+    # 當天取得的內容可能是盤中或尚未更新完成的資料，日期過後也不能永久使用
+    session = use_session(monkeypatch, OK_BODY)
+    fetch()
+    clock.now = datetime(2025, 1, 3, 9, 0)
+    assert fetch().from_cache is False
+    assert session.calls == 2
+
+
+def test_unpublished_response_is_refetched_after_ttl(clock, monkeypatch):
+    clock.now = datetime(2025, 1, 3, 9, 0)
+    session = use_session(monkeypatch, NO_DATA_BODY, OK_BODY)
+    assert fetch().json() == NO_DATA_BODY
+
+    clock.now = datetime(2025, 1, 3, 9, 5)
+    assert fetch().from_cache is True  # TTL 內仍沿用，避免重試時密集連線
+
+    clock.now = datetime(2025, 1, 4, 9, 0)
+    response = fetch()
+    assert response.from_cache is False
+    assert response.json() == OK_BODY
+
+    clock.now = datetime(2025, 3, 1, 9, 0)
+    assert fetch().from_cache is True  # 已定案的內容取代了先前的回應，之後永久快取
+    assert session.calls == 2
+
+
+def test_entries_without_fetch_date_are_not_permanent(clock, monkeypatch):
+    clock.now = datetime(2025, 1, 3, 9, 0)
+    session = use_session(monkeypatch, OK_BODY)
+    fetch()
+    # 舊版快取沒有記錄取得日期，無法確定取得時資料是否完整，超過 TTL 後重新取得
+    path = http_client.index_path(http_client.cache_key(URL, QUERY_DATE))
+    with open(path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    del meta["fetched_on"]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    clock.now = datetime(2025, 3, 1, 9, 0)
+    assert fetch().from_cache is False
+    assert session.calls == 2
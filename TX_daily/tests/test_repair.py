@@ -0,0 +1,114 @@
+"""
+repair 的缺漏偵測測試：以交易日曆比對已儲存的日期，只為已確認的交易日規劃抓取工作。
+
+執行方式: python -m pytest tests
+"""
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+TX_DAILY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TX_DAILY_DIR)
+
+import initial  # noqa: E402
+import repair  # noqa: E402
+from sources import Job  # noqa: E402
+from storage import CsvStore  # noqa: E402
+from trading_calendar import TradingCalendar  # noqa: E402
+
+UNITS = ["自營商", "投信", "外資"]
+
+
+def fund_rows(date):
+    return pd.DataFrame({"日期": [date] * len(UNITS), "單位名稱": UNITS, "買進金額": 10, "賣出金額": 11,
+                         "買賣差額": -1})
+
+
+def closed_rows(*days):
+    return pd.DataFrame({"日期": list(days), "成交金額": 1, "加權指數": 1.0, "漲跌點數": 0.0})
+
+
+def day(text):
+    return datetime.strptime(text, "%Y-%m-%d")
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    """以假的管線取代網路抓取：記錄規劃的工作，並為三大法人的工作寫入資料。"""
+    jobs = []
+
+    def run_pipeline(job_iter, store, **kwargs):
+        for job in job_iter:
+            jobs.append(job)
+            if job.source == "BFI82U":
+                store(job, [("tx_fund_data", fund_rows(job.date))])
+
+    monkeypatch.setattr(repair, "run_pipeline", run_pipeline)
+    return jobs
+
+
+def test_group_ranges_splits_on_trading_day_gaps_and_range_limit():
+    trading_days = [day(text) for text in ["2025-01-02", "2025-01-03", "2025-01-06", "2025-01-07", "2025-01-08"]]
+    missing = {day("2025-01-03"), day("2025-01-06"), day("2025-01-08")}
+
+    assert repair.group_ranges(missing, trading_days) == [
+        (day("2025-01-03"), day("2025-01-06")),  # 週末不中斷連續的交易日
+        (day("2025-01-08"), day("2025-01-08")),
+    ]
+    assert repair.group_ranges(missing, trading_days, max_days=2) == [
+        (day("2025-01-03"), day("2025-01-03")),
+        (day("2025-01-06"), day("2025-01-06")),
+        (day("2025-01-08"), day("2025-01-08")),
+    ]
+
+
+def test_plan_jobs_uses_one_request_per_source_period():
+    trading_days = [day(text) for text in ["2025-01-02", "2025-01-03", "2025-01-06"]]
+    missing = {
+        "tx_fund_data": {day("2025-01-03")},
+        "tx_closed_data": {day("2025-01-02"), day("2025-01-06")},
+        "txf_data": {day("2025-01-02"), day("2025-01-03"), day("2025-01-06")},
+        "txop_data": set(),
+    }
+    assert repair.plan_jobs(missing, trading_days) == [
+        Job("BFI82U", day("2025-01-03")),
+        Job("FMTQIK", day("2025-01-01")),
+        Job("futContractsDateDown", day("2025-01-02"), day("2025-01-06")),
+    ]
+
+
+def test_repair_fetches_only_confirmed_missing_days(tmp_path, fetched):
+    store = CsvStore(str(tmp_path))
+    store.upsert("tx_closed_data", closed_rows("2025-01-02", "2025-01-03", "2025-01-06", "2025-01-08"))
+    for date in ["2025-01-02", "2025-01-06"]:
+        store.upsert("tx_fund_data", fund_rows(date))
+    calendar = TradingCalendar(str(tmp_path / "trading_calendar.json"), seed_csv_path=None)
+    calendar.add_month(2025, 1, pd.to_datetime(["2025-01-02", "2025-01-03", "2025-01-06", "2025-01-07",
+                                                "2025-01-08"]), today=day("2025-02-10"))
+    calendar.save()
+
+    report = repair.repair(end_date=day("2025-01-31"), base_dir=str(tmp_path), today=day("2025-02-10"))
+
+    # 2025-01-07 是交易日但成交資料也缺少：仍由交易日曆得知需要修補
+    assert fetched == [Job("BFI82U", day("2025-01-03")), Job("BFI82U", day("2025-01-07")),
+                       Job("BFI82U", day("2025-01-08")), Job("FMTQIK", day("2025-01-01"))]
+    assert report["tx_fund_data"] == {"expected": 5, "stored": 5, "repaired": 3, "missing": [], "unconfirmed": 0}
+    assert report["tx_closed_data"] == {"expected": 5, "stored": 4, "repaired": 0, "missing": ["2025-01-07"],
+                                        "unconfirmed": 0}
+    assert "txf_data" not in {job.source for job in fetched}
+
+
+def test_repair_confirms_current_month_before_repairing(tmp_path, fetched, monkeypatch):
+    store = CsvStore(str(tmp_path))
+    store.upsert("tx_fund_data", fund_rows("2025-02-03"))
+    # 2/5 在 FMTQIK 中不存在（假日），2/7 之後是今天，尚未公布
+    monkeypatch.setattr(initial, "fetch_twse_month", lambda year, month, limiter=None: closed_rows(
+        *pd.to_datetime(["2025-02-03", "2025-02-04", "2025-02-06"])))
+
+    report = repair.repair(base_dir=str(tmp_path), today=day("2025-02-07"))
+
+    assert fetched == [Job("BFI82U", day("2025-02-04")), Job("BFI82U", day("2025-02-06"))]
+    assert report["tx_fund_data"] == {"expected": 3, "stored": 3, "repaired": 2, "missing": [], "unconfirmed": 0}
@@ -0,0 +1,182 @@
+"""
+storage 的寫入與讀取測試：CSV 的尾端增量寫入、已提交長度、快照隔離與中斷寫入的復原，以及分區後端的 manifest 與快照。
+
+執行方式: python -m pytest tests
+"""
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+TX_DAILY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TX_DAILY_DIR)
+
+from storage import COMMIT_SUFFIX, CsvStore, PartitionedStore, upsert_csv  # noqa: E402
+
+DATASET = "tx_fund_data"
+UNITS = ["自營商", "投信", "外資"]
+
+
+def fund_rows(date, difference=-1):
+    return pd.DataFrame({
+        "日期": [date] * len(UNITS),
+        "單位名稱": UNITS,
+        "買進金額": 10,
+        "賣出金額": 10 - difference,
+        "買賣差額": difference,
+    })
+
+
+def dates(df):
+    return sorted(df["日期"].dt.strftime("%Y-%m-%d").unique())
+
+
+def parsed(df):
+    df = df.copy()
+    df["日期"] = pd.to_datetime(df["日期"])
+    return df
+
+
+def make_store(tmp_path, *days):
+    store = CsvStore(str(tmp_path))
+    for day in days:
+        store.upsert(DATASET, fund_rows(day))
+    return store
+
+
+def test_upsert_publishes_committed_length(tmp_path):
+    store = make_store(tmp_path, "2025-01-02", "2025-01-03")
+    path = store.path(DATASET)
+    assert os.path.exists(path + COMMIT_SUFFIX)
+    assert dates(store.read(DATASET)) == ["2025-01-02", "2025-01-03"]
+
+
+def test_readers_ignore_uncommitted_rows(tmp_path):
+    store = make_store(tmp_path, "2025-01-02")
+    # 模擬寫到一半的附加：一筆完整資料列與一筆不完整的資料列，尚未提交新的長度
+    with open(store.path(DATASET), "ab") as f:
+        f.write("2025-01-03,自營商,10,11,-1\n2025-01-03,投".encode("utf-8"))
+
+    assert store.latest_date(DATASET) == pd.Timestamp("2025-01-02")
+    assert dates(store.read_latest(DATASET)) == ["2025-01-02"]
+    assert len(store.read_last_rows(DATASET, 2)) == 2
+    assert dates(store.read(DATASET)) == ["2025-01-02"]
+    assert dates(store.snapshot().read(DATASET)) == ["2025-01-02"]
+
+
+def test_interrupted_append_is_recovered_before_next_write(tmp_path):
+    store = make_store(tmp_path, "2025-01-02")
+    with open(store.path(DATASET), "ab") as f:
+        f.write("2025-01-03,投".encode("utf-8"))
+    store.upsert(DATASET, fund_rows("2025-01-03"))
+
+    df = store.read(DATASET)
+    assert dates(df) == ["2025-01-02", "2025-01-03"]
+    assert len(df) == 2 * len(UNITS)
+
+
+def test_snapshot_is_isolated_from_appends_and_rewrites(tmp_path):
+    store = make_store(tmp_path, "2025-01-02")
+    snapshot = store.snapshot()
+    version = snapshot.data_version([DATASET])
+
+    store.upsert(DATASET, fund_rows("2025-01-03"))  # 附加
+    store.upsert(DATASET, fund_rows("2025-01-02", difference=-5))  # 既有資料變更：原子替換
+
+    assert dates(snapshot.read(DATASET)) == ["2025-01-02"]
+    assert snapshot.read_latest(DATASET)["買賣差額"].tolist() == [-1] * len(UNITS)
+    assert snapshot.data_version([DATASET]) == version
+
+    latest = store.snapshot()
+    assert dates(latest.read(DATASET)) == ["2025-01-02", "2025-01-03"]
+    assert latest.read(DATASET, end="2025-01-02")["買賣差額"].tolist() == [-5] * len(UNITS)
+    assert latest.data_version([DATASET]) != version
+
+
+def test_data_version_changes_only_when_rows_are_committed(tmp_path):
+    store = make_store(tmp_path, "2025-01-02")
+    version = store.data_version([DATASET])
+    store.upsert(DATASET, fund_rows("2025-01-02"))  # 無變更
+    assert store.data_version([DATASET]) == version
+    store.upsert(DATASET, fund_rows("2025-01-03"))
+    assert store.data_version([DATASET]) != version
+
+
+def test_upsert_csv_appends_new_dates_in_place(tmp_path):
+    store = make_store(tmp_path, "2025-01-02")
+    path = store.path(DATASET)
+    with open(path, "rb") as f:
+        before = f.read()
+    inode = os.stat(path).st_ino
+
+    assert upsert_csv(path, parsed(fund_rows("2025-01-03")), ["日期", "單位名稱"]) == (len(UNITS), 0)
+    with open(path, "rb") as f:
+        after = f.read()
+    assert after.startswith(before)
+    assert os.stat(path).st_ino == inode
+    assert dates(store.read(DATASET)) == ["2025-01-02", "2025-01-03"]
+
+
+def test_upsert_csv_rewrites_tail_when_rows_change_or_are_inserted(tmp_path):
+    store = make_store(tmp_path, "2025-01-02", "2025-01-06")
+    path = store.path(DATASET)
+    inode = os.stat(path).st_ino
+
+    assert upsert_csv(path, parsed(fund_rows("2025-01-06", difference=-5)), ["日期", "單位名稱"]) == (0, len(UNITS))
+    assert os.stat(path).st_ino != inode  # 以暫存檔改寫尾端後原子替換
+    assert upsert_csv(path, parsed(fund_rows("2025-01-03")), ["日期", "單位名稱"]) == (len(UNITS), 0)
+
+    df = store.read(DATASET)
+    assert dates(df) == ["2025-01-02", "2025-01-03", "2025-01-06"]
+    assert df["日期"].is_monotonic_increasing
+    assert df.loc[df["日期"] == "2025-01-06", "買賣差額"].tolist() == [-5] * len(UNITS)
+    assert df.loc[df["日期"] == "2025-01-02", "買賣差額"].tolist() == [-1] * len(UNITS)
+
+
+def test_upsert_csv_without_changes_writes_nothing(tmp_path):
+    store = make_store(tmp_path, "2025-01-02", "2025-01-03")
+    path = store.path(DATASET)
+    before = os.stat(path)
+
+    assert upsert_csv(path, parsed(fund_rows("2025-01-03")), ["日期", "單位名稱"]) == (0, 0)
+    after = os.stat(path)
+    assert (after.st_ino, after.st_mtime_ns, after.st_size) == (before.st_ino, before.st_mtime_ns, before.st_size)
+
+
+def test_partitioned_manifest_tracks_partitions_and_versions(tmp_path):
+    store = PartitionedStore(str(tmp_path))
+    store.upsert(DATASET, pd.concat([fund_rows("2025-01-30"), fund_rows("2025-02-03")]))
+    store.upsert(DATASET, fund_rows("2025-02-04"))
+
+    root = store.load_root()
+    partitions = root["datasets"][DATASET]["partitions"]
+    assert root["version"] == 2
+    assert sorted(partitions) == ["2025-01", "2025-02"]
+    assert partitions["2025-01"] == {"file": "2025-01.v1.csv", "start": "2025-01-30", "end": "2025-01-30",
+                                     "rows": len(UNITS)}
+    assert partitions["2025-02"] == {"file": "2025-02.v2.csv", "start": "2025-02-03", "end": "2025-02-04",
+                                     "rows": 2 * len(UNITS)}
+    assert store.latest_date(DATASET) == pd.Timestamp("2025-02-04")
+    assert dates(store.read(DATASET, start="2025-02-01")) == ["2025-02-03", "2025-02-04"]
+
+    store.upsert(DATASET, fund_rows("2025-02-04"))  # 無變更時不發佈新版本
+    assert store.version() == 2
+    assert not os.path.exists(store.partition_path(DATASET, "2025-02.v3.csv"))
+
+
+def test_partitioned_snapshot_keeps_its_manifest_version(tmp_path):
+    store = PartitionedStore(str(tmp_path))
+    store.upsert(DATASET, fund_rows("2025-01-02"))
+    snapshot = store.snapshot()
+
+    store.upsert(DATASET, fund_rows("2025-01-02", difference=-5))
+    store.upsert(DATASET, fund_rows("2025-01-03"))
+
+    assert snapshot.version() == 1
+    assert snapshot.data_version([DATASET]) != store.data_version([DATASET])
+    assert dates(snapshot.read(DATASET)) == ["2025-01-02"]
+    assert snapshot.read_latest(DATASET)["買賣差額"].tolist() == [-1] * len(UNITS)
+    assert dates(store.read(DATASET)) == ["2025-01-02", "2025-01-03"]
+    with pytest.raises(RuntimeError):
+        snapshot.upsert(DATASET, fund_rows("2025-01-06"))
@@ -0,0 +1,110 @@
+"""
+taifex_parser 快速路徑（正規表示式 + lxml）與 BeautifulSoup 完整解析的一致性測試。
+
+執行方式: python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+from bs4 import BeautifulSoup
+
+TX_DAILY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TX_DAILY_DIR)
+
+from taifex_parser import (  # noqa: E402
+    DOWNLOAD_ENCODING, HEADERS, extract_date, extract_table_data, fast_extract_date, parse_all_products,
+    parse_download, parse_page, soup_extract_table_rows, to_long_format,
+)
+
+SAMPLE_DIR = os.path.join(TX_DAILY_DIR, "sample")
+PAGES = {
+    "futContractsDate.html": "臺股期貨",
+    "optContractsDate.html": "選擇權",
+}
+NUM_ROWS = 3
+# 類別名稱中含有 section / right 但不是該類別的元素（例如 section-title、pull-right），應被兩種解析方式忽略
+DECOYS = '<div class="section-title"><span class="pull-right">日期1999/01/01</span></div>'
+METRIC_HEADERS = HEADERS[3:]
+
+
+def load_page(file_name):
+    with open(os.path.join(SAMPLE_DIR, file_name), encoding="utf-8") as file:
+        return file.read()
+
+
+def with_decoys(page_content):
+    """在第一個 section 之前加入干擾元素，並讓目標表格所在的 section 帶有多個類別。"""
+    page_content = page_content.replace('<div id="container">', '<div id="container">' + DECOYS, 1)
+    head, _, tail = page_content.partition('<div class="section">\n')
+    return head + '<div class="wide section">\n' + tail
+
+
+def soup_parse_all_products(page_content):
+    soup = BeautifulSoup(page_content, 'html.parser')
+    date = extract_date(soup)
+    return date, to_long_format(date, soup_extract_table_rows(soup))
+
+
+@pytest.mark.parametrize("file_name", sorted(PAGES))
+@pytest.mark.parametrize("decorate", [False, True], ids=["sample", "decoys"])
+def test_fast_path_matches_soup(file_name, decorate):
+    page_content = load_page(file_name)
+    if decorate:
+        page_content = with_decoys(page_content)
+    product_name = PAGES[file_name]
+    soup = BeautifulSoup(page_content, 'html.parser')
+    soup_date = extract_date(soup)
+
+    assert fast_extract_date(page_content) == soup_date == "2025/01/22"
+    assert parse_page(page_content, NUM_ROWS, product_name) == (
+        soup_date, extract_table_data(soup, soup_date, NUM_ROWS, product_name))
+    date, rows = parse_all_products(page_content)
+    assert rows
+    assert (date, rows) == soup_parse_all_products(page_content)
+
+
+@pytest.mark.parametrize("file_name", sorted(PAGES))
+def test_decoys_change_nothing(file_name):
+    page_content = load_page(file_name)
+    decorated = with_decoys(page_content)
+    assert DECOYS in decorated
+    assert parse_all_products(decorated) == parse_all_products(page_content)
+
+
+def download_content(header, records):
+    """組成與期交所區間下載相同格式（cp950、CRLF 換行）的 CSV 內容。"""
+    lines = [",".join(header)] + [",".join(record) for record in records]
+    return ("\r\n".join(lines) + "\r\n").encode(DOWNLOAD_ENCODING)
+
+
+def test_parse_download_futures():
+    content = download_content(["日期", "商品名稱", "身份別"] + METRIC_HEADERS, [
+        ["2025/01/21", "臺股期貨", "自營商"] + [str(i) for i in range(1, 13)],
+        ["2025/01/21", "臺股期貨", "外資及陸資"] + [str(-i) for i in range(1, 13)],
+        ["2025/01/22", "臺股期貨", "投信"] + ["0"] * 12,
+    ])
+    assert parse_download(content, "臺股期貨") == [
+        ["2025/01/21", "臺股期貨", "自營商"] + [str(i) for i in range(1, 13)],
+        ["2025/01/21", "臺股期貨", "外資"] + [str(-i) for i in range(1, 13)],
+        ["2025/01/22", "臺股期貨", "投信"] + ["0"] * 12,
+    ]
+
+
+def test_parse_download_options_merges_option_types():
+    content = download_content(["日期", "商品名稱", "權別", "身份別"] + METRIC_HEADERS, [
+        ["2025/01/21", "臺指選擇權", "買權", "自營商"] + [str(i) for i in range(1, 13)],
+        ["2025/01/21", "臺指選擇權", "賣權", "自營商"] + [str(i * 10) for i in range(1, 13)],
+        ["2025/01/21", "臺指選擇權", "買權", "外資及陸資"] + ["5"] * 12,
+        ["2025/01/21", "臺指選擇權", "賣權", "外資及陸資"] + ["-7"] * 12,
+        ["2025/01/22", "臺指選擇權", "買權", "投信"] + ["3"] * 12,
+    ])
+    assert parse_download(content, "選擇權") == [
+        ["2025/01/21", "選擇權", "自營商"] + [str(i * 11) for i in range(1, 13)],
+        ["2025/01/21", "選擇權", "外資"] + ["-2"] * 12,
+        ["2025/01/22", "選擇權", "投信"] + ["3"] * 12,
+    ]
+
+
+def test_parse_download_rejects_non_csv():
+    assert parse_download("<html>查無資料</html>".encode(DOWNLOAD_ENCODING), "選擇權") == []
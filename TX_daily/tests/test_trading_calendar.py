@@ -0,0 +1,84 @@
+"""
+trading_calendar 的測試：以成交資料 CSV 補充索引、月份完整的判斷，以及當月已確認範圍內的交易日判斷。
+
+執行方式: python -m pytest tests
+"""
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+TX_DAILY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, TX_DAILY_DIR)
+
+from trading_calendar import TradingCalendar  # noqa: E402
+
+TODAY = datetime(2025, 2, 10)
+
+
+def write_closed(path, days):
+    pd.DataFrame({"日期": days, "成交金額": 1, "加權指數": 1.0, "漲跌點數": 0.0}).to_csv(
+        path, index=False, encoding="utf-8-sig")
+
+
+def make_calendar(tmp_path):
+    return TradingCalendar(str(tmp_path / "trading_calendar.json"), seed_csv_path=None)
+
+
+def test_seed_marks_months_without_remaining_weekdays_complete(tmp_path):
+    csv_path = str(tmp_path / "tx_closed_data.csv")
+    # 2024-11 最後一個交易日為 11/29（週五）；2025-01 的最後一筆 1/22 之後仍有週一至週五（春節連假）
+    write_closed(csv_path, ["2024-11-28", "2024-11-29", "2025-01-21", "2025-01-22", "2025-02-07"])
+    calendar = make_calendar(tmp_path)
+
+    assert calendar.seed_from_csv(csv_path, today=TODAY) == 1
+    assert calendar.complete_months == {"2024-11"}
+    assert "2025-01-22" in calendar.trading_days
+    assert calendar.seed_from_csv(csv_path, today=TODAY) == 0  # 已完整的月份不重複計算
+
+    assert not calendar.is_trading_day(datetime(2024, 11, 27))  # 完整月份中不在索引內的日期
+    assert calendar.is_trading_day(datetime(2025, 1, 23))  # 尚未確認的月份以週一至週五推估
+    assert not calendar.is_trading_day(datetime(2025, 1, 25))
+
+
+def test_seed_without_csv_changes_nothing(tmp_path):
+    calendar = make_calendar(tmp_path)
+    assert calendar.seed_from_csv(str(tmp_path / "missing.csv"), today=TODAY) == 0
+    assert calendar.trading_days == set()
+
+
+def test_current_month_is_confirmed_up_to_the_day_before_fetching(tmp_path):
+    calendar = make_calendar(tmp_path)
+    calendar.add_month(2025, 2, pd.to_datetime(["2025-02-03", "2025-02-04", "2025-02-06"]), today=datetime(2025, 2, 7))
+
+    assert "2025-02" not in calendar.complete_months
+    assert calendar.confirmed_through == {"2025-02": "2025-02-06"}
+    assert not calendar.is_trading_day(datetime(2025, 2, 5))  # 已確認範圍內不在 FMTQIK 中的週一至週五
+    assert calendar.is_trading_day(datetime(2025, 2, 7))  # 尚未確認，仍以週一至週五推估
+
+    calendar.save()
+    loaded = make_calendar(tmp_path)
+    assert loaded.confirmed_through == {"2025-02": "2025-02-06"}
+
+    loaded.add_month(2025, 2, pd.to_datetime(["2025-02-07"]), today=datetime(2025, 3, 1))
+    assert loaded.complete_months == {"2025-02"}
+    assert loaded.confirmed_through == {}
+
+
+def test_refresh_fetches_only_unconfirmed_months(tmp_path):
+    calendar = make_calendar(tmp_path)
+    fetched = []
+
+    def fetch_month(year, month, limiter):
+        fetched.append((year, month))
+        return pd.DataFrame({"日期": pd.to_datetime([f"{year}-{month:02d}-03"])})
+
+    today = datetime(2025, 2, 10)
+    assert calendar.refresh(datetime(2025, 1, 1), datetime(2025, 2, 9), fetch_month, today=today) == 1
+    assert fetched == [(2025, 1)]
+    assert calendar.refresh(datetime(2025, 1, 1), datetime(2025, 2, 9), fetch_month, today=today,
+                            include_current=True) == 1
+    assert fetched == [(2025, 1), (2025, 2)]
+    assert calendar.refresh(datetime(2025, 1, 1), datetime(2025, 2, 9), fetch_month, today=today,
+                            include_current=True) == 0
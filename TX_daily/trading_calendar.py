@@ -0,0 +1,197 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+CALENDAR_FILE_PATH = "trading_calendar.json"  # 交易日曆索引的儲存路徑
+SEED_CSV_PATH = "tx_closed_data.csv"  # 補充交易日曆用的成交資料（每一列即一個交易日）
+
+
+def month_key(date):
+    """取得日期所屬月份的鍵值（YYYY-MM）。"""
+    return date.strftime("%Y-%m")
+
+
+def month_bounds(year, month):
+    """回傳指定月份的第一天與最後一天（datetime 格式）。"""
+    first_day = datetime(year, month, 1)
+    next_month = datetime(year + month // 12, month % 12 + 1, 1)
+    return first_day, next_month - timedelta(days=1)
+
+
+def iter_months(start_date, end_date):
+    """依序產生 start_date 至 end_date（含）所涵蓋的每個 (年, 月)。"""
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        yield year, month
+        year, month = year + month // 12, month % 12 + 1
+
+
+class TradingCalendar:
+    """
+    以 FMTQIK 每月成交資料建立的交易日曆索引，並持久化為 JSON 檔案。
+
+    已完整抓取過的月份（月份結束後才抓取）以索引內容為準；當月抓取過的部分（至抓取日的前一天為止）
+    同樣以索引內容為準，其餘尚未確認的日期則以週一至週五作為推估，避免漏抓資料。
+
+    參數:
+        file_path (str): 索引檔案路徑
+        seed_csv_path (str): 抓取前先用來補充索引的成交資料 CSV（None 表示不使用）
+    """
+
+    def __init__(self, file_path=CALENDAR_FILE_PATH, seed_csv_path=SEED_CSV_PATH):
+        self.file_path = file_path
+        self.seed_csv_path = seed_csv_path
+        self.trading_days = set()  # 已知的交易日（YYYY-MM-DD）
+        self.complete_months = set()  # 已完整抓取的月份（YYYY-MM）
+        self.confirmed_through = {}  # 尚未結束的月份（YYYY-MM）已確認至哪一天（YYYY-MM-DD）
+        self.load()
+
+    def load(self):
+        """從檔案載入索引；檔案不存在時維持空索引。"""
+        if os.path.exists(self.file_path):
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.trading_days = set(data.get("trading_days", []))
+            self.complete_months = set(data.get("complete_months", []))
+            self.confirmed_through = data.get("confirmed_through", {})
+
+    def save(self):
+        """將索引寫回檔案。"""
+        data = {
+            "trading_days": sorted(self.trading_days),
+            "complete_months": sorted(self.complete_months),
+            "confirmed_through": dict(sorted(self.confirmed_through.items())),
+        }
+        with open(self.file_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=0)
+
+    def add_month(self, year, month, dates, today=None):
+        """
+        加入某月份 FMTQIK 回傳的交易日；若該月份已經結束則標記為完整，
+        尚未結束時則記錄該月份已確認至 today 的前一天（之前的資料皆已公布）。
+
+        參數:
+            year (int): 年份
+            month (int): 月份
+            dates (iterable): 該月份的交易日（datetime 或 Timestamp）
+            today (datetime): 判斷月份是否結束的基準日（預設為現在）
+        """
+        today = today or datetime.now()
+        self.trading_days.update(date.strftime("%Y-%m-%d") for date in dates)
+        key = f"{year}-{month:02d}"
+        first_day, last_day = month_bounds(year, month)
+        if last_day.date() < today.date():
+            self.complete_months.add(key)
+            self.confirmed_through.pop(key, None)
+            return
+        yesterday = (today - timedelta(days=1)).strftime("%Y-%m-%d")
+        if yesterday >= first_day.strftime("%Y-%m-%d") and yesterday > self.confirmed_through.get(key, ""):
+            self.confirmed_through[key] = yesterday
+
+    def seed_from_csv(self, file_path, today=None):
+        """
+        以既有的成交資料 CSV（每一列即一個交易日）補充已知交易日。
+
+        FMTQIK 每次回傳整個月份至查詢日為止的所有交易日，CSV 中每個月份的資料都是連續的；
+        已結束的月份若最後一筆資料之後到月底已沒有週一至週五，該月份即為完整，標記後不必再以網路抓取。
+        其餘月份（例如月底為連假）只補充交易日，仍由 refresh 抓取一次確認。
+
+        回傳:
+            int: 新標記為完整的月份數
+        """
+        if not os.path.exists(file_path):
+            return 0
+        import pandas as pd
+
+        today = today or datetime.now()
+        dates = pd.to_datetime(pd.read_csv(file_path, usecols=["日期"], encoding="utf-8-sig")["日期"],
+                               format="%Y-%m-%d")
+        self.trading_days.update(dates.dt.strftime("%Y-%m-%d"))
+        completed = 0
+        for key, last_date in dates.groupby(dates.dt.strftime("%Y-%m")).max().items():
+            _, last_day = month_bounds(last_date.year, last_date.month)
+            if key in self.complete_months or last_day.date() >= today.date():
+                continue
+            remaining = pd.date_range(last_date + timedelta(days=1), last_day)
+            if not (remaining.weekday < 5).any():
+                self.complete_months.add(key)
+                completed += 1
+        return completed
+
+    def is_confirmed(self, date):
+        """指定日期是否已由 FMTQIK 確認（所屬月份已完整，或在當月已確認的範圍內）。"""
+        month = month_key(date)
+        return month in self.complete_months or date.strftime("%Y-%m-%d") <= self.confirmed_through.get(month, "")
+
+    def is_trading_day(self, date):
+        """判斷指定日期是否為交易日；尚未確認的日期以週一至週五推估。"""
+        if date.strftime("%Y-%m-%d") in self.trading_days:
+            return True
+        if self.is_confirmed(date):
+            return False
+        return date.weekday() < 5
+
+    def trading_days_between(self, start_date, end_date):
+        """回傳 start_date 至 end_date（含）之間的交易日列表（datetime 格式，依日期排序）。"""
+        days = []
+        current_date = datetime(start_date.year, start_date.month, start_date.day)
+        while current_date.date() <= end_date.date():
+            if self.is_trading_day(current_date):
+                days.append(current_date)
+            current_date += timedelta(days=1)
+        return days
+
+    def missing_months(self, start_date, end_date, today=None, include_current=False):
+        """
+        回傳範圍內已經結束、但尚未完整抓取的月份 (年, 月) 列表。
+        include_current 為 True 時，也包含範圍內（至 today 的前一天為止）尚未確認的當月。
+        """
+        today = today or datetime.now()
+        yesterday = today - timedelta(days=1)
+        months = []
+        for year, month in iter_months(start_date, end_date):
+            first_day, last_day = month_bounds(year, month)
+            if f"{year}-{month:02d}" in self.complete_months:
+                continue
+            if last_day.date() < today.date():
+                months.append((year, month))
+            elif include_current and first_day.date() <= yesterday.date():
+                if not self.is_confirmed(min(end_date, yesterday)):
+                    months.append((year, month))
+        return months
+
+    def refresh(self, start_date, end_date, fetch_month=None, limiter=None, today=None, include_current=False):
+        """
+        對範圍內已結束但尚未完整的月份各抓取一次 FMTQIK，更新並儲存索引。
+        每個月份完整抓取後便不再重新抓取，因此每月只會多出一次請求。
+        include_current 為 True 時也抓取當月，確認至 today 的前一天為止的交易日（每天最多一次請求）。
+
+        參數:
+            start_date (datetime): 範圍起始日期
+            end_date (datetime): 範圍結束日期
+            fetch_month (callable): 以 (年, 月, limiter) 取得該月成交資料 DataFrame 的函數
+            limiter (TokenBucket): 共用的限流器
+            today (datetime): 判斷月份是否結束的基準日（預設為現在）
+            include_current (bool): 是否一併抓取尚未結束的當月
+
+        回傳:
+            int: 本次實際抓取的月份數
+        """
+        if fetch_month is None:
+            from initial import fetch_twse_month as fetch_month
+
+        missing = self.missing_months(start_date, end_date, today, include_current)
+        seeded = 0
+        if missing and self.seed_csv_path is not None:
+            # 先以已儲存的成交資料補充索引，只抓取仍無法確認的月份
+            seeded = self.seed_from_csv(self.seed_csv_path, today)
+            missing = self.missing_months(start_date, end_date, today, include_current)
+        fetched = 0
+        for year, month in missing:
+            month_data = fetch_month(year, month, limiter)
+            fetched += 1
+            if month_data is not None:
+                self.add_month(year, month, month_data["日期"], today)
+        if fetched or seeded:
+            self.save()
+        return fetched
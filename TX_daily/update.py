@@ -1,9 +1,16 @@
 import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import logging
+import sys
+import time
+import http_client
+from pipeline import run_pipeline
+from report import REPORT_FILE_NAME, write_report
+from source_state import SourceState
+from sources import SOURCES, Job, describe, parse_job, pop_base_url, request_for
+from storage import dataset_name, get_store
+from trading_calendar import TradingCalendar
 
 # 設置 logging 參數
 log_file = "update.log"
@@ -20,156 +27,18 @@ fund_data_file_path = "tx_fund_data.csv"
 twse_data_file_path = "tx_closed_data.csv"
 txf_data_file_path = "txf_data.csv"
 txop_data_file_path = "txop_data.csv"
+txf_all_data_file_path = "txf_all_data.csv"  # 期貨頁面中所有商品與身份別的長格式資料
+txop_all_data_file_path = "txop_all_data.csv"  # 選擇權頁面中所有商品與身份別的長格式資料
+
+# 資料集名稱對應的資料檔路徑
+DATASET_FILES = {
+    dataset_name(file_path): file_path
+    for file_path in [fund_data_file_path, twse_data_file_path, txf_data_file_path, txop_data_file_path,
+                      txf_all_data_file_path, txop_all_data_file_path]
+}
 
-# 定義表格的標題名稱（期貨與選擇權資料）
-HEADERS = [
-    "日期", "商品名稱", "身份別", "多方交易口數", "多方交易契約金額(千元)",
-    "空方交易口數", "空方交易契約金額(千元)", "多空交易口數淨額",
-    "多空交易契約金額淨額(千元)", "多方未平倉口數", "多方未平倉契約金額(千元)",
-    "空方未平倉口數", "空方未平倉契約金額(千元)", "多空未平倉口數淨額",
-    "多空未平倉契約金額淨額(千元)"
-]
-TARGET_URL_TFX = "https://www.taifex.com.tw/cht/3/futContractsDate"  # 期貨目標網址
-TARGET_URL_TXOP = "https://www.taifex.com.tw/cht/3/optContractsDate"  # 選擇權目標網址
-
-# ====== 取得三大法人資料的函數 ======
-def fetch_fund_data_for_today():
-    current_date = datetime.now().strftime("%Y%m%d")
-    # current_date = datetime(2024, 10, 25).strftime("%Y%m%d")
-    api_url = f"https://www.twse.com.tw/rwd/zh/fund/BFI82U?type=day&dayDate={current_date}&response=json"
-    
-    try:
-        response = requests.get(api_url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        if data["stat"] == "OK":
-            records = []
-            for record in data["data"]:
-                unit_name = record[0]
-                buy_amount = record[1]
-                sell_amount = record[2]
-                diff = record[3]
-                records.append([current_date, unit_name, buy_amount, sell_amount, diff])
-            df = pd.DataFrame(records, columns=["日期", "單位名稱", "買進金額", "賣出金額", "買賣差額"])
-            df["日期"] = pd.to_datetime(df["日期"], format="%Y%m%d")
-            logging.info(f"Successfully retrieved institutional investor data for {current_date}.")
-            return df
-        else:
-            logging.warning(f"Failed to retrieve institutional investor data for {current_date}. API Response: {data['stat']}")
-            return None
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error : institutional investor data : {e}")
-        return None
-
-# ====== 取得 TWSE 成交資料的函數 ======
-def fetch_latest_twse_data():
-    current_year = datetime.now().year
-    current_month = datetime.now().month
-    formatted_month = f"{current_month:02d}"
-    date_param = f"{current_year}{formatted_month}01"
-    api_url = f"https://www.twse.com.tw/rwd/zh/afterTrading/FMTQIK?date={date_param}&response=json"
-    
-    try:
-        response = requests.get(api_url)
-        response.raise_for_status()
-        data = response.json()
-        if data["stat"] == "OK":
-            records = []
-            for record in data["data"]:
-                date = str(int(record[0].split("/")[0]) + 1911) + "/" + record[0].split("/")[1] + "/" + record[0].split("/")[2]
-                date = datetime.strptime(date, "%Y/%m/%d")
-                amount = record[2]
-                index = record[4]
-                change = record[5]
-                records.append([date, amount, index, change])
-            df = pd.DataFrame(records, columns=["日期", "成交金額", "加權指數", "漲跌點數"])
-            logging.info(f"Successfully retrieved TWSE trading data for {date_param}.")
-            return df
-        else:
-            logging.warning(f"Failed to retrieve TWSE trading data for {date_param}. API Response: {data['stat']}")
-            return None
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error : TWSE closed trading data : {e}")
-        return None
-
-# ====== 取得期貨或選擇權資料的共用函數 ======
-def fetch_page(url):
-    try:
-        response = requests.get(url)
-        response.encoding = 'utf-8'
-        return response.text
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error : TXF or TXOP webpage : {e}")
-        return None
-
-def extract_date(soup):
-    date_class = 'right'
-    date_span = soup.find('span', class_=date_class)
-    if date_span:
-        date_text = date_span.get_text(strip=True)
-        return date_text.replace("日期", "").strip()
-    else:
-        logging.warning("Failed to find date information. Please check the webpage structure.")
-        return "Unknown Date"
-
-def extract_table_data(soup, date, num_rows, product_name):
-    section_class = 'section'
-    table_class = 'table_f table-sticky-3 w-1000'
-    sections = soup.find_all('div', class_=section_class)
-    if len(sections) >= 3:
-        target_section = sections[2]
-        table = target_section.find('table', {'class': table_class})
-        if table:
-            tbody = table.find('tbody')
-            rows = []
-            count = 0
-            for row in tbody.find_all('tr'):
-                if count < num_rows:
-                    columns = row.find_all('td')
-                    if len(columns) > 2:
-                        if count == 0:
-                            identity = columns[2].get_text(strip=True)
-                            row_data = [col.get_text(strip=True) for col in columns[3:]]
-                        else:
-                            identity = columns[0].get_text(strip=True)
-                            row_data = [col.get_text(strip=True) for col in columns[1:]]
-                        row_with_metadata = [date, product_name, identity] + row_data
-                        rows.append(row_with_metadata)
-                    count += 1
-                else:
-                    break
-            logging.info(f"Successfully extracted {product_name} table data. Total rows: {len(rows)}.")
-            return rows
-        else:
-            logging.warning(f"Failed to find the target table for {product_name}. Please check the webpage structure.")
-            return []
-    else:
-        logging.warning("Failed to find the required <div class='section'> structure. Please check the webpage structure.")
-        return []
-
-def fetch_txf_data():
-    page_content = fetch_page(TARGET_URL_TFX)
-    soup = BeautifulSoup(page_content, 'html.parser')
-    date = extract_date(soup)
-    NUM_ROWS_TO_EXTRACT = 3
-    table_data = extract_table_data(soup, date, NUM_ROWS_TO_EXTRACT, "臺股期貨")
-    if table_data:
-        df = pd.DataFrame(table_data, columns=HEADERS)
-        return df
-    else:
-        return None
-
-def fetch_txop_data():
-    page_content = fetch_page(TARGET_URL_TXOP)
-    soup = BeautifulSoup(page_content, 'html.parser')
-    date = extract_date(soup)
-    NUM_ROWS_TO_EXTRACT = 3
-    table_data = extract_table_data(soup, date, NUM_ROWS_TO_EXTRACT, "選擇權")
-    if table_data:
-        df = pd.DataFrame(table_data, columns=HEADERS)
-        return df
-    else:
-        return None
+# 每日更新的資料來源（定義於 sources.SOURCES），彼此獨立，可同時抓取
+DAILY_SOURCES = ["BFI82U", "FMTQIK", "futContractsDate", "optContractsDate"]
 
 # 定義單位名稱的排序順序
 order = {
@@ -184,13 +53,16 @@ order = {
 # ====== 資料更新函數 ======
 def update_data(file_path, new_data, date_column="日期", unique_columns=None):
     """
-    更新 CSV 檔案，將新資料合併進現有的資料中。
+    更新資料集，將新資料合併進現有的資料中。實際的儲存格式由 storage.STORAGE_BACKEND 決定。
     
     參數:
-        file_path (str): CSV 檔案路徑
+        file_path (str): 資料檔路徑（檔名即資料集名稱，所在資料夾即儲存位置）
         new_data (DataFrame): 新取得的資料
         date_column (str): 日期欄位名稱（預設為 "日期"）
         unique_columns (list): 用於辨識資料唯一性的欄位名稱列表（若無指定則以 "日期" 為主）
+
+    回傳:
+        bool: 寫入成功時為 True
     """
     if unique_columns is None:
         unique_columns = [date_column]  # 預設以日期欄位作為唯一性檢查欄位
@@ -201,56 +73,136 @@ def update_data(file_path, new_data, date_column="日期", unique_columns=None):
     elif '單位名稱' in new_data.columns:
         unique_columns = [date_column, "單位名稱"]  # 三大法人資料用
 
-    if os.path.exists(file_path):
-        try:
-            existing_df = pd.read_csv(file_path)
-            existing_df[date_column] = pd.to_datetime(existing_df[date_column])
-            new_data[date_column] = pd.to_datetime(new_data[date_column])
-
-            # 找出新資料中尚未更新的日期
-            new_dates = set(new_data[date_column]) - set(existing_df[date_column])
-            df_new_filtered = new_data[new_data[date_column].isin(new_dates)]
-
-            # 若有新資料，則合併並儲存
-            if not df_new_filtered.empty:
-                combined_df = pd.concat([existing_df, df_new_filtered], ignore_index=True).drop_duplicates(subset=unique_columns).sort_values(date_column)
-                combined_df.to_csv(file_path, index=False, encoding="utf-8-sig")
-                logging.info(f"新增了 {len(df_new_filtered)} 筆資料並更新至 {file_path}")
-            else:
-                logging.info(f"無新增資料，{file_path} 檔案未變更。")
-        except Exception as e:
-            logging.error(f"讀取或更新 {file_path} CSV 檔案時發生錯誤：{e}")
-    else:
-        # 如果檔案不存在，則直接儲存新的資料
-        new_data.to_csv(file_path, index=False, encoding="utf-8-sig")
-        logging.info(f"檔案不存在，已創建新檔案並儲存 {len(new_data)} 筆資料至 {file_path}")
-
-# ====== 主程式 ======
-def main():
-    date = datetime.now().strftime("%Y%m%d")
-    logging.info("Start update {date}...".format(date=date))
+    try:
+        store = get_store(os.path.dirname(file_path) or ".")
+        store.upsert(dataset_name(file_path), new_data, unique_columns)
+        return True
+    except Exception as e:
+        logging.error(f"讀取或更新 {file_path} 資料時發生錯誤：{e}")
+        return False
+
+# ====== 每日資料來源的抓取、解析與寫入 ======
+def fetch_source(job, state, refresh=False):
+    """
+    以條件式請求取得資料來源；來源內容與上次成功寫入時相同時回傳 None，
+    讓呼叫端直接略過解析與寫檔。refresh 為 True 時不使用快取（輪詢模式用）。
+    """
+    method, url, form, query_date = request_for(job)
+    try:
+        response = http_client.request(method, url, query_date=query_date, data=form, timeout=10,
+                                       headers=state.conditional_headers(job.source, url), refresh=refresh,
+                                       is_final=SOURCES[job.source].get("final"))
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error : {describe(job)} : {e}")
+        return None
+    if state.is_unchanged(job.source, url, response):
+        return None
+    return response
 
-    # 取得三大法人資料並更新
-    fund_data = fetch_fund_data_for_today()
-    if fund_data is not None:
-        update_data(fund_data_file_path, fund_data)
+def parse_source(job, response, state):
+    """解析來源回應，並記錄解析所花的 CPU 時間（作為之後略過時的節省估計）。"""
+    cpu_started = time.thread_time()
+    try:
+        return parse_job(job, response)
+    finally:
+        state.add_cpu(job.source, time.thread_time() - cpu_started)
+
+def today_job(name, today=None):
+    """今天（或指定日期）的抓取工作（日期不含時間）。"""
+    now = today or datetime.now()
+    return Job(name, datetime(now.year, now.month, now.day))
+
+def run_stage(name, state, refresh=False):
+    """抓取並解析單一來源（輪詢模式用），並將耗時記錄至 update.log；來源未變更時回傳空列表。"""
+    started = time.perf_counter()
+    job = today_job(name)
+    try:
+        response = fetch_source(job, state, refresh)
+        return parse_source(job, response, state) if response is not None else []
+    finally:
+        logging.info(f"{name} fetch and parse took {time.perf_counter() - started:.2f}s")
 
-    # 取得 TWSE 成交資料並更新
-    twse_data = fetch_latest_twse_data()
-    if twse_data is not None:
-        update_data(twse_data_file_path, twse_data)
+def store_results(name, results, state, calendar, today):
+    """
+    在主執行緒寫入一個來源的結果；所有資料都寫入成功後，本次內容才成為下次比對的基準。
 
-    # 取得臺股期貨資料並更新
-    txf_data = fetch_txf_data()
-    if txf_data is not None:
-        update_data(txf_data_file_path, txf_data)
+    回傳:
+        tuple: (changed, complete)；changed 表示有資料集的內容改變（報告需要重新產生，部分寫入時也是），
+            complete 表示該來源的所有資料都已寫入
+    """
+    cpu_started = time.process_time()
+    store = get_store(".")
+    datasets = [dataset for dataset, _ in results]
+    version = store.data_version(datasets)
+    complete = bool(results)
+    for dataset, data in results:
+        if data is None:
+            complete = False
+            continue
+        if dataset == dataset_name(twse_data_file_path):
+            calendar.add_month(today.year, today.month, data["日期"], today)
+            calendar.save()
+        complete = update_data(DATASET_FILES[dataset], data) and complete
+    changed = bool(results) and store.data_version(datasets) != version
+    state.add_cpu(name, time.process_time() - cpu_started)
+    if complete:
+        state.commit(name)
+    return changed, complete
+
+def publish_report():
+    """資料寫入後預先計算報告檔供 telegram_bot.py 讀取；失敗時只記錄錯誤，不影響資料更新。"""
+    try:
+        write_report(get_store("."))
+    except Exception as e:
+        logging.error(f"產生報告檔時發生錯誤：{e}")
 
-    # 取得選擇權資料並更新
-    txop_data = fetch_txop_data()
-    if txop_data is not None:
-        update_data(txop_data_file_path, txop_data)
+# ====== 主程式 ======
+def main(today=None):
+    """
+    執行當天的每日更新。
 
+    參數:
+        today (datetime): 要更新的日期（預設為現在；replay_server.py 重播模擬日期時指定）
+    """
+    today = today or datetime.now()
+    date = today.strftime("%Y%m%d")
+    logging.info("Start update {date}...".format(date=date))
+    started = time.perf_counter()
+
+    # 交易日曆：每月僅補抓一次上個月的 FMTQIK，非交易日直接結束不發出任何請求
+    calendar = TradingCalendar()
+    calendar.refresh(today - timedelta(days=31), today, today=today)
+    if not calendar.is_trading_day(today):
+        logging.info(f"{date} is not a trading day, skip update.")
+        logging.info("End...")
+        return
+
+    # 四個來源同時抓取，解析與寫入以管線重疊進行；寫入只在主執行緒逐一進行，各階段耗時記錄於 update.log
+    state = SourceState()
+    stored = []
+    run_pipeline(
+        (today_job(name, today) for name in DAILY_SOURCES),
+        store=lambda job, results: stored.append(store_results(job.source, results, state, calendar, today)),
+        fetch=lambda job: fetch_source(job, state),
+        parse=lambda job, response: parse_source(job, response, state),
+        concurrency=len(DAILY_SOURCES),
+    )
+    state.save()
+    state.log_summary()
+    # 只要有資料集改變就重新產生報告，即使同一來源的其他資料集寫入失敗
+    if any(changed for changed, _ in stored) or not os.path.exists(REPORT_FILE_NAME):
+        publish_report()
+
+    logging.info(f"Update took {time.perf_counter() - started:.2f}s")
     logging.info("End...")
 
 if __name__ == "__main__":
-    main()
+    # python update.py [--base-url 替代伺服器網址] [日期 YYYY-MM-DD]
+    args = pop_base_url(sys.argv[1:])
+    today = None
+    if args:
+        # 指定日期時以該日期為「今天」：當天的回應只快取 TODAY_TTL 秒，不視為已定案的歷史資料
+        today = datetime.strptime(args[0], "%Y-%m-%d")
+        http_client.clock = lambda: today
+    main(today)
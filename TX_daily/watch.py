@@ -0,0 +1,183 @@
+"""
+發布時間感知的輪詢模式：在交易日依各資料來源的預期發布時間輪詢，資料一發布就寫入。
+
+每個來源在預期發布時間前 FAST_WINDOW 內以 FAST_INTERVAL 密集輪詢；
+超過預期時間仍未發布則逐次加倍間隔（最長 MAX_INTERVAL），直到 DEADLINE 為止。
+來源當天的資料寫入後即停止輪詢，偵測到發布的時間記錄於 publish_times.json。
+
+執行方式: python watch.py（建議在各來源的預期發布時間之前啟動，例如 13:30）
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from source_state import SourceState
+from storage import get_store
+from trading_calendar import TradingCalendar
+from sources import SOURCES
+from update import publish_report, run_stage, store_results
+
+PUBLISH_TIMES_FILE_PATH = "publish_times.json"  # 各來源每天偵測到發布的時間
+FAST_WINDOW = timedelta(minutes=15)  # 預期發布時間前後的密集輪詢範圍
+FAST_INTERVAL = 30  # 密集輪詢的間隔（秒）
+MAX_INTERVAL = 10 * 60  # 逾時未發布時的最長輪詢間隔（秒）
+DEADLINE = "20:00"  # 當天停止輪詢的時間
+
+# 每日來源的預期發布時間（來源定義於 sources.SOURCES）
+EXPECTED_PUBLISH_TIMES = {
+    "BFI82U": "15:00",
+    "FMTQIK": "14:00",
+    "futContractsDate": "15:00",
+    "optContractsDate": "15:00",
+}
+
+
+def at_time(day, clock):
+    """將 "HH:MM" 轉為指定日期的 datetime。"""
+    hour, minute = map(int, clock.split(":"))
+    return day.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+
+def next_poll(now, expected, misses):
+    """
+    依目前時間與預期發布時間決定下一次輪詢的時間。
+
+    參數:
+        now (datetime): 目前時間
+        expected (datetime): 預期發布時間
+        misses (int): 超過預期時間後連續未取得資料的次數
+
+    回傳:
+        datetime: 下一次輪詢時間
+    """
+    if now < expected - FAST_WINDOW:
+        return expected - FAST_WINDOW
+    if now < expected + FAST_WINDOW:
+        return now + timedelta(seconds=FAST_INTERVAL)
+    return now + timedelta(seconds=min(MAX_INTERVAL, FAST_INTERVAL * 2 ** misses))
+
+
+def is_published(results, today):
+    """階段結果中的每個資料集都含有今天的資料時，視為今天的資料已發布。"""
+    if not results:
+        return False
+    for _, data in results:
+        if data is None or data.empty or data["日期"].max().date() != today.date():
+            return False
+    return True
+
+
+def is_stored(store, name, today):
+    """來源對應的資料集是否都已有今天的資料（重新啟動時不必重複輪詢）。"""
+    for dataset in SOURCES[name]["datasets"]:
+        if not store.exists(dataset):
+            return False
+        latest = store.latest_date(dataset)
+        if latest is None or latest.date() != today.date():
+            return False
+    return True
+
+
+def record_publish_time(name, today, detected_at, file_path=PUBLISH_TIMES_FILE_PATH):
+    """將來源偵測到發布的時間寫入 publish_times.json（日期 -> 來源 -> 時間）。"""
+    publish_times = {}
+    if os.path.exists(file_path):
+        with open(file_path, "r", encoding="utf-8") as f:
+            publish_times = json.load(f)
+    publish_times.setdefault(today.strftime("%Y-%m-%d"), {})[name] = detected_at.strftime("%Y-%m-%d %H:%M:%S")
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(publish_times, f, ensure_ascii=False, indent=2)
+
+
+def watch(expected_times=EXPECTED_PUBLISH_TIMES, now=datetime.now, sleep=time.sleep):
+    """
+    輪詢各來源直到今天的資料全部寫入或超過 DEADLINE。
+
+    參數:
+        expected_times (dict): 來源名稱 -> 預期發布時間（"HH:MM"）
+        now (callable): 取得目前時間的函數
+        sleep (callable): 等待指定秒數的函數
+
+    回傳:
+        dict: 來源名稱 -> 偵測到發布的時間（未發布者不在其中）
+    """
+    today = now()
+    calendar = TradingCalendar()
+    calendar.refresh(today - timedelta(days=31), today)
+    if not calendar.is_trading_day(today):
+        logging.info(f"{today.strftime('%Y%m%d')} is not a trading day, skip watch.")
+        return {}
+
+    store = get_store()
+    state = SourceState()
+    deadline = at_time(today, DEADLINE)
+    pending = {}
+    for name, clock in expected_times.items():
+        if is_stored(store, name, today):
+            logging.info(f"{name} data for today is already stored.")
+            continue
+        expected = at_time(today, clock)
+        pending[name] = {"expected": expected, "misses": 0, "next": next_poll(today, expected, 0)}
+
+    detected = {}
+    with ThreadPoolExecutor(max_workers=len(expected_times)) as executor:
+        running = {}
+        while pending and now() < deadline:
+            current = now()
+            for name, schedule in pending.items():
+                if name not in running.values() and schedule["next"] <= current:
+                    running[executor.submit(run_stage, name, state, True)] = name
+
+            if not running:
+                next_time = min(schedule["next"] for schedule in pending.values())
+                sleep(max(0.0, min((next_time - current).total_seconds(), (deadline - current).total_seconds())))
+                continue
+
+            waiting = [schedule["next"] for name, schedule in pending.items() if name not in running.values()]
+            timeout = max(0.0, (min(waiting) - current).total_seconds()) if waiting else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                schedule = pending[name]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    logging.error(f"Error : {name} stage : {e}")
+                    results = []
+                # 寫入只在主執行緒進行；有資料集改變（包含部分寫入）就重新產生報告
+                changed, complete = (store_results(name, results, state, calendar, today) if results
+                                     else (False, False))
+                if complete and is_published(results, today):
+                    detected_at = now()
+                    detected[name] = detected_at
+                    record_publish_time(name, today, detected_at)
+                    publish_report()
+                    delay = (detected_at - schedule["expected"]).total_seconds() / 60
+                    logging.info(f"{name} published, detected at {detected_at.strftime('%H:%M:%S')} "
+                                 f"({delay:+.1f} min from expected).")
+                    del pending[name]
+                    continue
+                if changed:
+                    publish_report()
+                if now() >= schedule["expected"] + FAST_WINDOW:
+                    schedule["misses"] += 1
+                schedule["next"] = next_poll(now(), schedule["expected"], schedule["misses"])
+            state.save()
+
+    for name in pending:
+        logging.warning(f"{name} data for today was not published before {DEADLINE}.")
+    state.log_summary()
+    return detected
+
+
+def main():
+    logging.info("Start watch...")
+    watch()
+    logging.info("End...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+每日報告廣播效能測試：以模擬的 Telegram Bot（每則訊息 SEND_LATENCY 秒，部分使用者已封鎖機器人，
+部分訊息第一次發送時收到 RetryAfter）比較原本逐一發送的迴圈與 broadcast 的送達數、耗時、每秒發送數，
+並檢查 broadcast 任一秒內的發送數不超過 GLOBAL_SEND_RATE、同一對話每秒不超過 PER_CHAT_SEND_RATE。
+
+執行方式: python bench_broadcast.py
+"""
+import asyncio
+import os
+import sys
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+
+from telegram.error import Forbidden, RetryAfter
+
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+SUBSCRIBER_COUNTS = [30, 100, 300]  # 訂閱者數
+SEND_LATENCY = 0.1  # 模擬每則訊息的往返時間（秒）
+BLOCKED_EVERY = 25  # 每 25 個訂閱者中有 1 個已封鎖機器人
+RETRY_AFTER_EVERY = 40  # 每 40 個訂閱者中有 1 個第一次發送時收到 RetryAfter
+RETRY_AFTER_SECONDS = 1
+
+sys.path.insert(0, BOT_DIR)
+
+
+class FakeBot:
+    """模擬 Bot.send_message：記錄每則訊息的發送時間，並依 chat_id 產生封鎖與 RetryAfter 錯誤。"""
+
+    def __init__(self):
+        self.sent = defaultdict(list)  # chat_id -> 發送時間列表
+        self.retried = set()
+
+    async def send_message(self, chat_id, text):
+        index = int(chat_id)
+        if index % BLOCKED_EVERY == BLOCKED_EVERY - 1:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        if index % RETRY_AFTER_EVERY == RETRY_AFTER_EVERY - 1 and chat_id not in self.retried:
+            self.retried.add(chat_id)
+            raise RetryAfter(RETRY_AFTER_SECONDS)
+        await asyncio.sleep(SEND_LATENCY)
+        self.sent[chat_id].append(time.perf_counter())
+
+
+async def sequential_send(bot, chat_ids, text):
+    """原本的做法：逐一 await 發送，任何一則訊息出錯即中止。"""
+    try:
+        for chat_id in chat_ids:
+            await bot.send_message(chat_id=chat_id, text=text)
+    except Exception:
+        pass
+
+
+def max_per_second(times):
+    """任一 1 秒區間內的最大發送數。"""
+    times = sorted(times)
+    best, start = 0, 0
+    for end, timestamp in enumerate(times):
+        while timestamp - times[start] >= 1:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+def main():
+    work_dir = tempfile.mkdtemp()
+    os.chdir(work_dir)  # telegram_bot 會在目前資料夾建立 logging.log
+    import telegram_bot
+
+    print(f"{'做法':<10} {'訂閱者':>6} {'送達':>6} {'未送達':>5} {'耗時 (s)':>9} {'則/秒':>7} "
+          f"{'每秒最多':>8} {'單一對話每秒最多':>16}")
+    try:
+        for count in SUBSCRIBER_COUNTS:
+            chat_ids = [str(index) for index in range(count)]
+            for name in ["逐一發送", "broadcast"]:
+                bot = FakeBot()
+                telegram_bot.chat_send_limiters.clear()
+                started = time.perf_counter()
+                if name == "broadcast":
+                    result = asyncio.run(telegram_bot.broadcast(bot, chat_ids, "report"))
+                    failed = len(result["failed"])
+                else:
+                    asyncio.run(sequential_send(bot, chat_ids, "report"))
+                    failed = count - len(bot.sent)
+                elapsed = time.perf_counter() - started
+                all_times = [timestamp for times in bot.sent.values() for timestamp in times]
+                per_chat = max((max_per_second(times) for times in bot.sent.values()), default=0)
+                print(f"{name:<10} {count:>6} {len(bot.sent):>6} {failed:>6} {elapsed:>9.2f} "
+                      f"{len(bot.sent) / elapsed:>7.1f} {max_per_second(all_times):>8} {per_chat:>16}")
+    finally:
+        os.chdir(BOT_DIR)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+/report 指令並行效能測試：以 TX_daily 的資料檔（不含預先計算的報告檔，每輪都需重新產生報告）
+模擬 1、10、50 個使用者同時查詢，比較原本在事件迴圈中直接產生報告與改由 executor 合併產生報告的
+回應時間直方圖、實際產生報告的次數，以及事件迴圈最長的停頓時間（停頓期間無法處理任何其他指令）。
+
+執行方式: python bench_report_handler.py
+"""
+import asyncio
+import os
+import sys
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+
+BOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BOT_DIR, "..", "TX_daily")
+DATA_FILES = ["tx_closed_data.csv", "tx_fund_data.csv", "txf_data.csv", "txop_data.csv"]
+CONCURRENCY = [1, 10, 50]  # 同時查詢的使用者數
+ROUNDS = 5  # 每種並行數重複的輪數（每輪都清除快取）
+HEARTBEAT_INTERVAL = 0.005  # 量測事件迴圈停頓的間隔（秒）
+
+sys.path.insert(0, BOT_DIR)
+
+
+def make_update(replies, latencies, arrived):
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+        latencies.append(time.perf_counter() - arrived)
+    return SimpleNamespace(message=SimpleNamespace(reply_text=reply_text))
+
+
+async def heartbeat(stop, lags):
+    """每隔 HEARTBEAT_INTERVAL 秒醒來一次，記錄實際醒來時間的延遲（即事件迴圈被占用的時間）。"""
+    while not stop.is_set():
+        expected = time.perf_counter() + HEARTBEAT_INTERVAL
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append(time.perf_counter() - expected)
+
+
+async def run_round(handler, concurrency, replies, latencies):
+    """同時送出 concurrency 個查詢；回應時間由查詢送達（本輪開始）起算至收到回覆為止。"""
+    stop = asyncio.Event()
+    lags = []
+    beat = asyncio.create_task(heartbeat(stop, lags))
+    await asyncio.sleep(0)
+    arrived = time.perf_counter()
+    await asyncio.gather(*(handler(make_update(replies, latencies, arrived), None) for _ in range(concurrency)))
+    stop.set()
+    await beat
+    return max(lags, default=0.0)
+
+
+def main():
+    work_dir = tempfile.mkdtemp()
+    os.chdir(work_dir)  # telegram_bot 會在目前資料夾建立 logging.log
+    import telegram_bot
+    from storage import get_store
+
+    for file_name in DATA_FILES:
+        shutil.copyfile(os.path.join(DATA_DIR, file_name), os.path.join(work_dir, file_name))
+    telegram_bot.BASE_DIR = work_dir
+    telegram_bot.store = get_store(work_dir)
+
+    builds = [0]
+    compile_latest_report = telegram_bot.compile_latest_report
+
+    def counted_compile(snapshot=None):
+        builds[0] += 1
+        return compile_latest_report(snapshot)
+
+    telegram_bot.compile_latest_report = counted_compile
+
+    async def blocking_report_command(update, context):
+        # 原本的做法：每個查詢都在事件迴圈中直接產生報告（不經過快取）
+        await update.message.reply_text(telegram_bot.compile_latest_report())
+
+    handlers = [("同步產生", blocking_report_command), ("executor", telegram_bot.manual_report_command)]
+    histograms = []
+    print(f"{'做法':<10} {'並行數':>6} {'產生次數':>8} {'p50 (ms)':>10} {'p95 (ms)':>10} {'最長停頓 (ms)':>14}")
+    try:
+        for concurrency in CONCURRENCY:
+            for name, handler in handlers:
+                builds[0] = 0
+                max_lag = 0.0
+                replies, latencies = [], []
+                for _ in range(ROUNDS):
+                    telegram_bot.report_cache.update(version=None, report=None)
+                    max_lag = max(max_lag, asyncio.run(run_round(handler, concurrency, replies, latencies)))
+                assert len(set(replies)) == 1, "各查詢收到的報告不一致"
+                samples = sorted(latencies)
+                p50 = samples[len(samples) // 2] * 1000
+                p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000
+                print(f"{name:<10} {concurrency:>6} {builds[0]:>8} {p50:>10.1f} {p95:>10.1f} {max_lag * 1000:>14.1f}")
+                histograms.append(telegram_bot.format_latency_histogram(f"{name}（並行數 {concurrency}）", samples))
+        print()
+        print("\n".join(histograms))
+    finally:
+        telegram_bot.report_executor.shutdown()
+        os.chdir(BOT_DIR)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,17 @@ import os
 import sys
 import pytz
 import asyncio
+import functools
 import logging
-import pandas as pd
+import threading
+from bisect import bisect_left
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, time
+from time import perf_counter
 from typing import Final
 from telegram import Bot, Update
+from telegram.error import RetryAfter
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -34,159 +40,200 @@ BOT_USERNAME: Final = "@TW_market_info_bot"
 # Telegram user ID to send messages (your user ID)
 MY_USER_ID: Final = 1942679873
 
-# 定義CSV檔案的絕對路徑 (修改為你的資料夾路徑)
+# 定義資料檔的絕對路徑 (修改為你的資料夾路徑)
 BASE_DIR = "E:\\Finance_Data\\TX_daily"  # 資料夾絕對路徑
-FUND_DATA_FILE_PATH = os.path.join(BASE_DIR, "tx_fund_data.csv")
-TWSE_DATA_FILE_PATH = os.path.join(BASE_DIR, "tx_closed_data.csv")
-TXF_DATA_FILE_PATH = os.path.join(BASE_DIR, "txf_data.csv")
-TXOP_DATA_FILE_PATH = os.path.join(BASE_DIR, "txop_data.csv")
+
+# 共用 TX_daily 的模組（資料儲存層、報告計算等）
+TX_DAILY_MODULE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "TX_daily")
+sys.path.append(TX_DAILY_MODULE_DIR)
+from ratelimit import TokenBucket
+from storage import get_store
+from report import REPORT_DATASETS, build_report, format_report, load_report
+
+# 與 update.py 使用相同的儲存後端（storage.STORAGE_BACKEND），只讀取報告需要的欄位與最新日期
+store = get_store(BASE_DIR)
+
+READ_ERROR_MESSAGE = "讀取資料時發生錯誤"
+
+# 已產生的報告與其資料版本；資料未更新前的查詢直接回傳記憶體中的報告
+report_cache = {"version": None, "report": None}
+report_cache_lock = threading.Lock()
 
 # Function to load the latest data from CSV files and compile a report message in Chinese
-def compile_latest_report() -> str:
+# （update.py 產生的報告檔不存在或已過期時使用）
+def compile_latest_report(snapshot=None) -> str:
     report = ""
     try:
-        # 記錄開始處理 TWSE 資料
-        logging.info("開始處理 TWSE 資料...")
-        # Load and extract data from TWSE closed data
-        if os.path.exists(TWSE_DATA_FILE_PATH):
-            twse_df = pd.read_csv(TWSE_DATA_FILE_PATH)
-            latest_twse_data = twse_df.iloc[-1]
-
-            # 將成交金額轉換為億元（假設原始數據為 "元"）
-            # trading_volume_yi = round(latest_twse_data['成交金額'] / 10**8, 2)
-
-            report += f"日期: {latest_twse_data['日期']}\n"
-            report += f"加權指數: {latest_twse_data['加權指數']}\n"
-            report += f"漲跌點數: {latest_twse_data['漲跌點數']}\n"
-            formatted_trading_volume = latest_twse_data['成交金額'].replace(',', '')[:4]
-            report += f"成交金額: {formatted_trading_volume} 億元\n\n"
-            logging.info(f"TWSE 資料處理完成：{latest_twse_data['日期']}, 成交金額 {latest_twse_data['成交金額']} ")
-        else:
-            logging.warning("無法找到 TWSE 資料檔案，請檢查檔案路徑。")
-
-        # 記錄開始處理三大法人買賣超資料
-        logging.info("開始處理三大法人買賣超資料...")
-        # Load and extract data from Fund data
-        if os.path.exists(FUND_DATA_FILE_PATH):
-            try:
-                # 讀取三大法人資料，並設定標題行和編碼格式（根據實際檔案情況進行調整）
-                fund_df = pd.read_csv(FUND_DATA_FILE_PATH, header=0, encoding='utf-8-sig')
-                # 在日誌中記錄讀取到的欄位名稱
-                logging.info(f"三大法人資料欄位名稱: {list(fund_df.columns)}")
-
-                # 確認是否存在 '單位名稱' 欄位
-                if '單位名稱' not in fund_df.columns:
-                    raise ValueError(f"CSV 中無法找到 '單位名稱' 欄位，讀取到的欄位名稱有: {list(fund_df.columns)}")
-
-                # 將相關欄位轉換為數值類型
-                fund_df[['買進金額', '賣出金額', '買賣差額']] = fund_df[['買進金額', '賣出金額', '買賣差額']].apply(
-                    lambda col: pd.to_numeric(col.str.replace(',', ''), errors='coerce')
-                )
-
-                # 取得最新的日期
-                latest_date = fund_df['日期'].max()
-                # 取該日期的最後六行
-                last_six_rows = fund_df[fund_df['日期'] == latest_date].tail(6)
-
-                # 建立報告
-                report += f"日期: {latest_date}\n"
-                # 遍歷每一行數據，將每個單位名稱的買賣差額分別列出
-                for _, row in last_six_rows.iterrows():
-                    # 將金額轉換為「億元」並格式化顯示
-                    net_amount_yi = round(row['買賣差額'] / 10**8, 2)  # 轉換為億元顯示，保留兩位小數
-                    # 根據金額正負判斷賣超或買超
-                    if net_amount_yi < 0:
-                        report += f"{row['單位名稱']}: {net_amount_yi} 億元 (賣超)\n"
-                    else:
-                        report += f"{row['單位名稱']}: {net_amount_yi} 億元 (買超)\n"
-
-                # 顯示總合計（不進行外資合併計算）
-                total_net_amount = last_six_rows[last_six_rows['單位名稱'] == '合計']['買賣差額'].values[0]
-                total_net_amount_yi = round(total_net_amount / 10**8, 2)  # 轉換為億元顯示，保留兩位小數
-                # 判斷總合計是賣超還是買超
-                if total_net_amount_yi < 0:
-                    report += f"總合計: {total_net_amount_yi} 億元 (賣超)\n\n"
-                else:
-                    report += f"總合計: {total_net_amount_yi} 億元 (買超)\n\n"
-                logging.info(f"三大法人買賣超資料處理完成：{latest_date}, 總合計 {total_net_amount:,} 元")
-            except Exception as e:
-                logging.error(f"處理三大法人資料時發生錯誤: {e}")
-        else:
-            logging.warning("無法找到三大法人買賣超資料檔案，請檢查檔案路徑。")
-
-
-
-        # 記錄開始處理期貨資料
-        logging.info("開始處理期貨資料...")
-        # Load and extract data from Futures data (using the latest date)
-        if os.path.exists(TXF_DATA_FILE_PATH):
-            txf_df = pd.read_csv(TXF_DATA_FILE_PATH)
-            latest_date = txf_df['日期'].max()  # 找到最新的日期
-            latest_txf_data = txf_df[txf_df['日期'] == latest_date]  # 針對最新日期進行篩選
-            report += f"期貨多空未平倉口數淨額 (日期: {latest_date})\n"
-            for entity in ['投信', '自營商', '外資']:
-                entity_data = latest_txf_data[(latest_txf_data['商品名稱'] == '臺股期貨') & (latest_txf_data['身份別'] == entity)]
-                if not entity_data.empty:
-                    entity_net_amount = entity_data['多空未平倉口數淨額'].values[0]
-                    entity_trade_amount = entity_data['多空交易口數淨額'].values[0]
-                    if not entity_trade_amount.startswith('-'):
-                        entity_trade_amount = f"+{entity_trade_amount}"
-                    # entity_trade_amount = 0
-                    report += f"{entity}: {entity_net_amount} ({entity_trade_amount})口\n"
-            report += "\n"
-            logging.info(f"期貨資料處理完成：{latest_date}")
-        else:
-            logging.warning("無法找到期貨資料檔案，請檢查檔案路徑。")
-
-        # 記錄開始處理選擇權資料
-        logging.info("開始處理選擇權資料...")
-        # Load and extract data from Options data (using the latest date)
-        if os.path.exists(TXOP_DATA_FILE_PATH):
-            txop_df = pd.read_csv(TXOP_DATA_FILE_PATH)
-            latest_date = txop_df['日期'].max()  # 找到最新的日期
-            latest_txop_data = txop_df[txop_df['日期'] == latest_date]  # 針對最新日期進行篩選
-            report += f"選擇權多空未平倉口數淨額 (日期: {latest_date})\n"
-            for entity in ['投信', '自營商', '外資']:
-                entity_data = latest_txop_data[(latest_txop_data['商品名稱'] == '選擇權') & (latest_txop_data['身份別'] == entity)]
-                if not entity_data.empty:
-                    entity_net_amount = entity_data['多空未平倉口數淨額'].values[0]
-                    entity_trade_amount = entity_data['多空交易口數淨額'].values[0]
-                    if not entity_trade_amount.startswith('-'):
-                        entity_trade_amount = f"+{entity_trade_amount}"
-                    report += f"{entity}: {entity_net_amount} ({entity_trade_amount})口\n"
-            report += "\n"
-            logging.info(f"選擇權資料處理完成：{latest_date}")
-        else:
-            logging.warning("無法找到選擇權資料檔案，請檢查檔案路徑。")
-
+        # 固定一個資料版本讀取所有資料集：update.py 同時寫入時也不會讀到寫到一半或新舊混雜的資料
+        snapshot = snapshot or store.snapshot()
+        logging.info("開始由資料檔計算報告...")
+        report = format_report(build_report(snapshot))
     except Exception as e:
-        logging.error(f"讀取資料時發生錯誤: {e}")
-        report += f"讀取資料時發生錯誤: {e}\n"
-    
+        logging.error(f"{READ_ERROR_MESSAGE}: {e}")
+        report += f"{READ_ERROR_MESSAGE}: {e}\n"
+
     # 最後返回報告內容
     logging.info("報告生成完成。")
     return report if report else "無可用的最新數據。"
 
+# 取得最新報告：以資料版本（CSV 資料檔的修改時間與已提交長度，或分區後端的 manifest 版本）為鍵快取，
+# update.py 寫入新資料後版本改變，下一次查詢才重新產生報告。
+# 優先讀取 update.py 寫入資料後預先計算的報告檔（latest_report.json），只有報告檔與目前資料版本不符時才讀取資料檔計算
+def get_latest_report() -> str:
+    snapshot = store.snapshot()
+    version = snapshot.data_version(REPORT_DATASETS)
+    with report_cache_lock:
+        if report_cache["version"] == version and report_cache["report"] is not None:
+            return report_cache["report"]
+    precomputed = load_report(BASE_DIR, data_version=version)
+    if precomputed is not None:
+        report = format_report(precomputed) or "無可用的最新數據。"
+    else:
+        report = compile_latest_report(snapshot)
+    if READ_ERROR_MESSAGE not in report:  # 讀取失敗的報告不快取，下一次查詢重新讀取
+        with report_cache_lock:
+            report_cache["version"] = version
+            report_cache["report"] = report
+    return report
+
+# 報告在獨立的執行緒中產生（pandas 運算不會阻塞事件迴圈，產生期間仍可處理其他指令）；
+# 產生期間收到的其他查詢不另外產生，而是等待同一次產生的結果
+report_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report")
+pending_report = {"future": None}
+
+async def get_latest_report_async() -> str:
+    future = pending_report["future"]
+    if future is None:
+        future = asyncio.get_running_loop().run_in_executor(report_executor, get_latest_report)
+        pending_report["future"] = future
+
+        def clear_pending(done):
+            if pending_report["future"] is done:
+                pending_report["future"] = None
+
+        future.add_done_callback(clear_pending)
+    # shield：單一查詢被取消時不影響其他等待同一份報告的查詢
+    return await asyncio.shield(future)
+
+# 各指令的回應時間（秒），每個指令保留最近 MAX_LATENCY_SAMPLES 筆，/stats 以直方圖顯示
+LATENCY_BUCKETS_MS = [10, 50, 100, 250, 500, 1000, 2500, 5000]  # 直方圖各區間的上限（毫秒）
+MAX_LATENCY_SAMPLES = 1000
+handler_latencies = defaultdict(lambda: deque(maxlen=MAX_LATENCY_SAMPLES))
+
+def timed_handler(name):
+    """記錄指令處理函式的回應時間（包含等待報告與回覆訊息）。"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(update: Update, context: CallbackContext) -> None:
+            started = perf_counter()
+            try:
+                await handler(update, context)
+            finally:
+                handler_latencies[name].append(perf_counter() - started)
+        return wrapper
+    return decorator
+
+def latency_histogram(samples) -> list:
+    """回傳各區間的次數（最後一個區間為超過 LATENCY_BUCKETS_MS 最大值者）。"""
+    counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    for seconds in samples:
+        counts[bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+    return counts
+
+def format_latency_histogram(name, samples) -> str:
+    """將回應時間組成文字直方圖（含 p50、p95 與最大值）。"""
+    samples = sorted(samples)
+    if not samples:
+        return f"{name}: 尚無紀錄\n"
+
+    def percentile(fraction):
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+
+    text = f"{name}: {len(samples)} 次，p50 {percentile(0.5):.1f} ms，p95 {percentile(0.95):.1f} ms，最大 {samples[-1] * 1000:.1f} ms\n"
+    counts = latency_histogram(samples)
+    labels = [f"<= {bound} ms" for bound in LATENCY_BUCKETS_MS] + [f"> {LATENCY_BUCKETS_MS[-1]} ms"]
+    for label, count in zip(labels, counts):
+        if count:
+            text += f"  {label:>10}: {count:>5} {'#' * max(1, round(count / max(counts) * 20))}\n"
+    return text
+
+def format_latency_report() -> str:
+    return "".join(format_latency_histogram(name, samples) for name, samples in sorted(handler_latencies.items()))
+
+# Telegram 的發送限制：整個機器人每秒約 30 則訊息，同一個對話每秒 1 則；
+# 超出時伺服器回傳 RetryAfter，要求等待指定秒數後再送
+GLOBAL_SEND_RATE = 30  # 整個機器人每秒最多發送的訊息數
+PER_CHAT_SEND_RATE = 1  # 同一個對話每秒最多發送的訊息數
+MAX_SEND_ATTEMPTS = 3  # 收到 RetryAfter 時同一則訊息最多嘗試發送的次數
+BROADCAST_CONCURRENCY = 30  # 廣播時同時進行中的發送數（其餘 chat_id 排隊，不同時等待令牌）
+global_send_limiter = TokenBucket(GLOBAL_SEND_RATE)
+chat_send_limiters = defaultdict(lambda: TokenBucket(PER_CHAT_SEND_RATE))
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+# 在全域與單一對話的速率限制內發送一則訊息；收到 RetryAfter 時所有發送一起暫停指定秒數後重試
+# 回傳 None 表示發送成功，否則回傳失敗原因（例如使用者已封鎖機器人），不拋出例外
+async def send_with_limits(bot: Bot, chat_id, text: str):
+    error = None
+    for _ in range(MAX_SEND_ATTEMPTS):
+        await chat_send_limiters[chat_id].acquire_async()
+        await global_send_limiter.acquire_async()
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+            return None
+        except RetryAfter as e:
+            error = e
+            delay = retry_after_seconds(e)
+            logging.warning(f"向 chat_id={chat_id} 發送時超出速率限制，暫停 {delay:g} 秒後重試")
+            global_send_limiter.pause(delay)
+        except Exception as e:
+            return e
+    return error
+
+# 同時發送給所有 chat_id（在速率限制內），單一對話失敗不影響其他對話
+# 回傳發送結果：成功數、失敗的 chat_id 與原因、耗時與每秒發送數
+async def broadcast(bot: Bot, chat_ids, text: str) -> dict:
+    chat_ids = list(dict.fromkeys(chat_ids))  # 重複訂閱的 chat_id 只發送一次
+    slots = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+
+    async def send(chat_id):
+        async with slots:
+            return await send_with_limits(bot, chat_id, text)
+
+    started = perf_counter()
+    errors = await asyncio.gather(*(send(chat_id) for chat_id in chat_ids))
+    elapsed = perf_counter() - started
+    failed = {chat_id: error for chat_id, error in zip(chat_ids, errors) if error is not None}
+    sent = len(chat_ids) - len(failed)
+    throughput = sent / elapsed if elapsed > 0 else 0.0
+    for chat_id, error in failed.items():
+        logging.error(f"向 chat_id={chat_id} 發送報告失敗: {error}")
+    logging.info(f"廣播完成：{sent}/{len(chat_ids)} 則成功，耗時 {elapsed:.2f} 秒（{throughput:.1f} 則/秒），"
+                 f"失敗的 chat_id: {list(failed) or '無'}")
+    return {"sent": sent, "failed": failed, "elapsed": elapsed, "throughput": throughput}
+
+# 讀取 subscribers.txt 中的所有 chat_id（每行一個）
+def load_subscribers(file_path="subscribers.txt") -> list:
+    with open(file_path, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
 # Function to send the latest report to the specified user
 async def send_daily_report(context: CallbackContext) -> None:
-    report = compile_latest_report()
+    report = await get_latest_report_async()
     if not report.strip():  # 檢查報告是否為空
         report = "目前無可用的最新數據，請稍後再試。"
 
     # 從 subscribers.txt 中讀取所有的 chat_id
     try:
-        with open("subscribers.txt", "r") as f:
-            subscribers = f.readlines()
-
-        # 向每個 chat_id 發送報告
-        for chat_id in subscribers:
-            chat_id = chat_id.strip()  # 移除換行符號或空格
-            if chat_id:  # 確認 chat_id 有效
-                await context.bot.send_message(chat_id=chat_id, text=report)
-                logging.info(f"向 chat_id={chat_id} 發送報告成功")
-
+        subscribers = load_subscribers()
     except Exception as e:
-        logging.error(f"發送每日報告時發生錯誤: {e}")
+        logging.error(f"讀取訂閱者清單時發生錯誤: {e}")
+        return
+
+    # 向每個 chat_id 發送報告
+    await broadcast(context.bot, subscribers, report)
 
 async def send_daily_report_and_exit(context: CallbackContext) -> None:
     try:
@@ -206,13 +253,15 @@ async def send_daily_report_and_exit(context: CallbackContext) -> None:
 
 
 # Command to trigger the manual report
+@timed_handler("report")
 async def manual_report_command(update: Update, context: CallbackContext) -> None:
-    report = compile_latest_report()
+    report = await get_latest_report_async()
     if not report.strip():  # 檢查報告是否為空
         report = "目前無可用的最新數據，請稍後再試。"
     await update.message.reply_text(report)
 
 # Default start command
+@timed_handler("start")
 async def start_command(update: Update, context: CallbackContext) -> None:
     chat_id = update.effective_chat.id
     with open("subscribers.txt", "a") as f:
@@ -221,6 +270,7 @@ async def start_command(update: Update, context: CallbackContext) -> None:
 
 
 # Default help command with detailed functionality description
+@timed_handler("help")
 async def help_command(update: Update, context: CallbackContext) -> None:
     help_text = (
         "💡 **可用的命令與功能介紹**：\n\n"
@@ -239,6 +289,12 @@ async def help_command(update: Update, context: CallbackContext) -> None:
     )
     await update.message.reply_text(help_text, parse_mode="Markdown")
 
+# 指令回應時間的直方圖（僅回覆給 MY_USER_ID）
+async def stats_command(update: Update, context: CallbackContext) -> None:
+    if update.effective_user is None or update.effective_user.id != MY_USER_ID:
+        return
+    await update.message.reply_text(format_latency_report() or "尚無紀錄")
+
 # Default error handler
 async def error_handler(update: Update, context: CallbackContext) -> None:
     print(f'Update {update} caused error {context.error}')
@@ -247,12 +303,14 @@ async def error_handler(update: Update, context: CallbackContext) -> None:
 if __name__ == '__main__':
     logging.info("Telegram Bot Starting...")
     # print("Starting bot...")
-    app = Application.builder().token(TOKEN).build()  
+    # 同時處理多個使用者的指令（報告由 get_latest_report_async 合併產生，其餘指令不需等待報告）
+    app = Application.builder().token(TOKEN).concurrent_updates(True).build()
 
     # Add command handlers
     app.add_handler(CommandHandler("start", start_command))
     app.add_handler(CommandHandler("help", help_command))
     app.add_handler(CommandHandler("report", manual_report_command))  # Manual report command
+    app.add_handler(CommandHandler("stats", stats_command))  # 指令回應時間統計
 
     # Set up the daily job at 16:00 (4 PM)
     job_queue: JobQueue = app.job_queue
@@ -268,4 +326,5 @@ if __name__ == '__main__':
     logging.info("Polling...")
     # print("Polling...")
     app.run_polling(poll_interval=5)
+    logging.info(f"指令回應時間：\n{format_latency_report()}")
     logging.info("Telegram Bot Stopped.")